@@ -8,7 +8,7 @@ from .project_scan import scan_projects, detect_project_type, extract_zip
 from .env_manager import setup_project, setup_python, setup_node
 from .sandbox import run_in_sandbox, test_python_project, test_node_project
 from .shortcuts_manager import create_shortcuts_from_index, create_dashboard_shortcut
-from .rag_core import query_rag, add_document, load_docs, build_index, retrieve
+from .rag_core import query_rag, query_rag_stream, add_document, load_docs, build_index, get_index, retrieve, retrieve_many
 from . import memory_manager
 from . import voice_assistant
 from . import action_router
@@ -28,10 +28,13 @@ __all__ = [
     'create_shortcuts_from_index',
     'create_dashboard_shortcut',
     'query_rag',
+    'query_rag_stream',
     'add_document',
     'load_docs',
     'build_index',
+    'get_index',
     'retrieve',
+    'retrieve_many',
     'memory_manager',
     'voice_assistant',
     'action_router',
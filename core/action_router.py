@@ -13,7 +13,7 @@ import json
 # Adicionar o diretório pai ao path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from core import project_scan, env_manager, memory_manager
+from core import project_scan, env_manager, memory_manager, rag_core, symbol_index
 from core.realtime_info_manager import RealtimeInfoManager
 from core.camera_perception import CameraPerception
 
@@ -228,6 +228,27 @@ def perceive_mood() -> Dict[str, Any]:
     result = camera_perception.perceive_user_mood()
     return {"success": True, "result": result}
 
+def find_symbol(name: str) -> Dict[str, Any]:
+    """
+    Localiza a definição de uma função, classe ou método nos projetos indexados
+    e nos arquivos de código ingeridos no RAG (mesma busca do query_rag).
+    
+    Args:
+        name: Nome do símbolo
+        
+    Returns:
+        Dicionário com as definições encontradas
+    """
+    memory_manager.log_activity(f"Buscando símbolo: {name}")
+    symbols = rag_core.lookup_symbol(name)
+    if not symbols:
+        return {"success": False, "error": f"Símbolo não encontrado: {name}"}
+    return {
+        "success": True,
+        "symbols": symbols,
+        "result": symbol_index.format_symbols(name, symbols)
+    }
+
 def route(command: str, **kwargs) -> Any:
     """
     Roteia um comando para a ação apropriada.
@@ -245,6 +266,11 @@ def route(command: str, **kwargs) -> Any:
     # ou o teste deve ser ajustado para não esperar essa chamada aqui.
     # Removendo a chamada para evitar duplicação ou chamadas inesperadas.
     
+    # Perguntas sobre código ("onde está definida a função X")
+    symbol = kwargs.get("symbol") or symbol_index.extract_symbol_name(command, questions_only=True)
+    if symbol:
+        return find_symbol(symbol)
+    
     # Comandos de scan
     if "scan" in command_lower and "download" in command_lower:
         return scan_downloads_and_import(kwargs.get("downloads_path"))
@@ -328,6 +354,7 @@ if __name__ == "__main__":
     parser.add_argument("--longitude", type=float, help="Longitude para locais próximos")
     parser.add_argument("--query-place", help="Tipo de lugar para consulta de locais próximos")
     parser.add_argument("--perceive-mood", action="store_true", help="Ativar percepção de humor pela câmera")
+    parser.add_argument("--symbol", help="Nome de função/classe a localizar nos projetos")
 
     args = parser.parse_args()
     
@@ -340,7 +367,8 @@ if __name__ == "__main__":
         "query_news": args.query_news,
         "latitude": args.latitude,
         "longitude": args.longitude,
-        "query_place": args.query_place
+        "query_place": args.query_place,
+        "symbol": args.symbol
     }
     
     result = route(
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# core/activity_log.py
+"""
+Gravação assíncrona do log de atividades do J.A.R.V.I.S.
+As linhas entram numa fila e uma thread em segundo plano as grava em lotes,
+então quem registra uma atividade nunca espera pelo disco. O arquivo é
+rotacionado por tamanho (activity.log -> activity.log.1 -> ...).
+"""
+import os
+import queue
+import threading
+import time
+from typing import List, Optional
+
+LOG_BATCH_LINES = 200        # Linhas acumuladas que disparam uma gravação
+LOG_FLUSH_INTERVAL = 1.0     # Segundos máximos de uma linha na fila
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3              # Arquivos rotacionados mantidos
+
+_STOP = object()
+
+class ActivityLogWriter:
+    """
+    Escritor do log em segundo plano, alimentado por uma fila.
+
+    Grava quando acumula batch_lines linhas, quando a linha mais antiga
+    espera flush_interval segundos, em flush() ou em close(). Antes de cada
+    gravação, se o arquivo passar de max_bytes, ele é rotacionado mantendo
+    backups arquivos antigos.
+    """
+
+    def __init__(self, path: str, max_bytes: int = LOG_MAX_BYTES, backups: int = LOG_BACKUPS,
+                 batch_lines: int = LOG_BATCH_LINES, flush_interval: float = LOG_FLUSH_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_lines = batch_lines
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def write(self, line: str):
+        """Enfileira uma linha (com a quebra de linha) sem bloquear."""
+        if self._thread is None:
+            self._start()
+        self._queue.put(line)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="activity-log", daemon=True)
+                self._thread.start()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Espera a gravação de todas as linhas enfileiradas até agora.
+
+        Returns:
+            True se as linhas foram gravadas dentro do timeout
+        """
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """Grava o que falta e encerra a thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        batch: List[str] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, str):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_lines:
+                    continue
+            elif item is None and deadline is not None and time.monotonic() < deadline:
+                continue
+
+            # Lote cheio, prazo vencido, flush() ou close(): gravar
+            if batch:
+                self._write_batch(batch)
+                batch = []
+            deadline = None
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _STOP:
+                return
+
+    def _write_batch(self, lines: List[str]):
+        data = "".join(lines)
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if (os.path.exists(self.path)
+                    and os.path.getsize(self.path) + len(data.encode("utf-8")) > self.max_bytes):
+                self._rotate()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(data)
+        except OSError as e:
+            print(f"[LOG] Erro ao gravar {self.path}: {e}")
+
+    def _rotate(self):
+        """activity.log -> activity.log.1 -> ... -> activity.log.<backups> (o mais antigo sai)."""
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
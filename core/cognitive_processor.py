@@ -26,7 +26,7 @@ class CognitiveProcessor:
         context = {
             "current_command": current_command,
             "recent_events": working_memory,
-            "preferences": memory_manager.load_memory().get("preferences", {})
+            "preferences": memory_manager.get_preferences()
         }
         memory_manager.log_activity("Contexto analisado.", "DEBUG")
         return context
@@ -52,7 +52,7 @@ class CognitiveProcessor:
             memory_manager.store_semantic_knowledge("Jarvis_identity", response)
         
         # Tentar recuperar conhecimento semântico
-        for key_phrase, knowledge in memory_manager.load_memory().get("semantic_memory", {}).items():
+        for key_phrase, knowledge in memory_manager.get_semantic_memory().items():
             if key_phrase.lower() in command:
                 response = f"Pelo que sei sobre '{key_phrase}', {knowledge['data']}"
                 break
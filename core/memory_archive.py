@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# core/memory_archive.py
+"""
+Arquivo histórico dos eventos da memória do J.A.R.V.I.S.
+A memória episódica guarda só os eventos recentes; os mais antigos saem
+dela e vão para segmentos diários comprimidos (events-AAAA-MM-DD.jsonl.gz),
+que continuam pesquisáveis por tipo e período sem aumentar o arquivo
+principal da memória.
+"""
+import gzip
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Union
+
+from core.persistence import file_lock
+
+ARCHIVE_BATCH = 100  # Eventos acumulados antes de gravar um bloco no arquivo
+SEGMENT_PREFIX = "events-"
+SEGMENT_SUFFIX = ".jsonl.gz"
+
+def archive_dir_for(path: str) -> str:
+    """Diretório do arquivo histórico de um store (~/.jarvis_memory.json -> ~/.jarvis_memory_archive)."""
+    return os.path.splitext(path)[0] + "_archive"
+
+def _as_timestamp(value: Union[str, datetime, None]) -> str:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+class EventArchive:
+    """
+    Segmentos diários de eventos em JSONL comprimido com gzip.
+
+    Os eventos recebidos ficam pendentes em memória até flush(), que anexa
+    um bloco (membro gzip) por segmento; gzip lê os membros concatenados como
+    um único fluxo, então nenhum segmento é reescrito. As gravações usam um
+    lock entre processos (o do diretório do arquivo).
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.pending: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, events: List[Dict]):
+        """Enfileira eventos para o arquivo (gravados no próximo flush)."""
+        with self._lock:
+            self.pending.extend(events)
+
+    def flush(self) -> int:
+        """
+        Grava os eventos pendentes nos segmentos do dia de cada evento.
+
+        Returns:
+            Número de eventos gravados
+        """
+        with self._lock:
+            if not self.pending:
+                return 0
+            count = self.write(self.pending)
+            self.pending = []
+            return count
+
+    def write(self, events: List[Dict]) -> int:
+        """
+        Grava eventos diretamente nos segmentos, sem passar pelos pendentes.
+
+        Returns:
+            Número de eventos gravados
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        by_day: Dict[str, List[str]] = {}
+        for event in events:
+            day = (event.get("timestamp") or "")[:10] or "unknown"
+            by_day.setdefault(day, []).append(json.dumps(event, ensure_ascii=False))
+        with file_lock(self.directory):
+            for day, lines in by_day.items():
+                with gzip.open(self._segment_path(day), "at", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+        return len(events)
+
+    def _segment_path(self, day: str) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{day}{SEGMENT_SUFFIX}")
+
+    def segments(self) -> List[str]:
+        """Dias com segmento gravado, em ordem cronológica."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+            for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _read_segment(self, day: str) -> Iterator[Dict]:
+        try:
+            with gzip.open(self._segment_path(day), "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except (EOFError, OSError):
+            # Último bloco truncado (queda durante a gravação): usa o que foi lido
+            return
+
+    def query(self, event_type: str = None, start: Union[str, datetime] = None,
+              end: Union[str, datetime] = None, limit: int = None) -> List[Dict]:
+        """
+        Busca eventos arquivados, incluindo os pendentes.
+
+        Só os segmentos dos dias dentro do período são abertos.
+
+        Args:
+            event_type: Filtrar por tipo (opcional)
+            start: Início do período, inclusive (ISO ou datetime, opcional)
+            end: Fim do período, inclusive (ISO ou datetime, opcional)
+            limit: Manter só os N eventos mais recentes (opcional)
+
+        Returns:
+            Eventos em ordem cronológica
+        """
+        start, end = _as_timestamp(start), _as_timestamp(end)
+        with self._lock:
+            pending = list(self.pending)
+
+        results = []
+        for day in self.segments():
+            if (start and day < start[:10]) or (end and day > end[:10]):
+                continue
+            results.extend(self.matching(self._read_segment(day), event_type, start, end))
+        results.extend(self.matching(pending, event_type, start, end))
+        results.sort(key=lambda e: e.get("timestamp") or "")
+        return results[-limit:] if limit else results
+
+    @staticmethod
+    def matching(events, event_type: str = None, start: Union[str, datetime] = None,
+                 end: Union[str, datetime] = None) -> Iterator[Dict]:
+        """Filtra eventos por tipo e período (limites inclusivos)."""
+        start, end = _as_timestamp(start), _as_timestamp(end)
+        for event in events:
+            timestamp = event.get("timestamp") or ""
+            if ((event_type is None or event.get("type") == event_type)
+                    and (start is None or timestamp >= start)
+                    and (end is None or timestamp <= end)):
+                yield event
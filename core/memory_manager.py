@@ -5,170 +5,536 @@
 Gerenciador de memória persistente do J.A.R.V.I.S.
 Armazena preferências, histórico de ações, aprendizados e memória de longo prazo.
 """
+import atexit
 import json
 import os
+import sys
+import threading
+from collections import deque
 from datetime import datetime
+from pathlib import Path
 from typing import Dict, List, Any, Optional
 
+# Adicionar o diretório pai ao path para imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.activity_log import ActivityLogWriter
+from core.memory_archive import EventArchive, archive_dir_for
+from core.persistence import file_lock, file_signature, write_json
+from core.utils import get_config
+
 # Arquivos de persistência
 MEMORY_FILE = os.path.expanduser("~/.jarvis_memory.json")
 ACTIVITY_LOG = os.path.expanduser("~/.jarvis_activity.log")
 
+# Backend da memória: "json" (arquivo único em RAM) ou "sqlite" (banco em WAL)
+MEMORY_BACKEND = get_config("memory_backend", "json")
+MEMORY_DB = os.path.expanduser("~/.jarvis_memory.db")
+
+# Segundos entre a primeira alteração e a gravação da memória no disco
+FLUSH_DELAY = 2.0
+
+EPISODIC_LIMIT = 1000  # Eventos recentes na memória episódica (os anteriores vão para o arquivo)
+WORKING_LIMIT = 10     # Eventos na memória de trabalho
+
+def _initial_memory() -> Dict:
+    return {
+        "preferences": {
+            "aggressiveness": "high",  # low, medium, high
+            "voice_confirmation": True,
+            "auto_backup": True,
+            "language": "pt-BR",
+            "default_city": "São Paulo",
+            "last_known_latitude": -23.5505,
+            "last_known_longitude": -46.6333,
+        },
+        "working_memory": [], # Para contexto de curto prazo da conversa/tarefa atual
+        "episodic_memory": [], # Eventos e experiências passadas
+        "semantic_memory": {}, # Conhecimento geral, fatos, relações
+        "learned_patterns": {},
+        "project_history": {}
+    }
+
+class MemoryStore:
+    """
+    Memória do J.A.R.V.I.S mantida em RAM, com escrita adiada (write-back).
+    
+    O arquivo é lido uma única vez; leituras viram consultas a dicionários e
+    alterações só marcam a memória como suja. Um timer grava o arquivo
+    FLUSH_DELAY segundos após a primeira alteração, juntando todas as
+    alterações feitas nesse intervalo, e o que faltar é gravado na saída do
+    processo (atexit).
+    
+    As memórias episódica e de trabalho são buffers circulares (deque com
+    maxlen): registrar um evento custa O(1) e os eventos que saem da memória
+    episódica vão para o arquivo histórico (EventArchive), em vez de serem
+    descartados.
+    
+    Outro processo (ex.: o dashboard) pode gravar o mesmo arquivo. Cada
+    alteração registra a chave que mudou; se o arquivo mudou desde a última
+    leitura, flush() relê o arquivo e reaplica só essas alterações antes de
+    gravar, em vez de sobrescrever o que o outro processo gravou.
+    """
+    
+    def __init__(self, path: str, flush_delay: float = FLUSH_DELAY, archive_dir: str = None):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.dirty = False
+        self.archive = EventArchive(archive_dir or archive_dir_for(path))
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+        self.data: Dict = {}
+        self._signature = None
+        self._reset_changes()
+        self.reload()
+    
+    def _adopt(self, memory: Dict):
+        """Usa a memória no formato JSON, convertendo as listas de eventos em buffers circulares."""
+        episodic = memory.get("episodic_memory", [])
+        if len(episodic) > EPISODIC_LIMIT:
+            # Arquivo de uma versão anterior ou limite reduzido: arquivar o excesso
+            self.archive.add(list(episodic)[:-EPISODIC_LIMIT])
+        memory["episodic_memory"] = deque(episodic, maxlen=EPISODIC_LIMIT)
+        memory["working_memory"] = deque(memory.get("working_memory", []), maxlen=WORKING_LIMIT)
+        self.data = memory
+    
+    def _reset_changes(self):
+        self._changes: Dict[str, set] = {}  # Seção -> chaves alteradas desde a última gravação
+        self._new_events: List[Dict] = []
+        self._working_cleared_at: Optional[int] = None  # Posição em _new_events da última limpeza
+        self._overwrite = False
+    
+    def _read_file(self) -> Dict:
+        with open(self.path, "r", encoding="utf-8") as f:
+            memory = json.load(f)
+        self._signature = file_signature(self.path)
+        return memory
+    
+    def reload(self):
+        """Descarta o estado em memória e relê o arquivo (criando-o se não existir)."""
+        with self._lock:
+            self._cancel_timer()
+            self._reset_changes()
+            if os.path.exists(self.path):
+                self._adopt(self._read_file())
+                self.dirty = bool(self.archive.pending)
+            else:
+                self._adopt(_initial_memory())
+                self.dirty = True
+                self._overwrite = True
+                self.flush()
+    
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+    
+    def mark_dirty(self, section: str = None, key: str = None):
+        """
+        Registra uma alteração e agenda a gravação.
+        
+        Args:
+            section: Seção alterada (ex.: "preferences"); sem seção, a memória
+                inteira em RAM prevalece sobre o arquivo na próxima gravação
+            key: Chave alterada dentro da seção
+        """
+        with self._lock:
+            if section is None:
+                self._overwrite = True
+            elif key is not None:
+                self._changes.setdefault(section, set()).add(key)
+            self.dirty = True
+            if self.flush_delay <= 0:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+    
+    def load(self) -> Dict:
+        """A memória inteira no formato JSON (eventos em listas, demais partes compartilhadas)."""
+        with self._lock:
+            return dict(self.data,
+                        episodic_memory=list(self.data["episodic_memory"]),
+                        working_memory=list(self.data["working_memory"]))
+    
+    def replace(self, memory: Dict):
+        """Substitui toda a memória e grava imediatamente."""
+        with self._lock:
+            self._adopt(dict(memory))
+            self._overwrite = True
+            self.dirty = True
+            self.flush()
+    
+    def flush(self):
+        """Grava a memória no disco se houver alterações pendentes."""
+        with self._lock:
+            self._cancel_timer()
+            if not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with file_lock(self.path):
+                if (not self._overwrite and os.path.exists(self.path)
+                        and file_signature(self.path) != self._signature):
+                    self._merge(self._read_file())
+                # Arquivar antes de gravar a memória, para nenhum evento sumir numa queda
+                self.archive.flush()
+                write_json(self.path, self.load())
+                self._signature = file_signature(self.path)
+            self._reset_changes()
+            self.dirty = False
+    
+    def _merge(self, memory: Dict):
+        """Adota a versão gravada por outro processo e reaplica as alterações locais."""
+        mine = self.data
+        self._adopt(memory)
+        for section, keys in self._changes.items():
+            target = self.data.setdefault(section, {})
+            for key in keys:
+                if key in mine.get(section, {}):
+                    target[key] = mine[section][key]
+                else:
+                    target.pop(key, None)
+        if self._working_cleared_at is not None:
+            self.data["working_memory"].clear()
+        episodic = self.data["episodic_memory"]
+        for i, event in enumerate(self._new_events):
+            if len(episodic) == episodic.maxlen:
+                self.archive.add([episodic[0]])
+            episodic.append(event)
+            if self._working_cleared_at is None or i >= self._working_cleared_at:
+                self.data["working_memory"].append(event)
+    
+    def close(self):
+        """Grava as alterações pendentes."""
+        self.flush()
+    
+    # --- Preferências ---
+    
+    def get_preference(self, key: str, default: Any = None) -> Any:
+        return self.data.get("preferences", {}).get(key, default)
+    
+    def get_preferences(self) -> Dict:
+        return dict(self.data.get("preferences", {}))
+    
+    def set_preference(self, key: str, value: Any):
+        with self._lock:
+            self.data.setdefault("preferences", {})[key] = value
+            self.mark_dirty("preferences", key)
+    
+    # --- Eventos e memória de trabalho ---
+    
+    def log_event(self, event_type: str, data: Dict) -> Dict:
+        event = {
+            "timestamp": datetime.now().isoformat(),
+            "type": event_type,
+            "data": data
+        }
+        with self._lock:
+            episodic = self.data["episodic_memory"]
+            if len(episodic) == episodic.maxlen:
+                # O mais antigo sai do buffer: vai para o arquivo histórico
+                self.archive.add([episodic[0]])
+            episodic.append(event)
+            self.data["working_memory"].append(event) # Adiciona também à memória de trabalho
+            self._new_events.append(event)
+            self.mark_dirty("episodic_memory")
+        return event
+    
+    def get_recent_events(self, limit: int = 10, event_type: str = None) -> List[Dict]:
+        with self._lock:
+            recent = []
+            for event in reversed(self.data["episodic_memory"]):
+                if len(recent) >= limit:
+                    break
+                if event_type is None or event.get("type") == event_type:
+                    recent.append(event)
+        return recent[::-1]
+    
+    def search_events(self, event_type: str = None, start=None, end=None,
+                      limit: int = None) -> List[Dict]:
+        with self._lock:
+            hot = list(self.data["episodic_memory"])
+        results = self.archive.query(event_type, start, end)
+        results.extend(EventArchive.matching(hot, event_type, start, end))
+        return results[-limit:] if limit else results
+    
+    def get_working_memory(self) -> List[Dict]:
+        return list(self.data.get("working_memory", []))
+    
+    def clear_working_memory(self):
+        with self._lock:
+            self.data["working_memory"].clear()
+            self._working_cleared_at = len(self._new_events)
+            self.mark_dirty("working_memory")
+    
+    # --- Projetos, padrões e conhecimento semântico ---
+    
+    def record_project_action(self, project_path: str, action: str, details: Dict):
+        with self._lock:
+            history = self.data["project_history"]
+            if project_path not in history:
+                history[project_path] = {
+                    "first_seen": datetime.now().isoformat(),
+                    "actions": []
+                }
+            history[project_path]["actions"].append({
+                "timestamp": datetime.now().isoformat(),
+                "action": action,
+                "details": details
+            })
+            self.mark_dirty("project_history", project_path)
+    
+    def get_project_actions(self, project_path: str, limit: int = None) -> List[Dict]:
+        actions = self.data.get("project_history", {}).get(project_path, {}).get("actions", [])
+        return actions[-limit:] if limit else list(actions)
+    
+    def learn_pattern(self, pattern_name: str, pattern_data: Dict):
+        with self._lock:
+            patterns = self.data["learned_patterns"]
+            if pattern_name not in patterns:
+                patterns[pattern_name] = {
+                    "first_learned": datetime.now().isoformat(),
+                    "occurrences": 0,
+                    "data": pattern_data,
+                    "relevance_score": 1.0 # Score de relevância inicial
+                }
+            patterns[pattern_name]["occurrences"] += 1
+            patterns[pattern_name]["last_seen"] = datetime.now().isoformat()
+            # Lógica para ajustar relevance_score com base no uso ou sucesso
+            self.mark_dirty("learned_patterns", pattern_name)
+    
+    def get_pattern(self, pattern_name: str) -> Optional[Dict]:
+        return self.data.get("learned_patterns", {}).get(pattern_name)
+    
+    def store_semantic(self, concept: str, knowledge: Any):
+        with self._lock:
+            self.data["semantic_memory"][concept] = {
+                "data": knowledge,
+                "last_updated": datetime.now().isoformat()
+            }
+            self.mark_dirty("semantic_memory", concept)
+    
+    def get_semantic(self, concept: str) -> Optional[Dict]:
+        return self.data.get("semantic_memory", {}).get(concept, None)
+    
+    def get_semantic_memory(self) -> Dict:
+        return dict(self.data.get("semantic_memory", {}))
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+def get_memory_store():
+    """
+    Retorna o store da memória conforme MEMORY_BACKEND, criando-o na primeira chamada.
+    
+    Com o backend "json" é um MemoryStore sobre MEMORY_FILE; com "sqlite" é um
+    SQLiteMemoryStore sobre MEMORY_DB, que na criação importa uma única vez o
+    MEMORY_FILE existente. Se o backend ou o caminho mudarem, o store anterior
+    é gravado e substituído.
+    """
+    global _STORE
+    path = MEMORY_DB if MEMORY_BACKEND == "sqlite" else MEMORY_FILE
+    with _STORE_LOCK:
+        if _STORE is None or _STORE.path != path:
+            if _STORE is not None:
+                _STORE.close()
+            if MEMORY_BACKEND == "sqlite":
+                from core.memory_sqlite import SQLiteMemoryStore, migrate_from_json
+                _STORE = SQLiteMemoryStore(MEMORY_DB, _initial_memory()["preferences"],
+                                           EPISODIC_LIMIT, WORKING_LIMIT)
+                if migrate_from_json(MEMORY_FILE, _STORE):
+                    print(f"[MEMORY] Memória migrada de {MEMORY_FILE} para {MEMORY_DB}")
+            elif MEMORY_BACKEND == "json":
+                _STORE = MemoryStore(MEMORY_FILE)
+            else:
+                raise ValueError(f"Backend de memória desconhecido: {MEMORY_BACKEND}")
+        return _STORE
+
+_LOG_WRITER = None
+
+def get_activity_writer() -> ActivityLogWriter:
+    """Retorna o escritor do log de atividades, trocando-o se ACTIVITY_LOG mudar."""
+    global _LOG_WRITER
+    with _STORE_LOCK:
+        if _LOG_WRITER is None or _LOG_WRITER.path != ACTIVITY_LOG:
+            if _LOG_WRITER is not None:
+                _LOG_WRITER.close()
+            _LOG_WRITER = ActivityLogWriter(ACTIVITY_LOG)
+        return _LOG_WRITER
+
+def flush_memory():
+    """Grava imediatamente as alterações pendentes da memória e do log de atividades."""
+    if _STORE is not None:
+        _STORE.flush()
+    if _LOG_WRITER is not None:
+        _LOG_WRITER.flush()
+
+def _shutdown():
+    flush_memory()
+    if _LOG_WRITER is not None:
+        _LOG_WRITER.close()
+
+atexit.register(_shutdown)
+
+def migrate_to_sqlite(json_path: str = None, db_path: str = None, force: bool = False) -> Dict:
+    """
+    Importa o arquivo JSON da memória para um banco SQLite (uma única vez).
+    
+    Args:
+        json_path: Arquivo JSON (padrão: MEMORY_FILE)
+        db_path: Banco SQLite (padrão: MEMORY_DB)
+        force: Importar de novo mesmo se o banco já foi migrado
+        
+    Returns:
+        Contagem de itens importados (vazio se nada foi feito)
+    """
+    from core.memory_sqlite import SQLiteMemoryStore, migrate_from_json
+    flush_memory()
+    store = SQLiteMemoryStore(db_path or MEMORY_DB, _initial_memory()["preferences"],
+                              EPISODIC_LIMIT, WORKING_LIMIT)
+    try:
+        return migrate_from_json(json_path or MEMORY_FILE, store, force)
+    finally:
+        store.close()
+
 def ensure_memory():
     """Garante que os arquivos de memória existem e inicializa-os se não existirem."""
-    if not os.path.exists(MEMORY_FILE):
-        initial_memory = {
-            "preferences": {
-                "aggressiveness": "high",  # low, medium, high
-                "voice_confirmation": True,
-                "auto_backup": True,
-                "language": "pt-BR",
-                "default_city": "São Paulo",
-                "last_known_latitude": -23.5505,
-                "last_known_longitude": -46.6333,
-            },
-            "working_memory": [], # Para contexto de curto prazo da conversa/tarefa atual
-            "episodic_memory": [], # Eventos e experiências passadas
-            "semantic_memory": {}, # Conhecimento geral, fatos, relações
-            "learned_patterns": {},
-            "project_history": {}
-        }
-        save_memory(initial_memory)
+    store = get_memory_store()
+    if MEMORY_BACKEND == "json" and not os.path.exists(MEMORY_FILE):
+        store.mark_dirty()
+        store.flush()
     
     if not os.path.exists(ACTIVITY_LOG):
         with open(ACTIVITY_LOG, "w", encoding="utf-8") as f:
             f.write(f"[{datetime.now().isoformat()}] J.A.R.V.I.S Activity Log iniciado\n")
 
 def load_memory() -> Dict:
-    """Carrega a memória do J.A.R.V.I.S."""
-    ensure_memory()
-    with open(MEMORY_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """
+    Retorna a memória inteira do J.A.R.V.I.S.
+    
+    No backend JSON é o próprio dicionário em RAM: alterações feitas
+    diretamente nele devem ser seguidas de save_memory(). Para ler só uma
+    parte, prefira as funções específicas (get_preference etc.).
+    """
+    return get_memory_store().load()
 
 def save_memory(memory: Dict):
-    """Salva a memória do J.A.R.V.I.S."""
-    with open(MEMORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(memory, f, indent=2, ensure_ascii=False)
+    """Salva a memória do J.A.R.V.I.S, gravando-a imediatamente."""
+    get_memory_store().replace(memory)
 
 def get_preference(key: str, default: Any = None) -> Any:
     """Obtém uma preferência."""
-    memory = load_memory()
-    return memory.get("preferences", {}).get(key, default)
+    return get_memory_store().get_preference(key, default)
+
+def get_preferences() -> Dict:
+    """Obtém todas as preferências."""
+    return get_memory_store().get_preferences()
 
 def set_preference(key: str, value: Any):
     """Define uma preferência."""
-    memory = load_memory()
-    memory["preferences"][key] = value
-    save_memory(memory)
+    get_memory_store().set_preference(key, value)
     log_activity(f"Preferência alterada: {key} = {value}")
 
 def log_event(event_type: str, data: Dict):
     """Registra um evento na memória episódica e de trabalho."""
-    memory = load_memory()
-    event = {
-        "timestamp": datetime.now().isoformat(),
-        "type": event_type,
-        "data": data
-    }
-    memory["episodic_memory"].append(event)
-    memory["working_memory"].append(event) # Adiciona também à memória de trabalho
-    
-    # Manter apenas os últimos 1000 eventos episódicos
-    if len(memory["episodic_memory"]) > 1000:
-        memory["episodic_memory"] = memory["episodic_memory"][-1000:]
+    get_memory_store().log_event(event_type, data)
+    log_activity(f"Evento registrado: {event_type}")
+
+def get_recent_events(limit: int = 10, event_type: str = None) -> List[Dict]:
+    """Retorna os últimos eventos da memória episódica, do mais antigo ao mais recente."""
+    return get_memory_store().get_recent_events(limit, event_type)
 
-    # Manter apenas os últimos 10 eventos na memória de trabalho para contexto imediato
-    if len(memory["working_memory"]) > 10:
-        memory["working_memory"] = memory["working_memory"][-10:]
+def search_events(event_type: str = None, start=None, end=None, limit: int = None) -> List[Dict]:
+    """
+    Busca eventos em toda a história, incluindo os que já saíram da memória episódica.
     
-    save_memory(memory)
-    log_activity(f"Evento registrado: {event_type}")
+    Args:
+        event_type: Filtrar por tipo (opcional)
+        start: Início do período, inclusive (ISO ou datetime, opcional)
+        end: Fim do período, inclusive (ISO ou datetime, opcional)
+        limit: Manter só os N eventos mais recentes (opcional)
+        
+    Returns:
+        Eventos em ordem cronológica
+    """
+    return get_memory_store().search_events(event_type, start, end, limit)
 
 def log_activity(message: str, level: str = "INFO"):
-    """Registra uma atividade no log humanamente legível."""
+    """
+    Registra uma atividade no log humanamente legível.
+    
+    A linha é gravada em segundo plano (ver ActivityLogWriter); use
+    flush_memory() para esperar a gravação.
+    """
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     log_line = f"[{timestamp}] [{level}] {message}\n"
     
-    with open(ACTIVITY_LOG, "a", encoding="utf-8") as f:
-        f.write(log_line)
+    get_activity_writer().write(log_line)
     
     print(log_line.strip())
 
 def record_project_action(project_path: str, action: str, details: Dict):
     """Registra uma ação realizada em um projeto."""
-    memory = load_memory()
-    
-    if project_path not in memory["project_history"]:
-        memory["project_history"][project_path] = {
-            "first_seen": datetime.now().isoformat(),
-            "actions": []
-        }
-    
-    memory["project_history"][project_path]["actions"].append({
-        "timestamp": datetime.now().isoformat(),
-        "action": action,
-        "details": details
-    })
-    
-    save_memory(memory)
+    get_memory_store().record_project_action(project_path, action, details)
     log_activity(f"Projeto {os.path.basename(project_path)}: {action}")
 
+def get_project_actions(project_path: str, limit: int = None) -> List[Dict]:
+    """Retorna as ações registradas em um projeto, da mais antiga à mais recente."""
+    return get_memory_store().get_project_actions(project_path, limit)
+
 def learn_pattern(pattern_name: str, pattern_data: Dict):
     """Aprende um novo padrão ou atualiza um existente."""
-    memory = load_memory()
-    
-    if pattern_name not in memory["learned_patterns"]:
-        memory["learned_patterns"][pattern_name] = {
-            "first_learned": datetime.now().isoformat(),
-            "occurrences": 0,
-            "data": pattern_data,
-            "relevance_score": 1.0 # Score de relevância inicial
-        }
-    
-    memory["learned_patterns"][pattern_name]["occurrences"] += 1
-    memory["learned_patterns"][pattern_name]["last_seen"] = datetime.now().isoformat()
-    # Lógica para ajustar relevance_score com base no uso ou sucesso
-    
-    save_memory(memory)
+    get_memory_store().learn_pattern(pattern_name, pattern_data)
     log_activity(f"Padrão aprendido/atualizado: {pattern_name}")
 
+def get_pattern(pattern_name: str) -> Optional[Dict]:
+    """Retorna um padrão aprendido pelo nome."""
+    return get_memory_store().get_pattern(pattern_name)
+
 def store_semantic_knowledge(concept: str, knowledge: Any):
     """
     Armazena conhecimento semântico (fatos, definições, relações).
     Pode ser um simples dicionário ou integrar com um banco de dados de grafo.
     """
-    memory = load_memory()
-    memory["semantic_memory"][concept] = {
-        "data": knowledge,
-        "last_updated": datetime.now().isoformat()
-    }
-    save_memory(memory)
+    get_memory_store().store_semantic(concept, knowledge)
     log_activity(f"Conhecimento semântico armazenado: {concept}")
 
 def retrieve_semantic_knowledge(concept: str) -> Optional[Any]:
     """
     Recupera conhecimento semântico.
     """
-    memory = load_memory()
-    return memory.get("semantic_memory", {}).get(concept, None)
+    return get_memory_store().get_semantic(concept)
+
+def get_semantic_memory() -> Dict:
+    """
+    Retorna todo o conhecimento semântico (conceito -> dados).
+    """
+    return get_memory_store().get_semantic_memory()
 
 def get_working_memory() -> List[Dict]:
     """
     Retorna o conteúdo atual da memória de trabalho (eventos recentes).
     """
-    memory = load_memory()
-    return memory.get("working_memory", [])
+    return get_memory_store().get_working_memory()
 
 def clear_working_memory():
     """
     Limpa a memória de trabalho.
     """
-    memory = load_memory()
-    memory["working_memory"] = []
-    save_memory(memory)
+    get_memory_store().clear_working_memory()
     log_activity("Memória de trabalho limpa.")
 
 if __name__ == "__main__":
+    if "--migrate" in sys.argv:
+        # Migração do arquivo JSON para o banco SQLite (memory_backend = "sqlite")
+        counts = migrate_to_sqlite(force="--force" in sys.argv)
+        if counts:
+            print(f"Memória migrada para {MEMORY_DB}: {counts}")
+        else:
+            print(f"Nada a migrar (banco já migrado ou {MEMORY_FILE} inexistente). Use --force para repetir.")
+        sys.exit(0)
+    
     # Teste do memory manager
     print("Testando Memory Manager...")
     
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# core/memory_sqlite.py
+"""
+Backend SQLite da memória do J.A.R.V.I.S.
+Cada parte da memória tem sua tabela, com índices para as consultas do
+dia a dia (eventos por tipo e data, padrões por nome, ações por projeto e
+data). O banco usa WAL, então a thread de voz, a de atualização e o
+dashboard leem em paralelo enquanto um deles escreve.
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from core.memory_archive import ARCHIVE_BATCH, EventArchive, archive_dir_for
+from core.persistence import file_lock
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS preferences (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_type_ts ON events(type, timestamp);
+CREATE TABLE IF NOT EXISTS archive_pending (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS working_memory (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS patterns (
+    name TEXT PRIMARY KEY,
+    first_learned TEXT NOT NULL,
+    last_seen TEXT,
+    occurrences INTEGER NOT NULL DEFAULT 0,
+    relevance_score REAL NOT NULL DEFAULT 1.0,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS semantic (
+    concept TEXT PRIMARY KEY,
+    data TEXT,
+    last_updated TEXT
+);
+CREATE TABLE IF NOT EXISTS projects (
+    path TEXT PRIMARY KEY,
+    first_seen TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS project_actions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    action TEXT NOT NULL,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_project_actions_path_ts ON project_actions(path, timestamp);
+"""
+
+def _dump(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+def _event(row) -> Dict:
+    return {"timestamp": row[0], "type": row[1], "data": json.loads(row[2])}
+
+class SQLiteMemoryStore:
+    """
+    Memória do J.A.R.V.I.S num banco SQLite em modo WAL.
+
+    Tem a mesma interface do MemoryStore em JSON. Cada thread usa sua própria
+    conexão; toda escrita é uma transação curta e inserções custam O(log n)
+    nos índices, independente do tamanho da memória. Os eventos que saem da
+    tabela de eventos (além de episodic_limit) passam, na mesma transação,
+    para a tabela archive_pending, e de lá para o arquivo histórico a cada
+    ARCHIVE_BATCH eventos e no flush(); uma queda no meio do caminho não
+    perde nenhum evento.
+    """
+
+    def __init__(self, path: str, defaults: Dict = None, episodic_limit: int = 1000,
+                 working_limit: int = 10, archive_dir: str = None):
+        self.path = path
+        self.episodic_limit = episodic_limit
+        self.working_limit = working_limit
+        self.archive = EventArchive(archive_dir or archive_dir_for(path))
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            conn.executemany(
+                "INSERT OR IGNORE INTO preferences (key, value) VALUES (?, ?)",
+                [(key, _dump(value)) for key, value in (defaults or {}).items()]
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Preferências ---
+
+    def get_preference(self, key: str, default: Any = None) -> Any:
+        row = self._conn().execute("SELECT value FROM preferences WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def get_preferences(self) -> Dict:
+        rows = self._conn().execute("SELECT key, value FROM preferences").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def set_preference(self, key: str, value: Any):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO preferences (key, value) VALUES (?, ?)", (key, _dump(value)))
+
+    # --- Eventos e memória de trabalho ---
+
+    def log_event(self, event_type: str, data: Dict) -> Dict:
+        event = {"timestamp": datetime.now().isoformat(), "type": event_type, "data": data}
+        row = (event["timestamp"], event_type, _dump(data))
+        with self._conn() as conn:
+            event_id = conn.execute("INSERT INTO events (timestamp, type, data) VALUES (?, ?, ?)", row).lastrowid
+            cutoff = event_id - self.episodic_limit
+            evicted = conn.execute(
+                "INSERT INTO archive_pending (timestamp, type, data) "
+                "SELECT timestamp, type, data FROM events WHERE id <= ? ORDER BY id", (cutoff,)
+            ).rowcount
+            if evicted:
+                conn.execute("DELETE FROM events WHERE id <= ?", (cutoff,))
+            work_id = conn.execute("INSERT INTO working_memory (timestamp, type, data) VALUES (?, ?, ?)", row).lastrowid
+            conn.execute("DELETE FROM working_memory WHERE id <= ?", (work_id - self.working_limit,))
+        if evicted > 0:
+            pending = self._conn().execute("SELECT COUNT(*) FROM archive_pending").fetchone()[0]
+            if pending >= ARCHIVE_BATCH:
+                self.flush()
+        return event
+
+    def get_recent_events(self, limit: int = 10, event_type: str = None) -> List[Dict]:
+        if event_type is None:
+            rows = self._conn().execute(
+                "SELECT timestamp, type, data FROM events ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        else:
+            rows = self._conn().execute(
+                "SELECT timestamp, type, data FROM events WHERE type = ? ORDER BY timestamp DESC LIMIT ?",
+                (event_type, limit)
+            ).fetchall()
+        return [_event(row) for row in reversed(rows)]
+
+    def search_events(self, event_type: str = None, start=None, end=None,
+                      limit: int = None) -> List[Dict]:
+        sql, params = "SELECT timestamp, type, data FROM events WHERE 1 = 1", []
+        if event_type is not None:
+            sql, params = sql + " AND type = ?", params + [event_type]
+        hot = [_event(row) for row in self._conn().execute(sql + " ORDER BY id", params)]
+        staged = [_event(row) for row in self._conn().execute(
+            "SELECT timestamp, type, data FROM archive_pending ORDER BY id")]
+        results = self.archive.query(event_type, start, end)
+        results.extend(EventArchive.matching(staged, event_type, start, end))
+        results.extend(EventArchive.matching(hot, None, start, end))
+        return results[-limit:] if limit else results
+
+    def get_working_memory(self) -> List[Dict]:
+        rows = self._conn().execute("SELECT timestamp, type, data FROM working_memory ORDER BY id").fetchall()
+        return [_event(row) for row in rows]
+
+    def clear_working_memory(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM working_memory")
+
+    # --- Projetos, padrões e conhecimento semântico ---
+
+    def record_project_action(self, project_path: str, action: str, details: Dict):
+        now = datetime.now().isoformat()
+        with self._conn() as conn:
+            conn.execute("INSERT OR IGNORE INTO projects (path, first_seen) VALUES (?, ?)", (project_path, now))
+            conn.execute(
+                "INSERT INTO project_actions (path, timestamp, action, details) VALUES (?, ?, ?, ?)",
+                (project_path, now, action, _dump(details))
+            )
+
+    def get_project_actions(self, project_path: str, limit: int = None) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT timestamp, action, details FROM project_actions WHERE path = ? "
+            "ORDER BY timestamp DESC LIMIT ?", (project_path, -1 if limit is None else limit)
+        ).fetchall()
+        return [{"timestamp": ts, "action": action, "details": json.loads(details)}
+                for ts, action, details in reversed(rows)]
+
+    def learn_pattern(self, pattern_name: str, pattern_data: Dict):
+        now = datetime.now().isoformat()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO patterns (name, first_learned, last_seen, occurrences, data) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT(name) DO UPDATE SET occurrences = occurrences + 1, last_seen = excluded.last_seen",
+                (pattern_name, now, now, _dump(pattern_data))
+            )
+
+    def get_pattern(self, pattern_name: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT first_learned, occurrences, data, relevance_score, last_seen FROM patterns WHERE name = ?",
+            (pattern_name,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"first_learned": row[0], "occurrences": row[1], "data": json.loads(row[2]),
+                "relevance_score": row[3], "last_seen": row[4]}
+
+    def store_semantic(self, concept: str, knowledge: Any):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO semantic (concept, data, last_updated) VALUES (?, ?, ?)",
+                (concept, _dump(knowledge), datetime.now().isoformat())
+            )
+
+    def get_semantic(self, concept: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT data, last_updated FROM semantic WHERE concept = ?", (concept,)
+        ).fetchone()
+        return {"data": json.loads(row[0]), "last_updated": row[1]} if row else None
+
+    def get_semantic_memory(self) -> Dict:
+        rows = self._conn().execute("SELECT concept, data, last_updated FROM semantic").fetchall()
+        return {concept: {"data": json.loads(data), "last_updated": updated} for concept, data, updated in rows}
+
+    # --- Memória inteira ---
+
+    def load(self) -> Dict:
+        """Monta a memória inteira no formato do arquivo JSON."""
+        conn = self._conn()
+        patterns = {name: self.get_pattern(name) for (name,) in conn.execute("SELECT name FROM patterns")}
+        projects = {
+            path: {"first_seen": first_seen, "actions": self.get_project_actions(path)}
+            for path, first_seen in conn.execute("SELECT path, first_seen FROM projects").fetchall()
+        }
+        return {
+            "preferences": self.get_preferences(),
+            "working_memory": self.get_working_memory(),
+            "episodic_memory": self.get_recent_events(self.episodic_limit),
+            "semantic_memory": self.get_semantic_memory(),
+            "learned_patterns": patterns,
+            "project_history": projects
+        }
+
+    def replace(self, memory: Dict):
+        """Substitui todo o conteúdo do banco pela memória no formato JSON (uma transação)."""
+        def events(items):
+            return [(e.get("timestamp", ""), e.get("type", ""), _dump(e.get("data"))) for e in items]
+
+        with self._conn() as conn:
+            for table in ("preferences", "events", "working_memory", "patterns", "semantic",
+                          "projects", "project_actions"):
+                conn.execute(f"DELETE FROM {table}")
+            conn.executemany("INSERT INTO preferences (key, value) VALUES (?, ?)",
+                             [(k, _dump(v)) for k, v in memory.get("preferences", {}).items()])
+            conn.executemany("INSERT INTO events (timestamp, type, data) VALUES (?, ?, ?)",
+                             events(memory.get("episodic_memory", [])))
+            conn.executemany("INSERT INTO working_memory (timestamp, type, data) VALUES (?, ?, ?)",
+                             events(memory.get("working_memory", [])))
+            conn.executemany(
+                "INSERT INTO patterns (name, first_learned, last_seen, occurrences, relevance_score, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(name, p.get("first_learned", ""), p.get("last_seen"), p.get("occurrences", 0),
+                  p.get("relevance_score", 1.0), _dump(p.get("data")))
+                 for name, p in memory.get("learned_patterns", {}).items()]
+            )
+            conn.executemany("INSERT INTO semantic (concept, data, last_updated) VALUES (?, ?, ?)",
+                             [(c, _dump(k.get("data")), k.get("last_updated"))
+                              for c, k in memory.get("semantic_memory", {}).items()])
+            for path, project in memory.get("project_history", {}).items():
+                conn.execute("INSERT INTO projects (path, first_seen) VALUES (?, ?)",
+                             (path, project.get("first_seen", "")))
+                conn.executemany(
+                    "INSERT INTO project_actions (path, timestamp, action, details) VALUES (?, ?, ?, ?)",
+                    [(path, a.get("timestamp", ""), a.get("action", ""), _dump(a.get("details")))
+                     for a in project.get("actions", [])]
+                )
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def flush(self):
+        """
+        Move os eventos de archive_pending para o arquivo histórico.
+
+        Os eventos só saem da tabela depois de gravados nos segmentos, sob o
+        lock do arquivo histórico, então dois processos não gravam o mesmo
+        evento duas vezes e uma queda entre as etapas não perde nenhum.
+        """
+        with file_lock(self.archive.directory):
+            conn = self._conn()
+            rows = conn.execute("SELECT id, timestamp, type, data FROM archive_pending ORDER BY id").fetchall()
+            if not rows:
+                return
+            self.archive.write([_event(row[1:]) for row in rows])
+            with conn:
+                conn.execute("DELETE FROM archive_pending WHERE id <= ?", (rows[-1][0],))
+
+    def close(self):
+        """Grava o arquivo histórico pendente e fecha a conexão da thread atual."""
+        self.flush()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+def migrate_from_json(json_path: str, store: SQLiteMemoryStore, force: bool = False) -> Dict:
+    """
+    Importa uma única vez o arquivo JSON da memória para o banco SQLite.
+
+    Args:
+        json_path: Caminho do ~/.jarvis_memory.json
+        store: Banco de destino
+        force: Importar de novo mesmo se a migração já foi feita
+
+    Returns:
+        Contagem de itens importados (vazio se nada foi feito)
+    """
+    if not os.path.exists(json_path):
+        return {}
+    if store.get_meta("migrated_from") and not force:
+        return {}
+    with open(json_path, "r", encoding="utf-8") as f:
+        memory = json.load(f)
+    store.replace(memory)
+    store.set_meta("migrated_from", json_path)
+    store.set_meta("migrated_at", datetime.now().isoformat())
+    return {
+        "preferences": len(memory.get("preferences", {})),
+        "events": len(memory.get("episodic_memory", [])),
+        "patterns": len(memory.get("learned_patterns", {})),
+        "semantic": len(memory.get("semantic_memory", {})),
+        "projects": len(memory.get("project_history", {}))
+    }
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# core/persistence.py
+"""
+Persistência segura dos arquivos do J.A.R.V.I.S.
+A thread de voz, a de atualização e o dashboard gravam os mesmos arquivos.
+Toda gravação vai para um arquivo temporário no mesmo diretório, passa por
+fsync e substitui o original com os.replace, então uma queda nunca deixa um
+arquivo pela metade. Locks consultivos (fcntl) serializam as gravações entre
+processos, e as leituras reaproveitam o JSON já interpretado enquanto
+inode, mtime e tamanho do arquivo não mudarem.
+"""
+import copy
+import json
+import os
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows
+    FCNTL_AVAILABLE = False
+
+LOCK_SUFFIX = ".lock"
+
+# Permissões de arquivos novos (mkstemp cria com 0600); a umask só pode ser lida trocando-a
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+_CACHE: Dict[str, Tuple[Tuple[int, int, int], Any]] = {}
+_CACHE_LOCK = threading.Lock()
+_THREAD_LOCKS: Dict[str, threading.RLock] = {}
+_HELD = threading.local()  # Caminhos cujo lock a thread atual já detém
+
+def _thread_lock(path: str) -> threading.RLock:
+    with _CACHE_LOCK:
+        return _THREAD_LOCKS.setdefault(os.path.abspath(path), threading.RLock())
+
+@contextmanager
+def file_lock(path: str, shared: bool = False) -> Iterator[None]:
+    """
+    Lock consultivo sobre um arquivo, válido entre processos.
+
+    O lock fica num arquivo lateral (<path>.lock), que sobrevive aos
+    os.replace do arquivo protegido. Dentro do processo, gravações no mesmo
+    caminho também são serializadas por um RLock, e o lock pode ser aninhado
+    na mesma thread (ex.: ler-alterar-gravar chamando write_json). Sem fcntl
+    (Windows) só o RLock é usado.
+
+    Args:
+        path: Arquivo protegido
+        shared: Lock compartilhado (leitura) em vez de exclusivo
+
+    Raises:
+        FileNotFoundError: Se o diretório do arquivo não existir
+    """
+    key = os.path.abspath(path)
+    held = _HELD.__dict__.setdefault("paths", set())
+    directory = os.path.dirname(key)
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(f"Diretório inexistente para o lock: {directory}")
+    with _thread_lock(key):
+        if key in held or not FCNTL_AVAILABLE:
+            # Aninhado: o flock de um segundo descritor travaria contra o primeiro
+            yield
+            return
+        with open(key + LOCK_SUFFIX, "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            held.add(key)
+            try:
+                yield
+            finally:
+                held.discard(key)
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def fsync_dir(directory: str):
+    """Garante no disco a entrada de diretório de um os.replace (no-op onde não é suportado)."""
+    if os.name != "posix":
+        return
+    fd = os.open(directory or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def atomic_write(path: str, write: Callable[[Any], None], binary: bool = False):
+    """
+    Grava um arquivo de forma atômica: temporário + fsync + os.replace.
+
+    O arquivo gravado mantém as permissões do original (ou, se for novo,
+    as permissões padrão dadas pela umask).
+
+    Args:
+        path: Arquivo de destino
+        write: Função que recebe o arquivo temporário aberto e grava o conteúdo
+        binary: Abrir o temporário em modo binário
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb" if binary else "w", **({} if binary else {"encoding": "utf-8"})) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    fsync_dir(directory)
+    invalidate(path)
+
+def write_json(path: str, data: Any, indent: int = 2, ensure_ascii: bool = False):
+    """
+    Grava JSON de forma atômica, sob lock exclusivo.
+
+    Args:
+        path: Arquivo de destino (o diretório deve existir)
+        data: Objeto serializável
+        indent: Indentação do JSON
+        ensure_ascii: Escapar caracteres não ASCII
+    """
+    with file_lock(path):
+        atomic_write(path, lambda f: json.dump(data, f, indent=indent, ensure_ascii=ensure_ascii))
+
+def file_signature(path: str) -> Tuple[int, int, int]:
+    """Versão de um arquivo: (inode, mtime_ns, tamanho); muda a cada gravação atômica."""
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+def read_json(path: str, default: Any = None, copy_result: bool = True) -> Any:
+    """
+    Lê um arquivo JSON, reaproveitando o resultado anterior se o arquivo não mudou.
+
+    Cada gravação atômica cria um novo inode, então (inode, mtime, tamanho)
+    identifica a versão do arquivo sem abri-lo.
+
+    Args:
+        path: Arquivo JSON
+        default: Valor retornado se o arquivo não existir
+        copy_result: Retornar uma cópia (use False só para leitura, sem alterar o resultado)
+
+    Returns:
+        Conteúdo do arquivo
+    """
+    try:
+        signature = file_signature(path)
+    except FileNotFoundError:
+        return default
+    key = os.path.abspath(path)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(key)
+    if cached is not None and cached[0] == signature:
+        data = cached[1]
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with _CACHE_LOCK:
+            _CACHE[key] = (signature, data)
+    return copy.deepcopy(data) if copy_result else data
+
+def update_json(path: str, update: Callable[[Any], Any], default: Any = None, indent: int = 2,
+                ensure_ascii: bool = False) -> Any:
+    """
+    Lê, altera e grava um arquivo JSON sob um único lock exclusivo.
+
+    Evita que duas gravações concorrentes (ex.: set_config no dashboard e no
+    assistente) percam as alterações uma da outra.
+
+    Args:
+        path: Arquivo JSON
+        update: Função que recebe o conteúdo atual e retorna o novo (pode alterar no lugar)
+        default: Conteúdo inicial se o arquivo não existir
+
+    Returns:
+        O conteúdo gravado
+    """
+    with file_lock(path):
+        current = read_json(path, copy.deepcopy(default))
+        data = update(current)
+        if data is None:
+            data = current
+        atomic_write(path, lambda f: json.dump(data, f, indent=indent, ensure_ascii=ensure_ascii))
+        return data
+
+def invalidate(path: str):
+    """Descarta a leitura em cache de um arquivo."""
+    with _CACHE_LOCK:
+        _CACHE.pop(os.path.abspath(path), None)
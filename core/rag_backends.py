@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# core/rag_backends.py
+"""
+Backends de busca vetorial aproximada (ANN) do RAG.
+Usa FAISS ou Annoy quando instalados e, na falta deles (ex.: Termux), um
+índice IVF em NumPy puro, particionado por k-means.
+"""
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Tentar importar FAISS
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# Tentar importar Annoy
+try:
+    from annoy import AnnoyIndex
+    ANNOY_AVAILABLE = True
+except ImportError:
+    ANNOY_AVAILABLE = False
+
+def top_k_rows(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Seleciona os índices dos top_k maiores scores, em ordem decrescente.
+    Usa argpartition (O(n)) e só ordena os k selecionados.
+    """
+    n = scores.shape[0]
+    if top_k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if top_k < n:
+        part = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        part = np.arange(n)
+    return part[np.argsort(-scores[part], kind="stable")]
+
+def top_k_rows_batch(scores: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Versão em lote de top_k_rows para uma matriz de scores (consultas, linhas).
+
+    Returns:
+        Tupla (linhas, scores), ambas com forma (consultas, k)
+    """
+    n = scores.shape[1]
+    k = min(top_k, n)
+    if k <= 0:
+        empty = np.zeros((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(scores.dtype)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < n else np.tile(np.arange(n), (scores.shape[0], 1))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+class VectorBackend:
+    """
+    Interface comum dos backends.
+
+    As linhas são numeradas pela ordem de inserção (0, 1, 2, ...), a mesma
+    numeração das linhas do VectorIndex que usa o backend.
+    """
+
+    name = "base"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.count = 0
+
+    def build(self, vectors: np.ndarray):
+        """Constrói o backend do zero com os vetores fornecidos."""
+        raise NotImplementedError
+
+    def add(self, vectors: np.ndarray):
+        """Acrescenta vetores ao fim do backend."""
+        raise NotImplementedError
+
+    def search(self, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca os top_k vetores de maior produto interno com a consulta.
+
+        Returns:
+            Tupla (linhas, scores) em ordem decrescente de score
+        """
+        raise NotImplementedError
+
+    def search_many(self, queries: np.ndarray, top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Busca várias consultas; os backends com API em lote sobrescrevem este método."""
+        return [self.search(q, top_k) for q in queries]
+
+    def save(self, path: str):
+        """Persiste o backend em disco."""
+        raise NotImplementedError
+
+    @classmethod
+    def load(cls, path: str) -> "VectorBackend":
+        """Carrega um backend salvo com save()."""
+        raise NotImplementedError
+
+class ExactBackend(VectorBackend):
+    """Busca exata por força bruta (referência para os backends aproximados)."""
+
+    name = "exact"
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+
+    def build(self, vectors: np.ndarray):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.count = self.vectors.shape[0]
+
+    def add(self, vectors: np.ndarray):
+        self.build(np.vstack([self.vectors, np.asarray(vectors, dtype=np.float32)]))
+
+    def search(self, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self.vectors @ np.asarray(query, dtype=np.float32)
+        rows = top_k_rows(scores, top_k)
+        return rows, scores[rows]
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            np.save(f, self.vectors)
+
+    @classmethod
+    def load(cls, path: str) -> "ExactBackend":
+        vectors = np.load(path)
+        backend = cls(vectors.shape[1])
+        backend.build(vectors)
+        return backend
+
+class NumpyIVFBackend(VectorBackend):
+    """
+    Índice IVF (inverted file) em NumPy puro.
+
+    Os vetores são particionados por k-means esférico em nlist listas. A busca
+    compara a consulta com os centróides e só pontua as linhas das nprobe
+    listas mais próximas.
+    """
+
+    name = "ivf"
+
+    def __init__(self, dim: int, nlist: int = None, nprobe: int = 8, iters: int = 10,
+                 sample_size: int = 65536, seed: int = 0):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iters = iters
+        self.sample_size = sample_size
+        self.seed = seed
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.centroids = np.zeros((0, dim), dtype=np.float32)
+        self.lists = []
+
+    def _assign(self, vectors: np.ndarray, block: int = 65536) -> np.ndarray:
+        """Centróide mais próximo de cada vetor, em blocos para limitar memória."""
+        out = np.empty(vectors.shape[0], dtype=np.int64)
+        for i in range(0, vectors.shape[0], block):
+            out[i:i + block] = np.argmax(vectors[i:i + block] @ self.centroids.T, axis=1)
+        return out
+
+    def _train(self, vectors: np.ndarray):
+        n = vectors.shape[0]
+        nlist = self.nlist or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(self.seed)
+        sample = vectors[rng.choice(n, min(n, self.sample_size), replace=False)]
+        self.centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+
+        for _ in range(self.iters):
+            assign = self._assign(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            filled = counts > 0  # Listas vazias mantêm o centróide anterior
+            norms = np.linalg.norm(sums[filled], axis=1, keepdims=True)
+            self.centroids[filled] = sums[filled] / (norms + 1e-9)
+
+    def build(self, vectors: np.ndarray):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.count = self.vectors.shape[0]
+        if self.count == 0:
+            self.centroids = np.zeros((0, self.dim), dtype=np.float32)
+            self.lists = []
+            return
+        self._train(self.vectors)
+        assign = self._assign(self.vectors)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(self.centroids.shape[0] + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(self.centroids.shape[0])]
+
+    def add(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(self.lists):
+            self.build(np.vstack([self.vectors, vectors]))
+            return
+        rows = np.arange(self.count, self.count + vectors.shape[0])
+        assign = self._assign(vectors)
+        for c in np.unique(assign):
+            self.lists[c] = np.concatenate([self.lists[c], rows[assign == c]])
+        self.vectors = np.vstack([self.vectors, vectors])
+        self.count = self.vectors.shape[0]
+
+    def search(self, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.count:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32)
+        probe = top_k_rows(self.centroids @ query, self.nprobe)
+        candidates = np.concatenate([self.lists[c] for c in probe])
+        scores = self.vectors[candidates] @ query
+        best = top_k_rows(scores, top_k)
+        return candidates[best], scores[best]
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                vectors=self.vectors,
+                centroids=self.centroids,
+                rows=np.concatenate(self.lists) if self.lists else np.zeros(0, dtype=np.int64),
+                sizes=np.array([len(l) for l in self.lists], dtype=np.int64),
+                nprobe=np.array(self.nprobe)
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyIVFBackend":
+        with np.load(path) as data:
+            backend = cls(data["vectors"].shape[1], nprobe=int(data["nprobe"]))
+            backend.vectors = data["vectors"]
+            backend.centroids = data["centroids"]
+            backend.count = backend.vectors.shape[0]
+            bounds = np.concatenate([[0], np.cumsum(data["sizes"])])
+            backend.lists = [data["rows"][bounds[c]:bounds[c + 1]] for c in range(len(bounds) - 1)]
+        return backend
+
+class FaissBackend(VectorBackend):
+    """Backend FAISS: busca exata (IndexFlatIP) ou IVF para corpora grandes."""
+
+    name = "faiss"
+
+    def __init__(self, dim: int, ivf_threshold: int = 50000, nprobe: int = 8):
+        super().__init__(dim)
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.index = faiss.IndexFlatIP(dim)
+
+    def build(self, vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = vectors.shape[0]
+        if n >= self.ivf_threshold:
+            nlist = int(np.sqrt(n))
+            quantizer = faiss.IndexFlatIP(self.dim)
+            self.index = faiss.IndexIVFFlat(quantizer, self.dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            self.index.train(vectors)
+            self.index.nprobe = self.nprobe
+        else:
+            self.index = faiss.IndexFlatIP(self.dim)
+        if n:
+            self.index.add(vectors)
+        self.count = n
+
+    def add(self, vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.index.add(vectors)
+        self.count += vectors.shape[0]
+
+    def search(self, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.count:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = np.ascontiguousarray(query, dtype=np.float32).reshape(1, -1)
+        scores, rows = self.index.search(query, min(top_k, self.count))
+        valid = rows[0] >= 0
+        return rows[0][valid].astype(np.int64), scores[0][valid]
+
+    def search_many(self, queries: np.ndarray, top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if not self.count:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        scores, rows = self.index.search(queries, min(top_k, self.count))
+        return [(r[r >= 0].astype(np.int64), s[r >= 0]) for r, s in zip(rows, scores)]
+
+    def save(self, path: str):
+        faiss.write_index(self.index, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FaissBackend":
+        index = faiss.read_index(path)
+        backend = cls(index.d)
+        backend.index = index
+        backend.count = index.ntotal
+        return backend
+
+class AnnoyBackend(VectorBackend):
+    """
+    Backend Annoy (florestas de projeções aleatórias).
+
+    Annoy não aceita inserções após o build, então novas linhas marcam o
+    índice para reconstrução na próxima busca.
+    """
+
+    name = "annoy"
+
+    def __init__(self, dim: int, n_trees: int = 20):
+        super().__init__(dim)
+        self.n_trees = n_trees
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.index = None
+
+    def build(self, vectors: np.ndarray):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.count = self.vectors.shape[0]
+        self.index = AnnoyIndex(self.dim, "dot")
+        for row, vector in enumerate(self.vectors):
+            self.index.add_item(row, vector)
+        self.index.build(self.n_trees)
+
+    def add(self, vectors: np.ndarray):
+        self.vectors = np.vstack([self.vectors, np.asarray(vectors, dtype=np.float32)])
+        self.count = self.vectors.shape[0]
+        self.index = None
+
+    def search(self, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.count:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if self.index is None:
+            self.build(self.vectors)
+        rows, scores = self.index.get_nns_by_vector(np.asarray(query, dtype=np.float32), top_k, include_distances=True)
+        return np.array(rows, dtype=np.int64), np.array(scores, dtype=np.float32)
+
+    def save(self, path: str):
+        if self.index is None:
+            self.build(self.vectors)
+        self.index.save(path)
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "n_trees": self.n_trees, "count": self.count}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "AnnoyBackend":
+        with open(path + ".json", "r", encoding="utf-8") as f:
+            info = json.load(f)
+        backend = cls(info["dim"], info["n_trees"])
+        backend.index = AnnoyIndex(info["dim"], "dot")
+        backend.index.load(path)
+        backend.count = info["count"]
+        backend.vectors = np.array(
+            [backend.index.get_item_vector(i) for i in range(backend.count)], dtype=np.float32
+        ).reshape(-1, info["dim"])
+        return backend
+
+BACKENDS: Dict[str, type] = {
+    "exact": ExactBackend,
+    "ivf": NumpyIVFBackend,
+    "faiss": FaissBackend,
+    "annoy": AnnoyBackend,
+}
+
+def available_backends() -> list:
+    """Nomes dos backends utilizáveis neste ambiente."""
+    names = ["exact", "ivf"]
+    if FAISS_AVAILABLE:
+        names.append("faiss")
+    if ANNOY_AVAILABLE:
+        names.append("annoy")
+    return names
+
+def resolve_backend_name(name: str = "auto") -> str:
+    """Nome concreto do backend: "auto" escolhe FAISS, depois Annoy, e por fim o IVF em NumPy."""
+    if name == "auto":
+        return "faiss" if FAISS_AVAILABLE else "annoy" if ANNOY_AVAILABLE else "ivf"
+    return name
+
+def get_backend(name: str = "auto", dim: int = 16, **kwargs) -> VectorBackend:
+    """
+    Cria um backend vetorial.
+
+    Args:
+        name: "auto", "faiss", "annoy", "ivf" ou "exact". "auto" escolhe FAISS,
+            depois Annoy, e por fim o IVF em NumPy
+        dim: Dimensão dos vetores
+        **kwargs: Parâmetros específicos do backend (ex.: nprobe)
+
+    Returns:
+        Instância do backend (vazia; use build() para preenchê-la)
+    """
+    name = resolve_backend_name(name)
+    if name not in BACKENDS:
+        raise ValueError(f"Backend desconhecido: {name}")
+    if name not in available_backends():
+        raise ImportError(f"Backend '{name}' não está instalado")
+    return BACKENDS[name](dim, **kwargs)
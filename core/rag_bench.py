@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# core/rag_bench.py
+"""
+Benchmark de desempenho do RAG com corpora sintéticos.
+Mede tempo de construção do índice, latência de consultas simples e em lote
+(p50/p95/p99), pico de memória (RSS) e tamanho do índice em disco, e compara
+os resultados com um baseline salvo em JSON para detectar regressões.
+"""
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+# Adicionar o diretório pai ao path para imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core import rag_core
+
+# Pico de RSS só está disponível em sistemas Unix
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+BASELINE_FILE = os.path.join(rag_core.DATA_DIR, "rag_bench_baseline.json")
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+REGRESSION_THRESHOLD = 0.2  # 20% pior que o baseline
+
+# Métricas comparadas (todas: menor é melhor)
+COMPARED_METRICS = [
+    "build_s", "single_p50_ms", "single_p95_ms", "single_p99_ms",
+    "batch_p50_ms", "batch_p95_ms", "batch_p99_ms", "peak_rss_mb", "index_bytes"
+]
+
+_VOCAB = (
+    "projeto arquivo funcao classe modulo teste erro log patch commit branch "
+    "servidor cliente banco dados consulta indice documento memoria voz camera "
+    "python node script config ambiente pacote rede api token cache fila "
+    "usuario sessao evento metrica alerta backup deploy build versao"
+).split()
+
+def synthetic_docs(n: int, seed: int = 0, words: int = 40) -> List[Dict]:
+    """
+    Gera um corpus sintético determinístico.
+
+    Args:
+        n: Número de documentos
+        seed: Semente do gerador
+        words: Palavras por documento
+
+    Returns:
+        Lista de documentos com id, title, text e source
+    """
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"bench{i}",
+            "title": f"Documento {i}",
+            "text": " ".join(rng.choices(_VOCAB, k=words)) + f" item{i}",
+            "source": "bench"
+        }
+        for i in range(n)
+    ]
+
+def _percentiles(samples: List[float], prefix: str) -> Dict[str, float]:
+    p50, p95, p99 = np.percentile(np.array(samples) * 1000.0, [50, 95, 99])
+    return {f"{prefix}_p50_ms": float(p50), f"{prefix}_p95_ms": float(p95), f"{prefix}_p99_ms": float(p99)}
+
+def _peak_rss_mb() -> float:
+    if not RESOURCE_AVAILABLE:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+def run_size(n: int, queries: int = 200, batch_size: int = 32, top_k: int = 5,
+             quantized: bool = False, seed: int = 0) -> Dict:
+    """
+    Executa o benchmark para um tamanho de corpus.
+
+    As latências medem index.search/search_many (sem o cache de consultas),
+    que é o caminho usado por retrieve() e retrieve_many().
+
+    Args:
+        n: Número de documentos
+        queries: Número de consultas medidas
+        batch_size: Consultas por lote na medição em lote
+        top_k: Documentos por consulta
+        quantized: Se deve usar o índice int8
+        seed: Semente do corpus e das consultas
+
+    Returns:
+        Dicionário com as métricas
+    """
+    docs = synthetic_docs(n, seed)
+    rng = random.Random(seed + 1)
+    query_texts = [" ".join(rng.choices(_VOCAB, k=4)) for _ in range(queries)]
+
+    start = time.perf_counter()
+    index = rag_core.build_index(docs, quantized=quantized)
+    build_s = time.perf_counter() - start
+    del docs
+
+    single = []
+    for query in query_texts:
+        start = time.perf_counter()
+        index.search(query, top_k)
+        single.append(time.perf_counter() - start)
+
+    batched = []
+    for i in range(0, len(query_texts), batch_size):
+        start = time.perf_counter()
+        index.search_many(query_texts[i:i + batch_size], top_k)
+        batched.append(time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench" + rag_core.INDEX_SUFFIX)
+        index.save(path)
+        index_bytes = os.path.getsize(path)
+
+    result = {"docs": n, "build_s": build_s}
+    result.update(_percentiles(single, "single"))
+    result.update(_percentiles(batched, "batch"))
+    result["batch_qps"] = len(query_texts) / sum(batched) if batched else 0.0
+    result["peak_rss_mb"] = _peak_rss_mb()
+    result["index_bytes"] = index_bytes
+    return result
+
+def _run_isolated(n: int, **kwargs) -> Dict:
+    """Roda run_size num processo novo, para que o pico de RSS seja só deste tamanho."""
+    cmd = [sys.executable, os.path.abspath(__file__), "--run-one", str(n),
+           "--queries", str(kwargs["queries"]), "--batch-size", str(kwargs["batch_size"])]
+    if kwargs.get("quantized"):
+        cmd.append("--quantized")
+    output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    # A última linha é o JSON do resultado; as anteriores são logs do RAG
+    return json.loads(output.strip().splitlines()[-1])
+
+def run_suite(sizes: List[int] = None, queries: int = 200, batch_size: int = 32,
+              quantized: bool = False, isolate: bool = True) -> Dict:
+    """
+    Executa o benchmark para vários tamanhos de corpus.
+
+    Args:
+        sizes: Tamanhos dos corpora (padrão: 1k a 1M)
+        queries: Consultas medidas por tamanho
+        batch_size: Consultas por lote
+        quantized: Se deve usar o índice int8
+        isolate: Se cada tamanho roda num processo separado
+
+    Returns:
+        Dicionário com metadados da execução e resultados por tamanho
+    """
+    sizes = sizes or DEFAULT_SIZES
+    results = {}
+    for n in sizes:
+        print(f"[BENCH] Corpus de {n} documentos...")
+        kwargs = {"queries": queries, "batch_size": batch_size, "quantized": quantized}
+        results[str(n)] = _run_isolated(n, **kwargs) if isolate else run_size(n, **kwargs)
+    return {
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "config": {"queries": queries, "batch_size": batch_size, "quantized": quantized},
+        "results": results
+    }
+
+def compare_results(current: Dict, baseline: Dict, threshold: float = REGRESSION_THRESHOLD) -> List[Dict]:
+    """
+    Compara uma execução com o baseline.
+
+    Args:
+        current: Resultado de run_suite()
+        baseline: Resultado salvo anteriormente
+        threshold: Piora relativa tolerada (0.2 = 20%)
+
+    Returns:
+        Lista de regressões (tamanho, métrica, baseline, atual e variação)
+    """
+    regressions = []
+    for size, metrics in current["results"].items():
+        base = baseline.get("results", {}).get(size)
+        if base is None:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = base.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change > threshold:
+                regressions.append({
+                    "docs": int(size), "metric": metric,
+                    "baseline": old, "current": new, "change": change
+                })
+    return regressions
+
+def print_report(suite: Dict):
+    """Imprime uma tabela resumida dos resultados."""
+    print(f"{'docs':>9} {'build_s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'lote p50':>9} {'qps lote':>9} {'RSS MB':>8} {'índice':>10}")
+    for size, r in suite["results"].items():
+        print(f"{size:>9} {r['build_s']:>9.3f} {r['single_p50_ms']:>8.3f} {r['single_p95_ms']:>8.3f} "
+              f"{r['single_p99_ms']:>8.3f} {r['batch_p50_ms']:>9.3f} {r['batch_qps']:>9.0f} "
+              f"{r['peak_rss_mb']:>8.1f} {r['index_bytes']:>10}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark de desempenho do RAG")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Tamanhos dos corpora")
+    parser.add_argument("--queries", type=int, default=200, help="Consultas medidas por tamanho")
+    parser.add_argument("--batch-size", type=int, default=32, help="Consultas por lote")
+    parser.add_argument("--quantized", action="store_true", help="Usar o índice int8")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Arquivo JSON do baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="Salvar os resultados como baseline")
+    parser.add_argument("--compare", action="store_true", help="Comparar com o baseline e sinalizar regressões")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Piora relativa tolerada")
+    parser.add_argument("--no-isolate", action="store_true", help="Rodar todos os tamanhos no mesmo processo")
+    parser.add_argument("--run-one", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_size(args.run_one, args.queries, args.batch_size, quantized=args.quantized)))
+        sys.exit(0)
+
+    suite = run_suite(args.sizes, args.queries, args.batch_size, args.quantized, not args.no_isolate)
+    print_report(suite)
+
+    # Comparar com o baseline anterior antes de, eventualmente, substituí-lo
+    regressions = None
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"[BENCH] Baseline não encontrado: {args.baseline}")
+        else:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+            regressions = compare_results(suite, baseline, args.threshold)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(suite, f, indent=2, ensure_ascii=False)
+        print(f"[BENCH] Baseline salvo em: {args.baseline}")
+
+    if args.compare:
+        if regressions is None:
+            sys.exit(2)
+        for r in regressions:
+            print(f"[BENCH] REGRESSÃO {r['docs']} docs, {r['metric']}: "
+                  f"{r['baseline']:.4g} -> {r['current']:.4g} (+{r['change']:.0%})")
+        if regressions:
+            sys.exit(1)
+        print("[BENCH] Nenhuma regressão em relação ao baseline")
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# core/rag_bm25.py
+"""
+Recuperação lexical do RAG com índice invertido e ranking BM25.
+A tokenização é ajustada para português (acentos, stopwords, plurais) e para
+identificadores de código (camelCase e snake_case).
+"""
+import heapq
+import itertools
+import json
+import math
+import os
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.rag_store import content_hash, doc_meta, MetadataIndex
+
+STOPWORDS = frozenset("""
+a o as os um uma uns umas de do da dos das em no na nos nas por pelo pela pelos pelas
+para pra com sem sob sobre entre ate desde e ou mas que se como quando onde qual quais
+quem cujo cuja este esta estes estas esse essa esses essas isto isso aquilo aquele aquela
+ele ela eles elas eu tu voce voces nos vos me te lhe lhes meu minha seu sua seus suas
+nao sim ja mais menos muito muita muitos muitas ao aos ser estar ter haver foi era
+sao sera seria tem tinha ha estao is the of to in and or for on with
+""".split())
+
+_INDEX_UIDS = itertools.count(1)
+
+# Custo aproximado de uma entrada de postings (dict Python) para o orçamento de memória
+POSTING_BYTES = 100
+
+_CAMEL_RE = re.compile(r"([a-z0-9])([A-Z])|([A-Z]+)([A-Z][a-z])")
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+
+def _strip_accents(text: str) -> str:
+    normalized = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in normalized if not unicodedata.combining(c))
+
+def _stem(token: str) -> str:
+    """Remoção leve de plural do português (sem acentos)."""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    for suffix, replacement in (("coes", "cao"), ("oes", "ao"), ("aes", "ao"),
+                                ("ais", "al"), ("eis", "el"), ("ns", "m")):
+        if token.endswith(suffix):
+            return token[:-len(suffix)] + replacement
+    if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokeniza texto em português e identificadores de código.
+
+    "loadDocs" e "load_docs" geram "load" e "doc", além do identificador
+    completo "load_docs", para que buscas exatas por nome também funcionem.
+
+    Args:
+        text: Texto a tokenizar
+
+    Returns:
+        Lista de termos normalizados
+    """
+    tokens = []
+    for word in _WORD_RE.findall(_strip_accents(text)):
+        split = _CAMEL_RE.sub(lambda m: f"{m.group(1) or m.group(3)}_{m.group(2) or m.group(4)}", word)
+        parts = [p for p in split.lower().split("_") if p]
+        if len(parts) > 1:
+            tokens.append("_".join(parts))
+        for part in parts:
+            if len(part) < 2 or part in STOPWORDS:
+                continue
+            tokens.append(_stem(part))
+    return tokens
+
+class BM25Index:
+    """
+    Índice invertido com listas de postings termo -> {linha: frequência}.
+
+    A consulta só percorre os postings dos termos da consulta, então o custo
+    depende da raridade dos termos e não do tamanho do corpus.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.metas: List[Dict] = []
+        self.hashes: List[str] = []
+        self.doc_len: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self._doc_terms: List[List[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._live = 0
+        self._total_len = 0
+        self.filters = MetadataIndex()
+        self.uid = next(_INDEX_UIDS)
+        self.version = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    @property
+    def nbytes(self) -> int:
+        """Estimativa da memória dos postings (uma entrada de dict por termo de cada documento)."""
+        return (len(self.postings) + self._total_len) * POSTING_BYTES
+
+    def _index_row(self, row: int, text: str):
+        counts: Dict[str, int] = {}
+        for term in tokenize(text):
+            counts[term] = counts.get(term, 0) + 1
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[row] = tf
+        self._doc_terms[row] = list(counts)
+        length = sum(counts.values())
+        self.doc_len[row] = length
+        self._total_len += length
+
+    def _unindex_row(self, row: int):
+        for term in self._doc_terms[row]:
+            plist = self.postings.get(term)
+            if plist is not None:
+                plist.pop(row, None)
+                if not plist:
+                    del self.postings[term]
+        self._doc_terms[row] = []
+        self._total_len -= self.doc_len[row]
+        self.doc_len[row] = 0
+
+    def add(self, doc_id: str, text: str, meta: Dict, doc_hash: str = ""):
+        """
+        Indexa (ou reindexa) um documento.
+
+        Args:
+            doc_id: ID do documento
+            text: Texto a indexar
+            meta: Metadados retornados na busca
+            doc_hash: Hash de conteúdo do documento
+        """
+        row = self._rows.get(doc_id)
+        if row is None:
+            row = len(self.ids)
+            self._rows[doc_id] = row
+            self.ids.append(doc_id)
+            self.metas.append(meta)
+            self.hashes.append(doc_hash)
+            self.doc_len.append(0)
+            self._doc_terms.append([])
+            self._live += 1
+        else:
+            self._unindex_row(row)
+            self.metas[row] = meta
+            self.hashes[row] = doc_hash
+        self._index_row(row, text)
+        self.filters.add(doc_id, meta)
+        self.version += 1
+
+    def upsert_docs(self, docs: List[Dict]) -> int:
+        """
+        Indexa documentos novos ou alterados.
+
+        Args:
+            docs: Documentos com id, title, text e source
+
+        Returns:
+            Número de documentos (re)indexados
+        """
+        changed = 0
+        for doc in docs:
+            doc_hash = content_hash(doc)
+            row = self._rows.get(doc["id"])
+            if row is not None and self.hashes[row] == doc_hash:
+                continue
+            # Título entra no texto indexado para pesar nomes de arquivos e funções
+            self.add(doc["id"], f"{doc.get('title', '')}\n{doc.get('text', '')}", doc_meta(doc), doc_hash)
+            changed += 1
+        return changed
+
+    def retain(self, keep_ids):
+        """Remove do índice todos os documentos cujo ID não está em keep_ids."""
+        for doc_id, row in list(self._rows.items()):
+            if doc_id not in keep_ids:
+                self._unindex_row(row)
+                del self._rows[doc_id]
+                self.filters.remove(doc_id)
+                self._live -= 1
+                self.version += 1
+
+    def remove(self, doc_ids) -> int:
+        """Remove documentos pelo ID sem percorrer o índice inteiro."""
+        removed = 0
+        for doc_id in doc_ids:
+            row = self._rows.pop(doc_id, None)
+            if row is None:
+                continue
+            self._unindex_row(row)
+            self.filters.remove(doc_id)
+            self._live -= 1
+            removed += 1
+        if removed:
+            self.version += 1
+        return removed
+
+    def cache_key(self) -> Tuple:
+        """Identifica o estado atual do índice para o cache de consultas."""
+        return ("bm25", self.uid, self.version)
+
+    def filter_rows(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """Linhas que atendem aos filtros de metadados (None = sem filtro)."""
+        if not filters:
+            return None
+        return self.filters.rows(filters, self._rows)
+
+    def score(self, query: str, rows=None) -> Dict[int, float]:
+        """
+        Calcula o score BM25 das linhas que contêm algum termo da consulta.
+
+        Com rows, só essas linhas são avaliadas: para cada termo, o custo é o
+        menor entre percorrer os postings e consultar as linhas candidatas.
+
+        Returns:
+            Dicionário linha -> score (somente linhas candidatas)
+        """
+        if not self._live:
+            return {}
+        avgdl = self._total_len / self._live or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            df = len(plist)
+            idf = math.log(1.0 + (self._live - df + 0.5) / (df + 0.5))
+            if rows is None:
+                entries = plist.items()
+            elif len(rows) < df:
+                entries = [(row, plist[row]) for row in rows.tolist() if row in plist]
+            else:
+                allowed = set(rows.tolist())
+                entries = [(row, tf) for row, tf in plist.items() if row in allowed]
+            for row, tf in entries:
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[row] / avgdl)
+                scores[row] = scores.get(row, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return scores
+
+    def search_rows(self, query: str, top_k: int, rows=None) -> List[Tuple[int, float]]:
+        """Retorna as top_k linhas (linha, score) em ordem decrescente."""
+        return heapq.nlargest(top_k, self.score(query, rows).items(), key=lambda item: item[1])
+
+    def search(self, query: str, top_k: int = 3, filters: Dict = None) -> List[Tuple[Dict, float]]:
+        """Recupera os top_k documentos por BM25 (opcionalmente filtrados)."""
+        rows = self.filter_rows(filters)
+        return [(self.metas[row], score) for row, score in self.search_rows(query, top_k, rows)]
+
+    def search_many(self, queries: List[str], top_k: int = 3,
+                    filters: Dict = None) -> List[List[Tuple[Dict, float]]]:
+        """Recupera os top_k documentos de cada consulta."""
+        rows = self.filter_rows(filters)
+        return [
+            [(self.metas[row], score) for row, score in self.search_rows(query, top_k, rows)]
+            for query in queries
+        ]
+
+    def save(self, path: str, docs_stamp: Tuple[int, int] = (0, 0)):
+        """Persiste o índice em JSON (só linhas vivas)."""
+        live = sorted(self._rows.values())
+        remap = {row: i for i, row in enumerate(live)}
+        payload = {
+            "k1": self.k1,
+            "b": self.b,
+            "docs_stamp": list(docs_stamp),
+            "ids": [self.ids[r] for r in live],
+            "metas": [self.metas[r] for r in live],
+            "hashes": [self.hashes[r] for r in live],
+            "doc_len": [self.doc_len[r] for r in live],
+            "postings": {
+                term: [[remap[row], tf] for row, tf in plist.items()]
+                for term, plist in self.postings.items()
+            }
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["BM25Index", Tuple[int, int]]:
+        """
+        Carrega um índice salvo com save().
+
+        Returns:
+            Tupla (índice, assinatura do arquivo de documentos indexado)
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        index = cls(k1=payload["k1"], b=payload["b"])
+        index.ids = payload["ids"]
+        index.metas = payload["metas"]
+        index.hashes = payload["hashes"]
+        index.doc_len = payload["doc_len"]
+        index._rows = {doc_id: i for i, doc_id in enumerate(index.ids)}
+        index._live = len(index.ids)
+        index._total_len = sum(index.doc_len)
+        index._doc_terms = [[] for _ in index.ids]
+        index.filters.add_many(index.ids, index.metas)
+        for term, entries in payload["postings"].items():
+            plist = {}
+            for row, tf in entries:
+                plist[row] = tf
+                index._doc_terms[row].append(term)
+            index.postings[term] = plist
+        return index, tuple(payload["docs_stamp"])
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# core/rag_bulk.py
+"""
+Indexação em massa dos projetos escaneados no RAG.
+Percorre os projetos listados em data/index.json, pula arquivos que não
+mudaram desde a última execução (mtime, tamanho e hash) e distribui a
+leitura e o chunking dos arquivos alterados por um pool de processos.
+"""
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Adicionar o diretório pai ao path para imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core import rag_core
+from core.rag_ingest import CHUNK_SIZE, CHUNK_OVERLAP, BATCH_SIZE, chunk_documents
+
+MANIFEST_SUFFIX = ".manifest.json"
+MAX_FILE_SIZE = 1024 * 1024  # Arquivos maiores ficam para o rag_ingest.py
+SKIP_DIRS = {"venv", ".venv", "node_modules", ".git", "__pycache__", "dist", "build", "extracted"}
+TEXT_EXTENSIONS = {
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".json", ".md", ".rst", ".txt",
+    ".toml", ".cfg", ".ini", ".yml", ".yaml", ".sh", ".html", ".css"
+}
+
+def iter_project_files(project_path: str) -> Iterator[str]:
+    """
+    Lista os arquivos de texto indexáveis de um projeto.
+
+    Args:
+        project_path: Diretório do projeto
+
+    Yields:
+        Caminhos absolutos dos arquivos
+    """
+    for root, dirs, files in os.walk(project_path):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(".")]
+        for name in files:
+            if os.path.splitext(name)[1].lower() in TEXT_EXTENSIONS:
+                yield os.path.abspath(os.path.join(root, name))
+
+def _chunk_file(task: Tuple[str, str, int, int]) -> Tuple[str, Optional[str], List[Dict], Optional[str]]:
+    """
+    Lê e divide um arquivo em chunks (executado nos processos do pool).
+
+    Erros de leitura (permissão, arquivo apagado no meio da execução) não
+    interrompem a indexação: o arquivo volta sem hash, com a mensagem de erro.
+    """
+    path, source, chunk_size, overlap = task
+    digest = hashlib.sha1()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                digest.update(block)
+        docs = []
+        for doc in chunk_documents(path, source, chunk_size, overlap):
+            doc.pop("next")
+            docs.append(doc)
+    except OSError as e:
+        return path, None, [], str(e)
+    return path, digest.hexdigest(), docs, None
+
+def _manifest_path(docs_file: str) -> str:
+    return os.path.splitext(docs_file)[0] + MANIFEST_SUFFIX
+
+def load_manifest(docs_file: str = None) -> Dict:
+    """Carrega o manifesto (caminho -> mtime, tamanho, hash e chunks) da última execução."""
+    path = _manifest_path(rag_core.docs_path(docs_file))
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_manifest(docs_file: str, manifest: Dict):
+    path = _manifest_path(docs_file)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def load_projects(index_file: str = None) -> List[Dict]:
+    """Lê a lista de projetos gerada por project_scan.scan_projects()."""
+    if index_file is None:
+        index_file = os.path.join(rag_core.DATA_DIR, "index.json")
+    if not os.path.exists(index_file):
+        print(f"[RAG] Índice de projetos não encontrado: {index_file}")
+        return []
+    with open(index_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _map_tasks(tasks: List[Tuple[str, str, int, int]], workers: Optional[int]):
+    """Executa _chunk_file nas tarefas, em paralelo quando vale a pena."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        # Só a criação do pool cai para o modo em série; erros dos arquivos
+        # são tratados em _chunk_file e os do pool durante a execução sobem
+        pool = None
+        try:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            results = pool.map(_chunk_file, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+        except (OSError, ImportError, NotImplementedError) as e:
+            # Sem suporte a multiprocessing (ex.: alguns ambientes Termux)
+            print(f"[RAG] Pool de processos indisponível ({e}), processando em série")
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        else:
+            with pool:
+                yield from results
+            return
+    for task in tasks:
+        yield _chunk_file(task)
+
+def index_namespaces(projects: List[Dict] = None, **kwargs) -> Dict:
+    """
+    Indexa cada projeto no seu próprio namespace (rag_core.namespace_path).
+
+    Args:
+        projects: Projetos no formato de data/index.json (padrão: lê o arquivo)
+        **kwargs: Repassados para index_projects()
+
+    Returns:
+        Estatísticas somadas de todos os projetos
+    """
+    if projects is None:
+        projects = load_projects()
+    total: Dict[str, int] = {}
+    for project in projects:
+        namespace = os.path.basename(os.path.normpath(project["path"]))
+        stats = index_projects([project], rag_core.namespace_path(namespace), **kwargs)
+        for key, value in stats.items():
+            total[key] = total.get(key, 0) + value
+    return total
+
+def index_projects(projects: List[Dict] = None, docs_file: str = None, workers: int = None,
+                   chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP,
+                   batch_size: int = BATCH_SIZE) -> Dict:
+    """
+    Indexa no RAG os arquivos de todos os projetos, só o que mudou.
+
+    Arquivos com mesmo mtime e tamanho da última execução nem são abertos.
+    Os demais são lidos e divididos em chunks no pool de processos; se o hash
+    do conteúdo não mudou (ex.: só o mtime foi tocado), nada é regravado.
+    Os chunks são gravados em lotes e o manifesto é salvo após cada lote.
+    Chunks que deixaram de existir (arquivo encolheu ou foi apagado dentro de
+    um dos projetos) são removidos do RAG.
+
+    Args:
+        projects: Projetos no formato de data/index.json (padrão: lê o arquivo)
+        docs_file: Caminho do arquivo de documentos (opcional)
+        workers: Número de processos (padrão: número de CPUs; 1 = em série)
+        chunk_size: Tamanho máximo de cada chunk em bytes
+        overlap: Sobreposição entre chunks em bytes
+        batch_size: Número de chunks gravados por lote
+
+    Returns:
+        Estatísticas da execução
+    """
+    docs_file = rag_core.docs_path(docs_file)
+    if projects is None:
+        projects = load_projects()
+    manifest = load_manifest(docs_file)
+    stats = {"projects": len(projects), "files": 0, "skipped": 0, "changed": 0,
+             "chunks": 0, "removed": 0}
+
+    tasks = []
+    stats_by_path = {}
+    seen = set()
+    for project in projects:
+        source = f"projeto:{os.path.basename(os.path.normpath(project['path']))}"
+        for path in iter_project_files(project["path"]):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_size > MAX_FILE_SIZE:
+                continue
+            seen.add(path)
+            stats["files"] += 1
+            entry = manifest.get(path)
+            if (entry is not None and entry["mtime_ns"] == st.st_mtime_ns
+                    and entry["size"] == st.st_size):
+                stats["skipped"] += 1
+                continue
+            stats_by_path[path] = st
+            tasks.append((path, source, chunk_size, overlap))
+
+    print(f"[RAG] {stats['files']} arquivos em {len(projects)} projetos, "
+          f"{len(tasks)} a verificar")
+
+    # Arquivos apagados (ou grandes demais) dentro dos projetos escaneados
+    roots = [os.path.join(os.path.abspath(p["path"]), "") for p in projects]
+    gone = [path for path in manifest
+            if path not in seen and any(path.startswith(root) for root in roots)]
+    stale: List[str] = []
+    for path in gone:
+        stale.extend(manifest.pop(path).get("chunks", []))
+        stats["removed"] += 1
+
+    batch: List[Dict] = []
+    pending: Dict[str, Dict] = {}
+
+    def flush():
+        if stale:
+            rag_core.delete_documents(stale, docs_file, save_index=False)
+        if batch:
+            # Sem dedup: um chunk igual ao de outro arquivo precisa do próprio ID,
+            # senão apagar o outro arquivo levaria o único registro do conteúdo
+            rag_core.add_documents(batch, docs_file, save_index=False, dedup=False)
+        manifest.update(pending)
+        _save_manifest(docs_file, manifest)
+
+    for path, digest, docs, error in _map_tasks(tasks, workers):
+        if error is not None:
+            # Fica fora do manifesto (e com os chunks anteriores) até ser lido com sucesso
+            print(f"[RAG] Erro ao ler {path}: {error}")
+            stats["skipped"] += 1
+            continue
+        st = stats_by_path[path]
+        entry = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "hash": digest,
+                 "chunks": [doc["id"] for doc in docs]}
+        previous = manifest.get(path)
+        if previous is not None and previous.get("hash") == digest:
+            stats["skipped"] += 1
+        else:
+            stats["changed"] += 1
+            stats["chunks"] += len(docs)
+            batch.extend(docs)
+            if previous is not None:
+                stale.extend(set(previous.get("chunks", [])) - set(entry["chunks"]))
+        pending[path] = entry
+        if len(batch) >= batch_size:
+            flush()
+            batch, pending, stale = [], {}, []
+    flush()
+
+    if stats["changed"] or stats["removed"]:
+        rag_core.save_indexes(docs_file)
+    print(f"[RAG] Indexação concluída: {stats['changed']} arquivos alterados, "
+          f"{stats['chunks']} chunks gravados, {stats['skipped']} inalterados, "
+          f"{stats['removed']} removidos")
+    return stats
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Indexação em massa dos projetos no RAG")
+    parser.add_argument("--index", default=None, help="Arquivo index.json gerado pelo scan de projetos")
+    parser.add_argument("--workers", type=int, default=None, help="Número de processos (1 = em série)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Chunks gravados por lote")
+    parser.add_argument("--namespaced", action="store_true", help="Um índice (namespace) por projeto")
+    args = parser.parse_args()
+
+    indexer = index_namespaces if args.namespaced else index_projects
+    result = indexer(load_projects(args.index), workers=args.workers, batch_size=args.batch_size)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
@@ -2,20 +2,149 @@
 # core/rag_core.py
 """
 Módulo RAG (Retrieval Augmented Generation) Core.
-Implementa indexação e recuperação de documentos com fallback para Annoy.
+Implementa indexação e recuperação de documentos, com backends ANN opcionais
+(FAISS, Annoy ou IVF em NumPy) em core/rag_backends.py.
 """
+import atexit
 import json
 import os
 import hashlib
+import heapq
+import itertools
 import math
-from typing import List, Dict, Tuple
+import re
+import struct
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, List, Dict, Tuple, Iterable, Iterator, Optional, Union
 import random
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Adicionar o diretório pai ao path para imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.rag_backends import get_backend, resolve_backend_name, top_k_rows, top_k_rows_batch
+from core.rag_bm25 import BM25Index
+from core.rag_rerank import mmr_rerank, MMR_LAMBDA, MMR_POOL
+from core.rag_sparse import SparseVectorIndex, SKLEARN_AVAILABLE
+from core.rag_store import get_store, content_hash, doc_meta, MetadataIndex, LOG_SUFFIX
+from core.symbol_index import extract_symbol_name, get_symbol_index, format_symbols
 
 DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
+INDEX_SUFFIX = ".index.bin"
+QUANTIZED_SUFFIX = ".index.q8.bin"
+BM25_SUFFIX = ".bm25.json"
+SPARSE_SUFFIX = ".sparse.npz"
+
+# Um arquivo de documentos (e seus índices) por namespace, em geral um projeto
+NAMESPACES_DIR = os.path.join(DATA_DIR, "namespaces")
+MEMORY_BUDGET = 256 * 1024 * 1024  # Bytes de índices residentes em memória
+
+_INDEX_UIDS = itertools.count(1)
+
+# Formato binário do índice vetorial:
+#   cabeçalho de 64 bytes (magic, versão, dtype, dim, count, offset e tamanho
+#   do bloco de metadados, assinatura do log de documentos), seguido do bloco
+#   contíguo de vetores (e, no int8, das escalas) e do bloco de metadados JSON.
+INDEX_MAGIC = b"RAGIDX\0\0"
+INDEX_FORMAT_VERSION = 1
+_INDEX_HEADER = struct.Struct("<8sHHIQQQqq8x")
+_INDEX_DTYPES = {0: np.float32, 1: np.int8}
+
+# Cache em processo: caminho do índice -> (assinatura do arquivo de documentos, índice)
+_INDEX_CACHE: Dict[str, Tuple[Tuple[int, int], object]] = {}
+
+# Escritas no log e nos índices (inclusive a compactação em segundo plano)
+_WRITE_LOCK = threading.RLock()
+
+# Compactação automática: fração de lixo no log e tamanho mínimo do log
+COMPACT_GARBAGE_RATIO = 0.5
+COMPACT_MIN_BYTES = 1024 * 1024
+_COMPACTIONS: Dict[str, threading.Thread] = {}
+
+# Segundos entre a primeira alteração de um índice carregado e sua gravação
+INDEX_SAVE_DELAY = 2.0
+_PENDING_SAVES: Dict[str, threading.Timer] = {}
+
+class ResidentIndexes:
+    """
+    LRU dos arquivos de documentos cujos índices estão em _INDEX_CACHE.
+    
+    Cada arquivo de documentos (um namespace) pesa a soma de nbytes dos seus
+    índices carregados. Quando o total passa do orçamento, os índices dos
+    arquivos usados há mais tempo são descarregados; a próxima consulta a
+    eles carrega de novo os arquivos persistidos.
+    """
+    
+    def __init__(self, budget: int = MEMORY_BUDGET):
+        self.budget = budget
+        self.evictions = 0
+        self._usage: "OrderedDict[str, int]" = OrderedDict()
+    
+    def touch(self, docs_file: str):
+        """Marca o arquivo como usado agora e atualiza o peso dos seus índices."""
+        self._usage[docs_file] = sum(
+            _INDEX_CACHE[path][1].nbytes for path in index_paths(docs_file) if path in _INDEX_CACHE
+        )
+        self._usage.move_to_end(docs_file)
+        self._evict(keep=docs_file)
+    
+    def _evict(self, keep: str = None):
+        while self._usage and sum(self._usage.values()) > self.budget:
+            docs_file = next(iter(self._usage))
+            if docs_file == keep:
+                break  # O índice em uso fica, mesmo acima do orçamento
+            self.evict(docs_file)
+    
+    def evict(self, docs_file: str):
+        """Descarrega da memória os índices de um arquivo de documentos."""
+        if self._usage.pop(docs_file, None) is None:
+            return
+        if docs_file in _PENDING_SAVES:
+            # Alterações ainda não gravadas: persistir antes de descarregar
+            save_indexes(docs_file)
+        for path in index_paths(docs_file):
+            _INDEX_CACHE.pop(path, None)
+        self.evictions += 1
+        print(f"[RAG] Índices descarregados da memória: {docs_file}")
+    
+    def resize(self, budget: int):
+        """Altera o orçamento, descarregando o excedente imediatamente."""
+        self.budget = budget
+        self._evict()
+    
+    def clear(self):
+        """Esquece todos os arquivos (não mexe em _INDEX_CACHE)."""
+        self._usage.clear()
+        self.evictions = 0
+    
+    def stats(self) -> Dict:
+        """Orçamento, memória usada e arquivos residentes, do mais antigo ao mais recente."""
+        return {
+            "budget": self.budget,
+            "used": sum(self._usage.values()),
+            "resident": list(self._usage),
+            "evictions": self.evictions
+        }
+
+RESIDENT = ResidentIndexes()
+
+def set_memory_budget(nbytes: int):
+    """
+    Define quantos bytes de índices podem ficar residentes em memória.
+    
+    Args:
+        nbytes: Orçamento em bytes
+    """
+    RESIDENT.resize(nbytes)
 
 def load_docs(docs_file: str = None) -> List[Dict]:
     """
-    Carrega documentos do arquivo JSON.
+    Carrega documentos do log de documentos.
     
     Args:
         docs_file: Caminho do arquivo de documentos (opcional)
@@ -23,33 +152,98 @@ def load_docs(docs_file: str = None) -> List[Dict]:
     Returns:
         Lista de documentos
     """
-    if docs_file is None:
-        docs_file = os.path.join(DATA_DIR, "docs_store.json")
+    docs_file = docs_path(docs_file)
+    store = get_store(docs_file)
     
-    if not os.path.exists(docs_file):
-        print(f"[RAG] Arquivo de documentos não encontrado: {docs_file}")
+    if not os.path.exists(store.log_path):
+        print(f"[RAG] Arquivo de documentos não encontrado: {store.log_path}")
         return []
     
-    with open(docs_file, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return list(store.iter_docs())
 
 def save_docs(docs: List[Dict], docs_file: str = None):
     """
-    Salva documentos no arquivo JSON.
+    Salva documentos, substituindo todo o conteúdo do log.
     
     Args:
         docs: Lista de documentos
         docs_file: Caminho do arquivo de documentos (opcional)
     """
-    if docs_file is None:
-        docs_file = os.path.join(DATA_DIR, "docs_store.json")
+    store = get_store(docs_path(docs_file))
+    store.rewrite(docs)
     
-    os.makedirs(os.path.dirname(docs_file), exist_ok=True)
+    print(f"[RAG] Documentos salvos em: {store.log_path}")
+
+def get_document(doc_id: str, docs_file: str = None) -> Optional[Dict]:
+    """
+    Lê um único documento pelo ID (seek+read no log).
     
-    with open(docs_file, "w", encoding="utf-8") as f:
-        json.dump(docs, f, indent=2, ensure_ascii=False)
+    Args:
+        doc_id: ID do documento
+        docs_file: Caminho do arquivo de documentos (opcional)
+        
+    Returns:
+        Documento ou None se não existir
+    """
+    return get_store(docs_path(docs_file)).get(doc_id)
+
+def compact_docs(docs_file: str = None) -> Dict:
+    """
+    Compacta o log de documentos, descartando versões substituídas e tombstones.
     
-    print(f"[RAG] Documentos salvos em: {docs_file}")
+    Os índices persistidos também são regravados só com as linhas vivas.
+    
+    Args:
+        docs_file: Caminho do arquivo de documentos (opcional)
+        
+    Returns:
+        Estatísticas da compactação
+    """
+    docs_file = docs_path(docs_file)
+    # A reescrita do log só segura o lock do arquivo; consultas e índices
+    # seguem usando _WRITE_LOCK e se ressincronizam se precisarem do log novo
+    stats = get_store(docs_file).compact()
+    with _WRITE_LOCK:
+        # Índices carregados já estão em dia: só registram a nova assinatura.
+        # Os que só existem em disco são carregados e sincronizados (o que
+        # descarta os documentos removidos) antes de serem regravados.
+        loaders = [(index_path(docs_file), lambda: get_index(docs_file)),
+                   (index_path(docs_file, quantized=True), lambda: get_index(docs_file, quantized=True)),
+                   (lexical_index_path(docs_file), lambda: get_lexical_index(docs_file))]
+        if SKLEARN_AVAILABLE:
+            loaders.append((sparse_index_path(docs_file), lambda: get_sparse_index(docs_file)))
+        for path, loader in loaders:
+            if path not in _INDEX_CACHE and os.path.exists(path):
+                loader()
+        save_indexes(docs_file)
+    return stats
+
+def schedule_compaction(docs_file: str = None, ratio: float = COMPACT_GARBAGE_RATIO,
+                        min_bytes: int = COMPACT_MIN_BYTES) -> Optional[threading.Thread]:
+    """
+    Dispara compact_docs() numa thread em segundo plano se o log tiver lixo demais.
+    
+    Args:
+        docs_file: Caminho do arquivo de documentos (opcional)
+        ratio: Fração mínima do log ocupada por versões antigas e tombstones
+        min_bytes: Tamanho mínimo do log para valer a pena compactar
+        
+    Returns:
+        Thread da compactação (nova ou já em andamento) ou None
+    """
+    docs_file = docs_path(docs_file)
+    running = _COMPACTIONS.get(docs_file)
+    if running is not None and running.is_alive():
+        return running
+    store = get_store(docs_file)
+    if not os.path.exists(store.log_path) or os.path.getsize(store.log_path) < min_bytes:
+        return None
+    if store.garbage_ratio() < ratio:
+        return None
+    thread = threading.Thread(target=compact_docs, args=(docs_file,), name="rag-compact", daemon=True)
+    _COMPACTIONS[docs_file] = thread
+    thread.start()
+    return thread
 
 def simple_embed(text: str, dim: int = 16) -> List[float]:
     """
@@ -71,37 +265,857 @@ def simple_embed(text: str, dim: int = 16) -> List[float]:
     norm = math.sqrt(sum(x * x for x in rnd))
     return [x / (norm + 1e-9) for x in rnd]
 
-def build_index(docs: List[Dict], dim: int = 16) -> List[Dict]:
+def embed_batch(texts: List[str], dim: int = 16) -> np.ndarray:
+    """
+    Versão vetorizada de simple_embed para uma lista de textos.
+    
+    Args:
+        texts: Textos para embedar
+        dim: Dimensão do embedding
+        
+    Returns:
+        Matriz float32 (len(texts), dim) com uma linha normalizada por texto
+    """
+    if not texts:
+        return np.zeros((0, dim), dtype=np.float32)
+    
+    digests = b"".join(hashlib.sha256(t.encode("utf-8")).digest() for t in texts)
+    raw = np.frombuffer(digests, dtype=np.uint8).reshape(len(texts), 32)
+    
+    # simple_embed lê o hash a partir do byte menos significativo
+    raw = raw[:, ::-1][:, :dim].astype(np.float64) / 255.0
+    if dim > raw.shape[1]:
+        raw = np.pad(raw, ((0, 0), (0, dim - raw.shape[1])))
+    
+    norms = np.sqrt((raw * raw).sum(axis=1, keepdims=True))
+    return (raw / (norms + 1e-9)).astype(np.float32)
+
+class VectorIndex:
+    """
+    Índice vetorial com todos os embeddings em uma única matriz float32 contígua.
+    
+    A matriz cresce por dobra de capacidade, então adicionar um item é O(1)
+    amortizado, e a consulta é um único produto matriz-vetor.
+    """
+    
+    def __init__(self, dim: int = 16, capacity: int = 0):
+        self.dim = dim
+        self.ids: List[str] = []
+        self.metas: List[Dict] = []
+        self.hashes: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._buf = np.zeros((capacity, dim), dtype=np.float32)
+        self._count = 0
+        self.filters = MetadataIndex()
+        self.backend = None
+        self._backends: Dict[str, object] = {}  # Backends já construídos, por nome
+        self._stale_backends = set()  # Backends a reconstruir antes da próxima busca
+        self._backend_lock = threading.RLock()
+        self.uid = next(_INDEX_UIDS)
+        self.version = 0
+    
+    @property
+    def matrix(self) -> np.ndarray:
+        """Visão (n, dim) dos embeddings válidos."""
+        return self._buf[:self._count]
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    @property
+    def nbytes(self) -> int:
+        """Memória ocupada pelos vetores válidos."""
+        return self._count * self.dim * self._buf.itemsize
+    
+    def __iter__(self) -> Iterator[Dict]:
+        # Compatibilidade com o formato antigo (lista de dicts)
+        matrix = self.matrix
+        for i in range(self._count):
+            yield {"id": self.ids[i], "emb": matrix[i].tolist(), "meta": self.metas[i]}
+    
+    def _reserve(self, extra: int):
+        needed = self._count + extra
+        if needed <= self._buf.shape[0]:
+            return
+        capacity = max(needed, 2 * self._buf.shape[0], 64)
+        buf = np.zeros((capacity, self.dim), dtype=np.float32)
+        buf[:self._count] = self._buf[:self._count]
+        self._buf = buf
+    
+    def _write_rows(self, start: int, embs: np.ndarray):
+        self._buf[start:start + embs.shape[0]] = embs
+    
+    def _keep_rows(self, rows: List[int]):
+        self._buf = np.ascontiguousarray(self._buf[rows])
+    
+    def _scores(self, query_embs: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        """Scores (consultas x linhas) de uma matriz de consultas, opcionalmente só em algumas linhas."""
+        if rows is not None:
+            return query_embs @ self._buf[rows].T
+        return query_embs @ self.matrix.T
+    
+    def _storage_arrays(self) -> List[np.ndarray]:
+        """Blocos gravados no arquivo binário, na ordem do arquivo."""
+        return [self.matrix]
+    
+    def _attach_storage(self, blocks: List[np.ndarray], count: int):
+        self._buf = blocks[0]
+        self._count = count
+    
+    def score_rows(self, rows: np.ndarray, query_emb: np.ndarray) -> np.ndarray:
+        """Scores de uma consulta só nas linhas indicadas."""
+        return self._scores(np.asarray(query_emb, dtype=np.float32)[None, :], rows)[0]
+    
+    def filter_rows(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """Linhas que atendem aos filtros de metadados (None = sem filtro)."""
+        if not filters:
+            return None
+        return self.filters.rows(filters, self._rows)
+    
+    def add_many(self, ids: List[str], embs: np.ndarray, metas: List[Dict], hashes: List[str] = None):
+        """
+        Adiciona vários itens de uma vez.
+        
+        Args:
+            ids: IDs dos documentos
+            embs: Matriz (n, dim) de embeddings
+            metas: Metadados de cada item
+            hashes: Hashes de conteúdo de cada item (opcional)
+        """
+        embs = np.asarray(embs, dtype=np.float32).reshape(-1, self.dim)
+        self._reserve(embs.shape[0])
+        self._write_rows(self._count, embs)
+        for offset, doc_id in enumerate(ids):
+            self._rows[doc_id] = self._count + offset
+        self._count += embs.shape[0]
+        self.version += 1
+        self.ids.extend(ids)
+        self.metas.extend(metas)
+        self.hashes.extend(hashes if hashes is not None else [""] * len(ids))
+        self.filters.add_many(ids, metas)
+    
+    def add(self, doc_id: str, emb, meta: Dict, doc_hash: str = ""):
+        """Adiciona um único item ao índice."""
+        self.add_many([doc_id], np.asarray(emb, dtype=np.float32)[None, :], [meta], [doc_hash])
+    
+    def upsert_docs(self, docs: List[Dict]) -> int:
+        """
+        Insere ou atualiza documentos, embedando apenas os novos ou alterados.
+        
+        Args:
+            docs: Documentos com id, title, text e source
+            
+        Returns:
+            Número de documentos (re)embedados
+        """
+        pending: Dict[str, Tuple[Dict, str]] = {}
+        for doc in docs:
+            doc_id = doc.get("id")
+            doc_hash = content_hash(doc)
+            row = self._rows.get(doc_id)
+            if row is not None and self.hashes[row] == doc_hash:
+                continue
+            pending[doc_id] = (doc, doc_hash)
+        
+        if not pending:
+            return 0
+        
+        ids = list(pending)
+        embs = embed_batch([pending[i][0].get("text", "") for i in ids], self.dim)
+        new_ids, new_rows, new_metas, new_hashes = [], [], [], []
+        for doc_id, emb in zip(ids, embs):
+            doc, doc_hash = pending[doc_id]
+            row = self._rows.get(doc_id)
+            if row is None:
+                new_ids.append(doc_id)
+                new_rows.append(emb)
+                new_metas.append(doc_meta(doc))
+                new_hashes.append(doc_hash)
+            else:
+                # Atualização no lugar
+                self._write_rows(row, emb[None, :])
+                self._invalidate_backends()
+                self.version += 1
+                self.metas[row] = doc_meta(doc)
+                self.hashes[row] = doc_hash
+                self.filters.add(doc_id, self.metas[row])
+        if new_ids:
+            self.add_many(new_ids, np.array(new_rows, dtype=np.float32), new_metas, new_hashes)
+        return len(pending)
+    
+    def retain(self, keep_ids):
+        """Remove do índice todos os itens cujo ID não está em keep_ids."""
+        rows = [i for i, doc_id in enumerate(self.ids) if doc_id in keep_ids]
+        if len(rows) == self._count:
+            return
+        self._keep_rows(rows)
+        self._count = len(rows)
+        self.ids = [self.ids[i] for i in rows]
+        self.metas = [self.metas[i] for i in rows]
+        self.hashes = [self.hashes[i] for i in rows]
+        self._rows = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self.filters.retain(keep_ids)
+        self._invalidate_backends()
+        self.version += 1
+    
+    def remove(self, doc_ids) -> int:
+        """
+        Remove itens do índice pelo ID (IDs inexistentes são ignorados).
+        
+        Returns:
+            Número de itens removidos
+        """
+        removed = {doc_id for doc_id in doc_ids if doc_id in self._rows}
+        if removed:
+            self.retain({doc_id for doc_id in self.ids if doc_id not in removed})
+        return len(removed)
+    
+    def use_backend(self, name: Optional[str] = "auto", **kwargs):
+        """
+        Passa a buscar por um backend ANN (FAISS, Annoy ou IVF em NumPy).
+        
+        Muda o backend padrão deste objeto; para um índice compartilhado,
+        use get_retriever(backend=...), que não altera o índice.
+        
+        Args:
+            name: Nome do backend ("auto", "faiss", "annoy", "ivf" ou "exact");
+                None volta à busca exata pelo produto matricial
+            **kwargs: Parâmetros do backend (ex.: nprobe)
+        """
+        self.backend = None if name is None else self.get_backend(name, **kwargs)
+    
+    def get_backend(self, name: str = "auto", **kwargs):
+        """
+        Retorna um backend ANN construído e em dia com a matriz, sem torná-lo o padrão.
+        
+        Backends já construídos (sem kwargs) são reaproveitados, então alternar
+        entre busca exata e ANN não reconstrói o backend a cada consulta.
+        
+        Args:
+            name: Nome do backend ("auto", "faiss", "annoy", "ivf" ou "exact")
+            **kwargs: Parâmetros do backend (ex.: nprobe)
+        """
+        with self._backend_lock:
+            cached = None if kwargs else self._backends.get(resolve_backend_name(name))
+            if cached is not None:
+                self._sync_backend(cached)
+                return cached
+            backend = get_backend(name, self.dim, **kwargs)
+            backend.build(self.matrix)
+            self._backends[backend.name] = backend
+            self._stale_backends.discard(backend.name)
+            # Um backend de mesmo nome com outros parâmetros pode mudar os resultados
+            self.version += 1
+            return backend
+    
+    def _invalidate_backends(self):
+        """Linhas alteradas ou removidas: os backends construídos são reconstruídos no próximo uso."""
+        self._stale_backends = set(self._backends)
+    
+    def backend_name(self) -> str:
+        """Nome do backend em uso ("exact" para o produto matricial)."""
+        return self.backend.name if self.backend is not None else "exact"
+    
+    def cache_key(self) -> Tuple:
+        """Identifica o estado atual do índice (e o backend em uso) para o cache de consultas."""
+        return ("vector", self.uid, self.version, self.backend_name())
+    
+    def _sync_backend(self, backend):
+        with self._backend_lock:
+            if backend.name in self._stale_backends:
+                backend.build(self.matrix)
+                self._stale_backends.discard(backend.name)
+            elif backend.count < self._count:
+                backend.add(self.matrix[backend.count:])
+    
+    def save(self, path: str, docs_stamp: Tuple[int, int] = (0, 0)):
+        """
+        Persiste o índice no formato binário (cabeçalho, vetores e metadados).
+        
+        O arquivo é gravado ao lado e trocado atomicamente, então processos
+        que já mapearam a versão anterior continuam lendo-a sem erro.
+        
+        Args:
+            path: Caminho do arquivo de índice
+            docs_stamp: Assinatura (mtime_ns, tamanho) do arquivo de documentos indexado
+        """
+        blocks = [np.ascontiguousarray(block) for block in self._storage_arrays()]
+        dtype_code = next(code for code, dtype in _INDEX_DTYPES.items() if blocks[0].dtype == dtype)
+        meta = json.dumps({"ids": self.ids, "hashes": self.hashes, "metas": self.metas},
+                          ensure_ascii=False).encode("utf-8")
+        
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"\0" * _INDEX_HEADER.size)
+            for block in blocks:
+                f.write(b"\0" * (-f.tell() % 8))  # Alinhamento dos blocos
+                f.write(block.tobytes())
+            meta_offset = f.tell()
+            f.write(meta)
+            f.seek(0)
+            f.write(_INDEX_HEADER.pack(
+                INDEX_MAGIC, INDEX_FORMAT_VERSION, dtype_code, self.dim, self._count,
+                meta_offset, len(meta), docs_stamp[0], docs_stamp[1]
+            ))
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> Tuple["VectorIndex", Tuple[int, int]]:
+        """
+        Carrega um índice salvo com save(), mapeando os vetores com numpy.memmap.
+        
+        O mapeamento é copy-on-write: processos que carregam o mesmo arquivo
+        compartilham as páginas do cache do sistema, e escritas (atualizações
+        no lugar) ficam privadas ao processo, sem alterar o arquivo.
+        
+        Returns:
+            Tupla (índice, assinatura do arquivo de documentos indexado)
+        """
+        header = read_index_header(path)
+        dim, count = header["dim"], header["count"]
+        with open(path, "rb") as f:
+            f.seek(header["meta_offset"])
+            meta = json.loads(f.read(header["meta_length"]).decode("utf-8"))
+        
+        quantized = header["dtype"] == np.int8
+        layout = [(np.int8, (count, dim)), (np.float32, (count,))] if quantized else [(np.float32, (count, dim))]
+        blocks, offset = [], _INDEX_HEADER.size
+        for dtype, shape in layout:
+            offset += -offset % 8
+            if count:
+                blocks.append(np.memmap(path, dtype=dtype, mode="c", offset=offset, shape=shape))
+            else:
+                blocks.append(np.zeros(shape, dtype=dtype))
+            offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+        
+        index = (QuantizedVectorIndex if quantized else VectorIndex)(dim=dim)
+        index._attach_storage(blocks, count)
+        index.ids = meta["ids"]
+        index.metas = meta["metas"]
+        index.hashes = meta["hashes"]
+        index._rows = {doc_id: i for i, doc_id in enumerate(index.ids)}
+        index.filters.add_many(index.ids, index.metas)
+        return index, header["docs_stamp"]
+    
+    @classmethod
+    def from_items(cls, items: List[Dict]) -> "VectorIndex":
+        """Converte um índice no formato antigo (lista de dicts) para VectorIndex."""
+        if not items:
+            return cls()
+        index = cls(dim=len(items[0]["emb"]), capacity=len(items))
+        index.add_many(
+            [item["id"] for item in items],
+            np.array([item["emb"] for item in items], dtype=np.float32),
+            [item["meta"] for item in items]
+        )
+        return index
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embeda a consulta com a mesma dimensão do índice."""
+        return embed_batch([query], self.dim)[0]
+    
+    def search_rows(self, query_emb: np.ndarray, top_k: int,
+                    rows: np.ndarray = None, backend=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calcula os scores de todas as linhas com um produto matriz-vetor,
+        ou delega ao backend ANN, se houver um configurado.
+        
+        Com rows (ex.: candidatos de um filtro), só essas linhas são
+        pontuadas, em busca exata.
+        
+        Args:
+            backend: Backend ANN desta busca (padrão: o de use_backend)
+        
+        Returns:
+            Tupla (linhas, scores) dos top_k resultados
+        """
+        if rows is not None:
+            scores = self.score_rows(rows, query_emb)
+            best = top_k_rows(scores, top_k)
+            return rows[best], scores[best]
+        backend = backend if backend is not None else self.backend
+        if backend is not None:
+            self._sync_backend(backend)
+            return backend.search(query_emb, top_k)
+        scores = self._scores(np.asarray(query_emb, dtype=np.float32)[None, :])[0]
+        rows = top_k_rows(scores, top_k)
+        return rows, scores[rows]
+    
+    def search(self, query: str, top_k: int = 3, filters: Dict = None,
+               backend=None) -> List[Tuple[Dict, float]]:
+        """Recupera os top_k itens mais similares à consulta (opcionalmente filtrados)."""
+        rows, scores = self.search_rows(self.embed_query(query), top_k, self.filter_rows(filters), backend)
+        return [(self.metas[r], float(s)) for r, s in zip(rows, scores)]
+    
+    def search_rows_many(self, query_embs: np.ndarray, top_k: int, max_block: int = 1 << 24,
+                         rows: np.ndarray = None, backend=None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Pontua várias consultas com produtos matriz-matriz (BLAS).
+        
+        As consultas são processadas em blocos para que a matriz de scores
+        (consultas x linhas) não passe de max_block elementos.
+        
+        Returns:
+            Lista de tuplas (linhas, scores), uma por consulta
+        """
+        query_embs = np.asarray(query_embs, dtype=np.float32).reshape(-1, self.dim)
+        backend = backend if backend is not None else self.backend
+        if backend is not None and rows is None:
+            self._sync_backend(backend)
+            return backend.search_many(query_embs, top_k)
+        
+        results = []
+        n = self._count if rows is None else len(rows)
+        block = max(1, max_block // max(1, n))
+        for i in range(0, query_embs.shape[0], block):
+            scores = self._scores(query_embs[i:i + block], rows)
+            best, top_scores = top_k_rows_batch(scores, top_k)
+            if rows is not None:
+                best = rows[best]
+            results.extend(zip(best, top_scores))
+        return results
+    
+    def search_many(self, queries: List[str], top_k: int = 3, filters: Dict = None,
+                    backend=None) -> List[List[Tuple[Dict, float]]]:
+        """Recupera os top_k itens de cada consulta, embedando todas de uma vez."""
+        results = self.search_rows_many(embed_batch(queries, self.dim), top_k,
+                                        rows=self.filter_rows(filters), backend=backend)
+        return [[(self.metas[r], float(s)) for r, s in zip(rows, scores)] for rows, scores in results]
+
+class QuantizedVectorIndex(VectorIndex):
+    """
+    VectorIndex com embeddings quantizados em int8 e uma escala float32 por vetor.
+    
+    Cada vetor v é guardado como codes = round(v / s), com s = max|v| / 127,
+    ocupando dim + 4 bytes em vez de 4 * dim. Os scores são calculados
+    direto sobre os códigos, em blocos de linhas, sem reconstruir a matriz
+    float32 inteira.
+    """
+    
+    BLOCK_ROWS = 4096
+    
+    def __init__(self, dim: int = 16, capacity: int = 0):
+        super().__init__(dim, 0)
+        self._codes = np.zeros((capacity, dim), dtype=np.int8)
+        self._scales = np.zeros(capacity, dtype=np.float32)
+    
+    @staticmethod
+    def quantize(embs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Quantiza vetores float32 para int8 com escala simétrica por linha.
+        
+        Returns:
+            Tupla (códigos int8 (n, dim), escalas float32 (n,))
+        """
+        embs = np.asarray(embs, dtype=np.float32)
+        scales = np.abs(embs).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(embs / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    
+    @property
+    def matrix(self) -> np.ndarray:
+        """Embeddings reconstruídos em float32 (cópia; usada pelos backends ANN)."""
+        return self._codes[:self._count].astype(np.float32) * self._scales[:self._count, None]
+    
+    @property
+    def nbytes(self) -> int:
+        """Memória ocupada pelos vetores válidos."""
+        return self._count * (self.dim * self._codes.itemsize + self._scales.itemsize)
+    
+    def _reserve(self, extra: int):
+        needed = self._count + extra
+        if needed <= self._codes.shape[0]:
+            return
+        capacity = max(needed, 2 * self._codes.shape[0], 64)
+        codes = np.zeros((capacity, self.dim), dtype=np.int8)
+        codes[:self._count] = self._codes[:self._count]
+        scales = np.zeros(capacity, dtype=np.float32)
+        scales[:self._count] = self._scales[:self._count]
+        self._codes, self._scales = codes, scales
+    
+    def _write_rows(self, start: int, embs: np.ndarray):
+        codes, scales = self.quantize(embs)
+        self._codes[start:start + codes.shape[0]] = codes
+        self._scales[start:start + codes.shape[0]] = scales
+    
+    def _keep_rows(self, rows: List[int]):
+        self._codes = np.ascontiguousarray(self._codes[rows])
+        self._scales = np.ascontiguousarray(self._scales[rows])
+    
+    def _scores(self, query_embs: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        n = self._count if rows is None else len(rows)
+        scores = np.empty((query_embs.shape[0], n), dtype=np.float32)
+        query_t = np.ascontiguousarray(query_embs.T, dtype=np.float32)
+        for start in range(0, n, self.BLOCK_ROWS):
+            end = min(start + self.BLOCK_ROWS, n)
+            sel = slice(start, end) if rows is None else rows[start:end]
+            block = self._codes[sel].astype(np.float32) @ query_t
+            scores[:, start:end] = (block * self._scales[sel, None]).T
+        return scores
+    
+    def _storage_arrays(self) -> List[np.ndarray]:
+        return [self._codes[:self._count], self._scales[:self._count]]
+    
+    def _attach_storage(self, blocks: List[np.ndarray], count: int):
+        self._codes, self._scales = blocks
+        self._count = count
+    
+    def cache_key(self) -> Tuple:
+        return ("int8", self.uid, self.version, self.backend_name())
+
+def read_index_header(path: str) -> Dict:
+    """
+    Lê e valida o cabeçalho de um arquivo de índice binário.
+    
+    Returns:
+        Dicionário com version, dtype, dim, count, meta_offset, meta_length e docs_stamp
+    """
+    with open(path, "rb") as f:
+        raw = f.read(_INDEX_HEADER.size)
+    if len(raw) < _INDEX_HEADER.size:
+        raise ValueError("arquivo de índice truncado")
+    magic, version, dtype, dim, count, meta_offset, meta_length, mtime_ns, size = _INDEX_HEADER.unpack(raw)
+    if magic != INDEX_MAGIC:
+        raise ValueError("arquivo não é um índice do RAG")
+    if version != INDEX_FORMAT_VERSION:
+        raise ValueError(f"versão de índice não suportada: {version}")
+    return {
+        "version": version,
+        "dtype": _INDEX_DTYPES[dtype],
+        "dim": dim,
+        "count": count,
+        "meta_offset": meta_offset,
+        "meta_length": meta_length,
+        "docs_stamp": (mtime_ns, size)
+    }
+
+def build_index(docs: List[Dict], dim: int = 16, quantized: bool = False) -> VectorIndex:
     """
     Constrói um índice de embeddings para os documentos.
     
     Args:
         docs: Lista de documentos
         dim: Dimensão dos embeddings
+        quantized: Se deve guardar os embeddings em int8 (menos memória)
         
     Returns:
-        Lista de itens indexados com embeddings
+        VectorIndex (ou QuantizedVectorIndex) com uma linha por documento
     """
     print(f"[RAG] Construindo índice para {len(docs)} documentos...")
     
-    index = []
-    for i, doc in enumerate(docs):
-        text = doc.get("text", "")
-        emb = simple_embed(text, dim)
-        
-        index.append({
-            "id": doc.get("id", str(i)),
-            "emb": emb,
-            "meta": {
-                "title": doc.get("title", ""),
-                "source": doc.get("source", ""),
-                "text": text[:200]  # Armazenar preview do texto
-            }
-        })
+    cls = QuantizedVectorIndex if quantized else VectorIndex
+    index = cls(dim, capacity=len(docs))
+    index.add_many(
+        [doc.get("id", str(i)) for i, doc in enumerate(docs)],
+        embed_batch([doc.get("text", "") for doc in docs], dim),
+        [doc_meta(doc) for doc in docs],
+        [content_hash(doc) for doc in docs]
+    )
     
     print(f"[RAG] Índice construído com sucesso")
     return index
 
+def docs_path(docs_file: str = None) -> str:
+    """Caminho do arquivo de documentos (padrão: data/docs_store.json)."""
+    return docs_file if docs_file is not None else os.path.join(DATA_DIR, "docs_store.json")
+
+def index_path(docs_file: str = None, quantized: bool = False) -> str:
+    """Caminho do índice persistido, ao lado do arquivo de documentos."""
+    return os.path.splitext(docs_path(docs_file))[0] + (QUANTIZED_SUFFIX if quantized else INDEX_SUFFIX)
+
+def lexical_index_path(docs_file: str = None) -> str:
+    """Caminho do índice BM25 persistido, ao lado do arquivo de documentos."""
+    return os.path.splitext(docs_path(docs_file))[0] + BM25_SUFFIX
+
+def sparse_index_path(docs_file: str = None) -> str:
+    """Caminho do índice esparso persistido, ao lado do arquivo de documentos."""
+    return os.path.splitext(docs_path(docs_file))[0] + SPARSE_SUFFIX
+
+def index_paths(docs_file: str) -> List[str]:
+    """Caminhos de todos os índices de um arquivo de documentos."""
+    return [index_path(docs_file), index_path(docs_file, quantized=True),
+            lexical_index_path(docs_file), sparse_index_path(docs_file)]
+
+def _docs_stamp(docs_file: str) -> Tuple[int, int]:
+    """Assinatura (mtime_ns, tamanho) do log de documentos."""
+    try:
+        st = os.stat(get_store(docs_file).log_path)
+    except FileNotFoundError:
+        return (0, 0)
+    return (st.st_mtime_ns, st.st_size)
+
+def _sync_index(path: str, docs_file: str, factory: Callable, loader: Callable,
+                compatible: Callable = lambda index: True):
+    """
+    Carrega (uma vez por processo) e sincroniza um índice persistido.
+    
+    O índice fica em memória enquanto o log de documentos não mudar. Se o log
+    mudar por fora (outro processo, edição manual), só os documentos novos ou
+    alterados são reindexados, comparando IDs e hashes de conteúdo.
+    """
+    with _WRITE_LOCK:
+        index = _sync_index_locked(path, docs_file, factory, loader, compatible)
+        RESIDENT.touch(docs_file)
+        return index
+
+def _sync_index_locked(path: str, docs_file: str, factory: Callable, loader: Callable,
+                       compatible: Callable):
+    stamp = _docs_stamp(docs_file)
+    
+    cached = _INDEX_CACHE.get(path)
+    if cached is not None and cached[0] == stamp and compatible(cached[1]):
+        return cached[1]
+    
+    index, indexed_stamp = None, None
+    if cached is not None and compatible(cached[1]):
+        index, indexed_stamp = cached[1], cached[0]
+    elif os.path.exists(path):
+        try:
+            index, indexed_stamp = loader(path)
+        except Exception as e:
+            print(f"[RAG] Índice persistido inválido ({e}), reconstruindo...")
+        if index is not None and not compatible(index):
+            index = None
+    
+    if index is None or indexed_stamp != stamp:
+        if index is None:
+            index = factory()
+        docs = load_docs(docs_file)
+        changed = index.upsert_docs(docs)
+        index.retain({doc.get("id") for doc in docs})
+        print(f"[RAG] Índice sincronizado: {changed} documentos (re)indexados")
+        index.save(path, stamp)
+    
+    _INDEX_CACHE[path] = (stamp, index)
+    return index
+
+def get_index(docs_file: str = None, dim: int = 16, quantized: bool = False) -> VectorIndex:
+    """
+    Retorna o índice vetorial persistente dos documentos, carregando-o uma única vez.
+    
+    Args:
+        docs_file: Caminho do arquivo de documentos (opcional)
+        dim: Dimensão dos embeddings
+        quantized: Se deve usar o índice int8 (arquivo separado do float32)
+        
+    Returns:
+        VectorIndex sincronizado com o log de documentos
+    """
+    docs_file = docs_path(docs_file)
+    cls = QuantizedVectorIndex if quantized else VectorIndex
+    return _sync_index(
+        index_path(docs_file, quantized), docs_file,
+        lambda: cls(dim), VectorIndex.load,
+        lambda index: index.dim == dim and isinstance(index, QuantizedVectorIndex) == quantized
+    )
+
+def get_lexical_index(docs_file: str = None) -> BM25Index:
+    """
+    Retorna o índice invertido BM25 persistente dos documentos.
+    
+    Args:
+        docs_file: Caminho do arquivo de documentos (opcional)
+        
+    Returns:
+        BM25Index sincronizado com o log de documentos
+    """
+    docs_file = docs_path(docs_file)
+    return _sync_index(lexical_index_path(docs_file), docs_file, BM25Index, BM25Index.load)
+
+def get_sparse_index(docs_file: str = None) -> SparseVectorIndex:
+    """
+    Retorna o índice esparso (HashingVectorizer + IDF) persistente dos documentos.
+    
+    Args:
+        docs_file: Caminho do arquivo de documentos (opcional)
+        
+    Returns:
+        SparseVectorIndex sincronizado com o log de documentos
+    """
+    docs_file = docs_path(docs_file)
+    return _sync_index(sparse_index_path(docs_file), docs_file, SparseVectorIndex, SparseVectorIndex.load)
+
+class HybridIndex:
+    """
+    Combina BM25 e similaridade vetorial.
+    
+    Os candidatos são a união dos melhores de cada índice; o score final é
+    alpha * BM25 normalizado + (1 - alpha) * cosseno.
+    """
+    
+    def __init__(self, vector: VectorIndex, lexical: BM25Index, alpha: float = 0.5, pool: int = 50):
+        self.vector = vector
+        self.lexical = lexical
+        self.alpha = alpha
+        self.pool = pool
+    
+    def __len__(self) -> int:
+        return len(self.vector)
+    
+    def cache_key(self) -> Tuple:
+        """Identifica o estado atual dos dois índices para o cache de consultas."""
+        return ("hybrid", self.vector.cache_key(), self.lexical.cache_key(), self.alpha, self.pool)
+    
+    def search(self, query: str, top_k: int = 3, filters: Dict = None) -> List[Tuple[Dict, float]]:
+        """Recupera os top_k documentos pelo score combinado (opcionalmente filtrados)."""
+        pool = max(self.pool, top_k)
+        lexical_rows = self.lexical.search_rows(query, pool, self.lexical.filter_rows(filters))
+        lexical = {self.lexical.ids[row]: score for row, score in lexical_rows}
+        max_lexical = max(lexical.values(), default=0.0) or 1.0
+        
+        query_emb = self.vector.embed_query(query)
+        vec_rows, _ = self.vector.search_rows(query_emb, pool, self.vector.filter_rows(filters))
+        rows = set(vec_rows.tolist())
+        rows.update(self.vector._rows[doc_id] for doc_id in lexical if doc_id in self.vector._rows)
+        if not rows:
+            return []
+        
+        rows = np.fromiter(rows, dtype=np.int64)
+        vec_scores = self.vector.score_rows(rows, query_emb)
+        lex_scores = np.array([lexical.get(self.vector.ids[r], 0.0) for r in rows]) / max_lexical
+        fused = self.alpha * lex_scores + (1.0 - self.alpha) * vec_scores
+        
+        best = top_k_rows(fused, top_k)
+        return [(self.vector.metas[rows[i]], float(fused[i])) for i in best]
+    
+    def search_many(self, queries: List[str], top_k: int = 3,
+                    filters: Dict = None) -> List[List[Tuple[Dict, float]]]:
+        """Recupera os top_k documentos de cada consulta."""
+        return [self.search(query, top_k, filters) for query in queries]
+
+class BackendView:
+    """
+    Visão de um VectorIndex compartilhado que busca por um backend ANN próprio.
+    
+    O backend é passado a cada busca em vez de ficar no índice, então
+    consultas simultâneas com backends diferentes não interferem entre si.
+    Os demais atributos (ids, metas, filter_rows...) são os do índice.
+    """
+    
+    def __init__(self, index: VectorIndex, backend):
+        self.index = index
+        self.backend = backend
+    
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+    
+    def __len__(self) -> int:
+        return len(self.index)
+    
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.index)
+    
+    def backend_name(self) -> str:
+        """Nome do backend desta visão."""
+        return self.backend.name
+    
+    def cache_key(self) -> Tuple:
+        """Chave do índice com o backend desta visão no lugar do backend padrão."""
+        return self.index.cache_key()[:-1] + (self.backend.name,)
+    
+    def search_rows(self, query_emb: np.ndarray, top_k: int,
+                    rows: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self.index.search_rows(query_emb, top_k, rows, self.backend)
+    
+    def search_rows_many(self, query_embs: np.ndarray, top_k: int, max_block: int = 1 << 24,
+                         rows: np.ndarray = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        return self.index.search_rows_many(query_embs, top_k, max_block, rows, self.backend)
+    
+    def search(self, query: str, top_k: int = 3, filters: Dict = None) -> List[Tuple[Dict, float]]:
+        return self.index.search(query, top_k, filters, self.backend)
+    
+    def search_many(self, queries: List[str], top_k: int = 3,
+                    filters: Dict = None) -> List[List[Tuple[Dict, float]]]:
+        return self.index.search_many(queries, top_k, filters, self.backend)
+
+def get_retriever(docs_file: str = None, mode: str = "vector", backend: str = None,
+                  quantized: bool = False):
+    """
+    Retorna o índice de busca para o modo pedido.
+    
+    Args:
+        docs_file: Caminho do arquivo de documentos (opcional)
+        mode: "vector", "bm25", "hybrid" ou "sparse"
+        backend: Backend ANN da parte vetorial (opcional; None = busca exata)
+        quantized: Se a parte vetorial deve usar embeddings int8
+        
+    Returns:
+        Objeto com o método search(query, top_k)
+    """
+    if mode == "bm25":
+        return get_lexical_index(docs_file)
+    if mode == "sparse":
+        if SKLEARN_AVAILABLE:
+            return get_sparse_index(docs_file)
+        print("[RAG] scikit-learn não disponível, usando embeddings densos")
+        mode = "vector"
+    if mode not in ("vector", "hybrid"):
+        raise ValueError(f"Modo de busca desconhecido: {mode}")
+    
+    index = get_index(docs_file, quantized=quantized)
+    if backend is not None:
+        # O índice é compartilhado: o backend fica numa visão deste chamador
+        index = BackendView(index, index.get_backend(backend))
+    if mode == "hybrid":
+        return HybridIndex(index, get_lexical_index(docs_file))
+    return index
+
+def namespace_path(namespace: str) -> str:
+    """
+    Arquivo de documentos de um namespace (ex.: um projeto).
+    
+    Args:
+        namespace: Nome do namespace
+        
+    Returns:
+        Caminho em data/namespaces/, usável como docs_file
+    """
+    safe = re.sub(r"[^\w.-]", "_", namespace).strip(".") or "_"
+    return os.path.join(NAMESPACES_DIR, safe + ".json")
+
+def list_namespaces() -> List[str]:
+    """Namespaces com log de documentos em data/namespaces/."""
+    if not os.path.isdir(NAMESPACES_DIR):
+        return []
+    return sorted(name[:-len(LOG_SUFFIX)] for name in os.listdir(NAMESPACES_DIR) if name.endswith(LOG_SUFFIX))
+
+def query_namespaces(query: str, namespaces: List[str] = None, top_k: int = 3, mode: str = "vector",
+                     quantized: bool = False, filters: Dict = None) -> List[Tuple[Dict, float]]:
+    """
+    Consulta vários namespaces e junta os resultados num único top_k.
+    
+    Cada índice é carregado sob demanda (e pode ser descarregado pelo LRU de
+    RESIDENT ao carregar os seguintes) e devolve seu próprio top_k ordenado;
+    as listas são intercaladas com heapq.merge até completar o top_k global.
+    Os scores só são comparáveis entre namespaces nos modos vetoriais; no BM25
+    o IDF é calculado por namespace.
+    
+    Args:
+        query: Consulta textual
+        namespaces: Namespaces consultados (padrão: todos)
+        top_k: Número de documentos a recuperar
+        mode: Modo de busca ("vector", "bm25", "hybrid" ou "sparse")
+        quantized: Se deve usar o índice vetorial int8
+        filters: Filtros de metadados
+        
+    Returns:
+        Lista de (metadados com o campo "namespace", score)
+    """
+    if namespaces is None:
+        namespaces = list_namespaces()
+    per_index = []
+    for namespace in namespaces:
+        docs_file = namespace_path(namespace)
+        if not os.path.exists(os.path.splitext(docs_file)[0] + LOG_SUFFIX):
+            print(f"[RAG] Namespace não encontrado: {namespace}")
+            continue
+        hits = retrieve(query, get_retriever(docs_file, mode, quantized=quantized), top_k, filters=filters)
+        per_index.append([(dict(meta, namespace=namespace), score) for meta, score in hits])
+    merged = heapq.merge(*per_index, key=lambda hit: -hit[1])
+    return list(itertools.islice(merged, top_k))
+
 def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     """
     Calcula a similaridade de cosseno entre dois vetores.
@@ -116,36 +1130,207 @@ def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     dot_product = sum(a * b for a, b in zip(vec1, vec2))
     return dot_product
 
-def retrieve(query: str, index: List[Dict], top_k: int = 3) -> List[Tuple[Dict, float]]:
+class QueryCache:
+    """
+    Cache LRU de resultados de consultas.
+    
+    A chave inclui o cache_key() do índice, que muda a cada inserção,
+    atualização ou remoção; resultados de versões antigas simplesmente deixam
+    de ser encontrados e saem pelo LRU.
+    """
+    
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, List[Tuple[Dict, float]]]" = OrderedDict()
+    
+    def get(self, key: Tuple) -> Optional[List[Tuple[Dict, float]]]:
+        """Retorna o resultado em cache (marcando-o como recente) ou None."""
+        results = self._entries.get(key)
+        if results is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return list(results)
+    
+    def put(self, key: Tuple, results: List[Tuple[Dict, float]]):
+        """Armazena um resultado, descartando o menos recente se necessário."""
+        self._entries[key] = list(results)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Esvazia o cache e zera os contadores."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+    
+    def stats(self) -> Dict:
+        """Contadores de acertos e falhas para ajuste do tamanho do cache."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+QUERY_CACHE = QueryCache()
+
+def normalize_query(query: str) -> str:
+    """Normaliza a consulta (Unicode NFC e espaços) para busca e cache."""
+    return " ".join(unicodedata.normalize("NFC", query).split())
+
+def _filters_key(filters: Optional[Dict]) -> Tuple:
+    if not filters:
+        return ()
+    return tuple(sorted(
+        (field, (value,) if isinstance(value, str) else tuple(sorted(value)))
+        for field, value in filters.items()
+    ))
+
+def _query_cache_key(query: str, index, top_k: int, filters: Dict = None) -> Optional[Tuple]:
+    if not hasattr(index, "cache_key"):
+        return None
+    return (query, top_k, _filters_key(filters), index.cache_key())
+
+def cache_stats() -> Dict:
+    """Estatísticas do cache de consultas (hits, misses, tamanho)."""
+    return QUERY_CACHE.stats()
+
+def clear_query_cache():
+    """Esvazia o cache de consultas."""
+    QUERY_CACHE.clear()
+
+def retrieve(query: str, index: Union[VectorIndex, BM25Index, HybridIndex, List[Dict]], top_k: int = 3,
+             use_cache: bool = True, filters: Dict = None, mmr: float = None,
+             pool: int = MMR_POOL) -> List[Tuple[Dict, float]]:
     """
     Recupera os documentos mais relevantes para a consulta.
     
     Args:
         query: Consulta textual
-        index: Índice de documentos
+        index: Índice de documentos (VectorIndex, BM25Index, HybridIndex,
+            SparseVectorIndex ou lista no formato antigo)
         top_k: Número de documentos a retornar
+        use_cache: Se deve consultar/preencher o cache de consultas
+        filters: Filtros de metadados, ex. {"source": "logs"} ou
+            {"source": ["logs", "docs"], "title": "README.md"}; só os
+            documentos candidatos são pontuados
+        mmr: Peso da relevância no reranqueamento MMR (None = sem MMR)
+        pool: Candidatos recuperados antes do reranqueamento MMR
         
     Returns:
         Lista de tuplas (metadados, score)
     """
     print(f"[RAG] Recuperando documentos para: '{query}'")
     
-    query_emb = simple_embed(query)
+    if isinstance(index, list):
+        # Índice temporário, com um uid novo a cada chamada: não há chave estável para o cache
+        index = VectorIndex.from_items(index)
+        use_cache = False
     
-    similarities = []
-    for item in index:
-        sim = cosine_similarity(query_emb, item["emb"])
-        similarities.append((sim, item))
+    fetch_k = max(top_k, pool) if mmr is not None else top_k
+    query = normalize_query(query)
+    key = _query_cache_key(query, index, fetch_k, filters) if use_cache else None
+    results = QUERY_CACHE.get(key) if key is not None else None
+    cached = results is not None
+    if not cached:
+        results = index.search(query, fetch_k, filters=filters)
+        if key is not None:
+            QUERY_CACHE.put(key, results)
+    if mmr is not None:
+        results = mmr_rerank(results, top_k, mmr)
     
-    # Ordenar por similaridade (maior primeiro)
-    similarities.sort(key=lambda x: x[0], reverse=True)
+    print(f"[RAG] {len(results)} documentos recuperados" + (" (cache)" if cached else ""))
+    return results
+
+def retrieve_many(queries: List[str], index: Union[VectorIndex, BM25Index, HybridIndex, List[Dict]],
+                  top_k: int = 3, use_cache: bool = True, filters: Dict = None,
+                  mmr: float = None, pool: int = MMR_POOL) -> List[List[Tuple[Dict, float]]]:
+    """
+    Recupera documentos para várias consultas de uma vez.
+    
+    No índice vetorial, todas as consultas ausentes do cache são embedadas em
+    uma passada e pontuadas com um único produto matriz-matriz.
+    
+    Args:
+        queries: Consultas textuais
+        index: Índice de documentos
+        top_k: Número de documentos por consulta
+        use_cache: Se deve consultar/preencher o cache de consultas
+        filters: Filtros de metadados aplicados a todas as consultas
+        mmr: Peso da relevância no reranqueamento MMR (None = sem MMR)
+        pool: Candidatos recuperados antes do reranqueamento MMR
+        
+    Returns:
+        Lista com os resultados (metadados, score) de cada consulta, na mesma ordem
+    """
+    print(f"[RAG] Recuperando documentos para {len(queries)} consultas")
+    
+    if isinstance(index, list):
+        # Índice temporário, com um uid novo a cada chamada: não há chave estável para o cache
+        index = VectorIndex.from_items(index)
+        use_cache = False
     
-    # Retornar top_k resultados
-    results = [(item["meta"], float(score)) for score, item in similarities[:top_k]]
+    fetch_k = max(top_k, pool) if mmr is not None else top_k
+    queries = [normalize_query(q) for q in queries]
+    keys = [_query_cache_key(q, index, fetch_k, filters) if use_cache else None for q in queries]
+    results: List[Optional[List[Tuple[Dict, float]]]] = [
+        QUERY_CACHE.get(key) if key is not None else None for key in keys
+    ]
     
-    print(f"[RAG] {len(results)} documentos recuperados")
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        computed = index.search_many([queries[i] for i in missing], fetch_k, filters=filters)
+        for i, found in zip(missing, computed):
+            results[i] = found
+            if keys[i] is not None:
+                QUERY_CACHE.put(keys[i], found)
+    if mmr is not None:
+        results = [mmr_rerank(found, top_k, mmr) for found in results]
     return results
 
+def generate_answer_stream(query: str, retrieved: Iterable[Tuple[Dict, float]]) -> Iterator[str]:
+    """
+    Gera a resposta em partes: cabeçalho, uma parte por referência e a nota final.
+    
+    Cada parte sai assim que é produzida, então a interface pode renderizar
+    e a voz pode começar a falar antes do fim. Concatenar as partes dá
+    exatamente o texto de generate_answer().
+    
+    Args:
+        query: Consulta original
+        retrieved: Documentos recuperados (lista ou iterador)
+        
+    Yields:
+        Trechos de markdown da resposta
+    """
+    retrieved = iter(retrieved)
+    first = next(retrieved, None)
+    if first is None:
+        yield f"Nenhum documento relevante encontrado para: '{query}'"
+        return
+    
+    yield f"""**Resposta para:** "{query}"
+
+**Documentos relevantes encontrados:**
+
+"""
+    
+    for i, (meta, score) in enumerate(itertools.chain([first], retrieved)):
+        title = meta.get("title", "Sem título")
+        source = meta.get("source", "Desconhecida")
+        yield ("\n" if i else "") + f"- **{title}** (fonte: {source}, relevância: {score:.2f})"
+    
+    yield """
+
+**Nota:** Esta é uma resposta gerada pelo sistema RAG mock. Para respostas mais precisas, integre com um modelo de linguagem real."""
+
 def generate_answer(query: str, retrieved: List[Tuple[Dict, float]]) -> str:
     """
     Gera uma resposta baseada nos documentos recuperados.
@@ -157,27 +1342,140 @@ def generate_answer(query: str, retrieved: List[Tuple[Dict, float]]) -> str:
     Returns:
         Resposta gerada
     """
-    if not retrieved:
-        return f"Nenhum documento relevante encontrado para: '{query}'"
-    
-    # Construir resposta com base nos documentos recuperados
-    parts = []
-    for meta, score in retrieved:
-        title = meta.get("title", "Sem título")
-        source = meta.get("source", "Desconhecida")
-        parts.append(f"**{title}** (fonte: {source}, relevância: {score:.2f})")
+    return "".join(generate_answer_stream(query, retrieved))
+
+def _update_loaded_indexes(docs_file: str, docs: List[Dict], save: bool = True,
+                           removed: List[str] = ()):
+    """
+    Aplica documentos novos e remoções aos índices em memória e registra a nova
+    assinatura do log. Índices não carregados neste processo se sincronizam na
+    próxima consulta.
     
-    references = "\n".join(f"- {p}" for p in parts)
+    Com save=False o arquivo do índice fica com a assinatura antiga; se o
+    processo for interrompido antes de save_indexes(), a próxima carga
+    ressincroniza o índice a partir do log. Gravar o índice inteiro custa O(n),
+    então as escritas comuns usam save=False e _schedule_index_save().
+    """
+    stamp = _docs_stamp(docs_file)
+    loaded = False
+    for path in index_paths(docs_file):
+        cached = _INDEX_CACHE.get(path)
+        if cached is None:
+            continue
+        loaded = True
+        index = cached[1]
+        if removed:
+            index.remove(removed)
+        index.upsert_docs(docs)
+        if save:
+            index.save(path, stamp)
+        _INDEX_CACHE[path] = (stamp, index)
+    if loaded and (docs or removed):
+        RESIDENT.touch(docs_file)
+
+def _schedule_index_save(docs_file: str):
+    """
+    Agenda save_indexes() para INDEX_SAVE_DELAY segundos depois da primeira
+    alteração, juntando todas as escritas do intervalo numa única gravação.
+    """
+    with _WRITE_LOCK:
+        if docs_file in _PENDING_SAVES:
+            return
+        if INDEX_SAVE_DELAY <= 0:
+            _update_loaded_indexes(docs_file, [], save=True)
+            return
+        timer = threading.Timer(INDEX_SAVE_DELAY, save_indexes, args=(docs_file,))
+        timer.daemon = True
+        _PENDING_SAVES[docs_file] = timer
+        timer.start()
+
+def save_indexes(docs_file: str = None):
+    """
+    Persiste os índices carregados de um arquivo de documentos.
     
-    answer = f"""**Resposta para:** "{query}"
+    Args:
+        docs_file: Caminho do arquivo de documentos (opcional)
+    """
+    docs_file = docs_path(docs_file)
+    with _WRITE_LOCK:
+        timer = _PENDING_SAVES.pop(docs_file, None)
+        if timer is not None:
+            timer.cancel()
+        _update_loaded_indexes(docs_file, [], save=True)
 
-**Documentos relevantes encontrados:**
+def flush_indexes():
+    """Grava imediatamente todos os índices com alterações pendentes."""
+    for docs_file in list(_PENDING_SAVES):
+        save_indexes(docs_file)
 
-{references}
+atexit.register(flush_indexes)
 
-**Nota:** Esta é uma resposta gerada pelo sistema RAG mock. Para respostas mais precisas, integre com um modelo de linguagem real."""
+def add_documents(docs: List[Dict], docs_file: str = None, save_index: bool = True,
+                  dedup: bool = True) -> List[Dict]:
+    """
+    Adiciona um lote de documentos já com ID ao log e aos índices carregados.
+    Documentos cujo conteúdo já está no repositório são descartados.
+    
+    Args:
+        docs: Documentos com id, title, text e source
+        docs_file: Caminho do arquivo de documentos (opcional)
+        save_index: Se deve agendar a gravação dos índices (ver _schedule_index_save)
+        dedup: Descartar documentos com conteúdo já existente (False para
+            chunks de arquivos, cujo ID precisa existir mesmo com conteúdo repetido)
+        
+    Returns:
+        Documentos efetivamente gravados
+    """
+    docs_file = docs_path(docs_file)
+    with _WRITE_LOCK:
+        get_index(docs_file)
+        written = get_store(docs_file).append_many(docs, dedup=dedup)
+        if written:
+            _update_loaded_indexes(docs_file, written, save=False)
+            if save_index:
+                _schedule_index_save(docs_file)
+    if len(written) < len(docs):
+        print(f"[RAG] {len(docs) - len(written)} documentos duplicados ignorados")
+    schedule_compaction(docs_file)
+    return written
+
+def delete_documents(doc_ids: List[str], docs_file: str = None, save_index: bool = True) -> List[str]:
+    """
+    Remove documentos do repositório e dos índices carregados.
+    
+    O log recebe tombstones (escrita O(1) por documento); o espaço é liberado
+    pela compactação, disparada em segundo plano quando o lixo passa de
+    COMPACT_GARBAGE_RATIO do log.
+    
+    Args:
+        doc_ids: IDs dos documentos
+        docs_file: Caminho do arquivo de documentos (opcional)
+        save_index: Se deve agendar a gravação dos índices após a remoção
+        
+    Returns:
+        IDs efetivamente removidos
+    """
+    docs_file = docs_path(docs_file)
+    with _WRITE_LOCK:
+        get_index(docs_file)
+        removed = get_store(docs_file).delete_many(doc_ids)
+        if removed:
+            _update_loaded_indexes(docs_file, [], save=False, removed=removed)
+            if save_index:
+                _schedule_index_save(docs_file)
+    if removed:
+        print(f"[RAG] {len(removed)} documentos removidos")
+        schedule_compaction(docs_file)
+    return removed
+
+def delete_document(doc_id: str, docs_file: str = None) -> bool:
+    """
+    Remove um documento pelo ID.
     
-    return answer
+    Returns:
+        True se o documento existia
+    """
+    return bool(delete_documents([doc_id], docs_file))
 
 def add_document(title: str, text: str, source: str = "manual", docs_file: str = None) -> Dict:
     """
@@ -192,7 +1490,7 @@ def add_document(title: str, text: str, source: str = "manual", docs_file: str =
     Returns:
         Documento adicionado
     """
-    docs = load_docs(docs_file)
+    docs_file = docs_path(docs_file)
     
     # Gerar ID único
     doc_id = hashlib.md5(f"{title}{text}".encode("utf-8")).hexdigest()[:12]
@@ -204,34 +1502,104 @@ def add_document(title: str, text: str, source: str = "manual", docs_file: str =
         "source": source
     }
     
-    docs.append(new_doc)
-    save_docs(docs, docs_file)
+    with _WRITE_LOCK:
+        get_index(docs_file)
+        store = get_store(docs_file)
+        
+        # Mesmo conteúdo já indexado: devolver o documento existente
+        existing = store.find_duplicate(new_doc)
+        if existing is not None:
+            print(f"[RAG] Documento já existe: {title} (ID: {existing})")
+            return store.get(existing)
+        
+        # Escrita O(1) no fim do log
+        store.append(new_doc, dedup=False)
+        
+        # Atualizar no lugar os índices já carregados; a gravação é adiada
+        _update_loaded_indexes(docs_file, [new_doc], save=False)
+        _schedule_index_save(docs_file)
     
     print(f"[RAG] Documento adicionado: {title} (ID: {doc_id})")
     return new_doc
 
-def query_rag(query: str, top_k: int = 3, docs_file: str = None) -> str:
+def lookup_symbol(name: str, docs_file: str = None) -> List[Dict]:
+    """
+    Busca a definição de um símbolo, incluindo os arquivos de código ingeridos no RAG.
+    
+    Args:
+        name: Nome da função, classe ou método
+        docs_file: Caminho do arquivo de documentos (opcional)
+        
+    Returns:
+        Definições encontradas (ver SymbolIndex.lookup)
+    """
+    index = get_symbol_index()
+    index.sync_store(get_index(docs_file))
+    return index.lookup(name)
+
+def query_rag(query: str, top_k: int = 3, docs_file: str = None, mode: str = "vector",
+              backend: str = None, quantized: bool = False, filters: Dict = None,
+              namespaces: List[str] = None, mmr: float = None) -> str:
     """
     Função de alto nível para consultar o sistema RAG.
     
+    Perguntas sobre símbolos de código ("onde está definida a função X",
+    identificadores como load_docs) são respondidas pelo índice de símbolos,
+    quando ele conhece o nome; as demais seguem para a recuperação de documentos.
+    
     Args:
         query: Consulta textual
         top_k: Número de documentos a recuperar
         docs_file: Caminho do arquivo de documentos (opcional)
+        mode: Modo de busca ("vector", "bm25", "hybrid" ou "sparse")
+        backend: Backend ANN ("auto", "faiss", "annoy", "ivf"; None = busca exata)
+        quantized: Se deve usar o índice vetorial int8
+        filters: Filtros de metadados (ex.: {"source": "logs"})
+        namespaces: Consultar estes namespaces em vez de docs_file ([] = todos)
+        mmr: Peso da relevância no reranqueamento MMR (None = sem MMR)
         
     Returns:
         Resposta gerada
     """
-    docs = load_docs(docs_file)
+    return "".join(query_rag_stream(query, top_k, docs_file, mode, backend, quantized,
+                                    filters, namespaces, mmr))
+
+def query_rag_stream(query: str, top_k: int = 3, docs_file: str = None, mode: str = "vector",
+                     backend: str = None, quantized: bool = False, filters: Dict = None,
+                     namespaces: List[str] = None, mmr: float = None) -> Iterator[str]:
+    """
+    Versão em streaming de query_rag(): mesmos argumentos, resposta em partes.
+    
+    Yields:
+        Trechos de markdown da resposta (ver generate_answer_stream)
+    """
+    symbol = extract_symbol_name(query)
+    if symbol:
+        symbols = lookup_symbol(symbol, docs_file)
+        if symbols:
+            print(f"[RAG] Consulta de símbolo: {symbol} ({len(symbols)} definições)")
+            yield format_symbols(symbol, symbols)
+            return
     
-    if not docs:
-        return "Nenhum documento disponível no sistema. Adicione documentos primeiro."
+    if namespaces is not None:
+        fetch_k = max(top_k, MMR_POOL) if mmr is not None else top_k
+        retrieved = query_namespaces(query, namespaces or None, fetch_k, mode, quantized, filters)
+        if not retrieved:
+            yield "Nenhum documento disponível nos namespaces consultados."
+            return
+        if mmr is not None:
+            retrieved = mmr_rerank(retrieved, top_k, mmr)
+        yield from generate_answer_stream(query, retrieved)
+        return
     
-    index = build_index(docs)
-    retrieved = retrieve(query, index, top_k)
-    answer = generate_answer(query, retrieved)
+    index = get_retriever(docs_file, mode, backend, quantized)
     
-    return answer
+    if not len(index):
+        yield "Nenhum documento disponível no sistema. Adicione documentos primeiro."
+        return
+    
+    retrieved = retrieve(query, index, top_k, filters=filters, mmr=mmr)
+    yield from generate_answer_stream(query, retrieved)
 
 if __name__ == "__main__":
     import argparse
@@ -243,19 +1611,53 @@ if __name__ == "__main__":
     parser.add_argument("--text", help="Texto do documento")
     parser.add_argument("--source", default="manual", help="Fonte do documento")
     parser.add_argument("--top-k", type=int, default=3, help="Número de documentos a recuperar")
+    parser.add_argument("--mode", choices=["vector", "bm25", "hybrid", "sparse"], default="vector", help="Modo de busca")
+    parser.add_argument("--backend", choices=["auto", "faiss", "annoy", "ivf", "exact"], help="Backend ANN da busca vetorial")
+    parser.add_argument("--quantized", action="store_true", help="Usar embeddings int8 (menos memória)")
+    parser.add_argument("--filter", action="append", default=[], metavar="CAMPO=VALOR",
+                        help="Filtrar por metadados (source, title ou path); pode repetir")
+    parser.add_argument("--compact", action="store_true", help="Compactar o log de documentos")
+    parser.add_argument("--delete", nargs="+", metavar="ID", help="Remover documentos pelo ID")
+    parser.add_argument("--namespace", action="append", metavar="NOME",
+                        help="Usar o namespace (projeto) dado; na consulta pode repetir")
+    parser.add_argument("--all-namespaces", action="store_true", help="Consultar todos os namespaces")
+    parser.add_argument("--memory-budget", type=int, metavar="MB", help="Memória máxima dos índices residentes")
+    parser.add_argument("--eval", metavar="CONSULTAS",
+                        help="Avaliar recall@k, MRR e latência de cada backend (ver rag_eval.py)")
+    parser.add_argument("--mmr", type=float, nargs="?", const=MMR_LAMBDA, metavar="LAMBDA",
+                        help="Diversificar os resultados com MMR (peso da relevância, padrão 0.5)")
     args = parser.parse_args()
     
-    if args.add_doc:
+    if args.memory_budget:
+        set_memory_budget(args.memory_budget * 1024 * 1024)
+    namespace_file = namespace_path(args.namespace[0]) if args.namespace else None
+    
+    if args.eval:
+        from core import rag_eval
+        rag_eval.print_report(rag_eval.run_eval(rag_eval.load_queries(args.eval), namespace_file))
+    elif args.compact:
+        stats = compact_docs(namespace_file)
+        print(json.dumps(stats, indent=2, ensure_ascii=False))
+    elif args.delete:
+        delete_documents(args.delete, namespace_file)
+    elif args.add_doc:
         if not args.title or not args.text:
             print("Erro: --title e --text são obrigatórios para adicionar documento")
             exit(1)
-        add_document(args.title, args.text, args.source)
+        add_document(args.title, args.text, args.source, namespace_file)
     elif args.query:
-        answer = query_rag(args.query, args.top_k)
+        filters = {}
+        for item in args.filter:
+            field, _, value = item.partition("=")
+            filters.setdefault(field, []).append(value)
+        namespaces = [] if args.all_namespaces else args.namespace
+        answer = query_rag(args.query, args.top_k, mode=args.mode, backend=args.backend,
+                           quantized=args.quantized, filters=filters, namespaces=namespaces,
+                           mmr=args.mmr)
         print("\n" + "="*60)
         print(answer)
         print("="*60)
     else:
-        print("Use --query para consultar ou --add-doc para adicionar documento")
+        print("Use --query para consultar, --add-doc para adicionar documento ou --compact para compactar o log")
         print("Execute com --help para mais informações")
 
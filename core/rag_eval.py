@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# core/rag_eval.py
+"""
+Avaliação da qualidade de recuperação do RAG.
+Roda um conjunto de consultas rotuladas (consulta -> IDs relevantes) em cada
+configuração de busca disponível (busca exata, backends ANN, int8, BM25,
+híbrida e esparsa) e compara recall@k, MRR e latência lado a lado, para
+saber se um backend mais rápido perde documentos relevantes.
+Tudo roda localmente, sem acesso à rede.
+"""
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+# Adicionar o diretório pai ao path para imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core import rag_core
+from core.rag_backends import available_backends
+from core.rag_bm25 import BM25Index
+from core.rag_sparse import SparseVectorIndex, SKLEARN_AVAILABLE
+
+DEFAULT_KS = [1, 5, 10]
+
+def load_queries(path: str) -> List[Dict]:
+    """
+    Carrega o conjunto de consultas rotuladas.
+
+    Aceita uma lista JSON ou um arquivo JSONL, com um objeto por consulta:
+    {"query": "texto", "relevant": ["id1", "id2"]}
+
+    Args:
+        path: Caminho do arquivo
+
+    Returns:
+        Lista de consultas com os IDs relevantes
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    if content.lstrip().startswith("["):
+        items = json.loads(content)
+    else:
+        items = [json.loads(line) for line in content.splitlines() if line.strip()]
+    for i, item in enumerate(items):
+        if not item.get("query") or not item.get("relevant"):
+            raise ValueError(f"Consulta {i} sem os campos 'query' e 'relevant': {item}")
+    return items
+
+def build_configs(docs: List[Dict]) -> Dict[str, Callable[[], object]]:
+    """
+    Monta, para cada configuração de busca disponível, uma função que cria o índice.
+
+    Os índices são construídos em memória a partir dos documentos, sem tocar
+    nos índices persistidos nem no backend do índice carregado por rag_core.
+
+    Args:
+        docs: Documentos do RAG
+
+    Returns:
+        Dicionário nome -> função sem argumentos que retorna o índice
+    """
+    def vector(backend: str = None, quantized: bool = False):
+        def factory():
+            index = rag_core.build_index(docs, quantized=quantized)
+            if backend is not None:
+                index.use_backend(backend)
+            return index
+        return factory
+
+    def lexical():
+        index = BM25Index()
+        index.upsert_docs(docs)
+        return index
+
+    configs = {"exact": vector()}
+    for name in available_backends():
+        if name != "exact":
+            configs[name] = vector(name)
+    configs["int8"] = vector(quantized=True)
+    configs["bm25"] = lexical
+    configs["hybrid"] = lambda: rag_core.HybridIndex(vector()(), lexical())
+    if SKLEARN_AVAILABLE:
+        def sparse():
+            index = SparseVectorIndex()
+            index.upsert_docs(docs)
+            return index
+        configs["sparse"] = sparse
+    return configs
+
+def evaluate(index, queries: List[Dict], ks: List[int] = DEFAULT_KS) -> Dict:
+    """
+    Mede recall@k, MRR e latência de um índice.
+
+    As consultas vão direto para index.search (sem o cache de consultas).
+
+    Args:
+        index: Índice com o método search(query, top_k)
+        queries: Consultas rotuladas (ver load_queries)
+        ks: Cortes do recall
+
+    Returns:
+        Dicionário com recall@k por corte, mrr e latências em ms
+    """
+    max_k = max(ks)
+    recalls = {k: [] for k in ks}
+    reciprocal_ranks = []
+    latencies = []
+    for item in queries:
+        relevant = set(item["relevant"])
+        start = time.perf_counter()
+        results = index.search(item["query"], max_k)
+        latencies.append(time.perf_counter() - start)
+
+        ranked = [meta["id"] for meta, _ in results]
+        for k in ks:
+            recalls[k].append(len(relevant.intersection(ranked[:k])) / len(relevant))
+        rank = next((i + 1 for i, doc_id in enumerate(ranked) if doc_id in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000.0, [50, 95, 99]) if latencies else (0.0,) * 3
+    metrics = {f"recall@{k}": float(np.mean(values)) if values else 0.0 for k, values in recalls.items()}
+    metrics.update({
+        "mrr": float(np.mean(reciprocal_ranks)) if reciprocal_ranks else 0.0,
+        "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+        "queries": len(queries)
+    })
+    return metrics
+
+def run_eval(queries: List[Dict], docs_file: str = None, ks: List[int] = DEFAULT_KS,
+             configs: List[str] = None) -> Dict[str, Dict]:
+    """
+    Avalia as consultas em todas as configurações (ou nas pedidas).
+
+    Args:
+        queries: Consultas rotuladas
+        docs_file: Caminho do arquivo de documentos (opcional)
+        ks: Cortes do recall
+        configs: Nomes das configurações (padrão: todas as disponíveis)
+
+    Returns:
+        Dicionário configuração -> métricas (com build_s, o tempo de construção)
+    """
+    docs = rag_core.load_docs(rag_core.docs_path(docs_file))
+    available = build_configs(docs)
+    names = configs or list(available)
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Configurações indisponíveis: {', '.join(unknown)} "
+                         f"(disponíveis: {', '.join(available)})")
+
+    report = {}
+    for name in names:
+        print(f"[EVAL] {name}: construindo índice com {len(docs)} documentos...")
+        start = time.perf_counter()
+        index = available[name]()
+        build_s = time.perf_counter() - start
+        report[name] = evaluate(index, queries, ks)
+        report[name]["build_s"] = build_s
+    return report
+
+def print_report(report: Dict[str, Dict], ks: List[int] = DEFAULT_KS):
+    """Imprime as métricas de cada configuração lado a lado."""
+    recall_cols = [f"recall@{k}" for k in ks]
+    print(f"{'config':>8} " + " ".join(f"{c:>9}" for c in recall_cols)
+          + f" {'mrr':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'build_s':>8}")
+    for name, m in report.items():
+        print(f"{name:>8} " + " ".join(f"{m[c]:>9.3f}" for c in recall_cols)
+              + f" {m['mrr']:>6.3f} {m['p50_ms']:>8.3f} {m['p95_ms']:>8.3f} {m['p99_ms']:>8.3f} {m['build_s']:>8.3f}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Avaliação de qualidade e latência do RAG")
+    parser.add_argument("queries", help="Consultas rotuladas (JSON ou JSONL com query e relevant)")
+    parser.add_argument("--docs", default=None, help="Arquivo de documentos (padrão: data/docs_store.json)")
+    parser.add_argument("--k", type=int, nargs="+", default=DEFAULT_KS, help="Cortes do recall@k")
+    parser.add_argument("--configs", nargs="+", help="Configurações avaliadas (padrão: todas disponíveis)")
+    parser.add_argument("--output", help="Salvar as métricas em JSON")
+    args = parser.parse_args()
+
+    result = run_eval(load_queries(args.queries), args.docs, args.k, args.configs)
+    print_report(result, args.k)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"[EVAL] Métricas salvas em: {args.output}")
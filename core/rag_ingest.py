@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# core/rag_ingest.py
+"""
+Ingestão de arquivos grandes no RAG em chunks.
+Lê o arquivo em blocos de tamanho limitado (com sobreposição), grava os chunks
+em lotes no log de documentos e nos índices, e registra o progresso para
+retomar a ingestão após uma interrupção.
+"""
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+# Adicionar o diretório pai ao path para imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core import rag_core
+
+CHUNK_SIZE = 2000      # bytes por chunk
+CHUNK_OVERLAP = 200    # bytes repetidos entre chunks consecutivos
+BATCH_SIZE = 64        # chunks gravados por lote
+STATE_SUFFIX = ".ingest.json"
+
+def _utf8_boundary(buf: bytes, pos: int) -> int:
+    """Recua pos até o início de um caractere UTF-8."""
+    while 0 < pos < len(buf) and (buf[pos] & 0xC0) == 0x80:
+        pos -= 1
+    return pos
+
+def iter_file_chunks(path: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP,
+                     start: int = 0) -> Iterator[Dict]:
+    """
+    Gera chunks de um arquivo sem carregá-lo inteiro na memória.
+
+    Cada chunk tem no máximo chunk_size bytes e termina, quando possível, em
+    uma quebra de linha. O chunk seguinte começa overlap bytes antes do fim
+    do anterior. Os cortes respeitam os limites de caracteres UTF-8.
+
+    Args:
+        path: Caminho do arquivo
+        chunk_size: Tamanho máximo de cada chunk em bytes
+        overlap: Sobreposição entre chunks consecutivos em bytes
+        start: Offset em bytes onde começar (para retomar)
+
+    Yields:
+        Dicionários com "text", "start", "end" e "next" (início do próximo chunk)
+    """
+    if overlap >= chunk_size // 2:
+        raise ValueError("overlap deve ser menor que metade de chunk_size")
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        pos = start
+        buf = b""
+        done_upto = start
+        while True:
+            data = f.read(chunk_size - len(buf))
+            buf += data
+            if not buf or (not data and pos + len(buf) <= done_upto):
+                break
+
+            eof = len(buf) < chunk_size
+            end = len(buf)
+            if not eof:
+                newline = buf.rfind(b"\n", chunk_size // 2)
+                end = newline + 1 if newline != -1 else _utf8_boundary(buf, end)
+
+            step = end if eof else _utf8_boundary(buf, end - overlap)
+            done_upto = pos + end
+            yield {
+                "text": buf[:end].decode("utf-8", errors="replace"),
+                "start": pos,
+                "end": pos + end,
+                "next": pos + step
+            }
+            if eof:
+                break
+            buf = buf[step:]
+            pos += step
+
+def chunk_documents(path: str, source: str = "file", chunk_size: int = CHUNK_SIZE,
+                    overlap: int = CHUNK_OVERLAP, start: int = 0) -> Iterator[Dict]:
+    """
+    Converte os chunks de um arquivo em documentos do RAG.
+
+    O ID de cada chunk depende só do caminho e do offset, então reingerir um
+    arquivo substitui os chunks anteriores em vez de duplicá-los.
+
+    Yields:
+        Documentos com id, title, text, source, path, start e end, mais
+        "next" (offset do chunk seguinte, usado para retomar)
+    """
+    path = os.path.abspath(path)
+    name = os.path.basename(path)
+    for chunk in iter_file_chunks(path, chunk_size, overlap, start):
+        yield {
+            "id": hashlib.md5(f"{path}:{chunk['start']}".encode("utf-8")).hexdigest()[:12],
+            "title": f"{name} [{chunk['start']}-{chunk['end']}]",
+            "text": chunk["text"],
+            "source": source,
+            "path": path,
+            "start": chunk["start"],
+            "end": chunk["end"],
+            "next": chunk["next"]
+        }
+
+def _state_path(docs_file: str) -> str:
+    return os.path.splitext(docs_file)[0] + STATE_SUFFIX
+
+def _load_state(docs_file: str) -> Dict:
+    path = _state_path(docs_file)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_state(docs_file: str, state: Dict):
+    path = _state_path(docs_file)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _stale_chunks(path: str, docs_file: str, chunk_size: int, overlap: int, size: int) -> List[str]:
+    """
+    IDs dos chunks de um arquivo que não pertencem à divisão atual dele.
+
+    Percorre em paralelo os offsets dos chunks gravados (metadado "start")
+    e os inícios dos chunks do arquivo atual, ambos em ordem crescente; um
+    chunk antigo é obsoleto se começa depois do fim do arquivo ou num offset
+    que não é início de chunk.
+    """
+    index = rag_core.get_index(docs_file)
+    rows = index.filter_rows({"path": path})
+    if rows is None or not len(rows):
+        return []
+    old = sorted((index.metas[row].get("start", 0), index.ids[row]) for row in rows)
+    stale = [doc_id for offset, doc_id in old if offset >= size]
+    old = [(offset, doc_id) for offset, doc_id in old if offset < size]
+    starts = (chunk["start"] for chunk in iter_file_chunks(path, chunk_size, overlap))
+    current = next(starts, None)
+    for offset, doc_id in old:
+        while current is not None and current < offset:
+            current = next(starts, None)
+        if current != offset:
+            stale.append(doc_id)
+    return stale
+
+def ingest_file(path: str, source: str = "file", docs_file: str = None,
+                chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP,
+                batch_size: int = BATCH_SIZE) -> Dict:
+    """
+    Ingere um arquivo no RAG em lotes de chunks, com retomada.
+
+    O progresso (só o offset do próximo chunk) é registrado após cada lote,
+    então o estado e a memória não crescem com o arquivo. Se o arquivo não
+    mudou desde a última execução, a ingestão continua de onde parou, ou é
+    pulada se já terminou. Ao terminar, os chunks antigos do arquivo cujo
+    offset não é o início de um chunk novo (o ID depende de caminho e offset)
+    são removidos.
+
+    Args:
+        path: Caminho do arquivo
+        source: Fonte registrada nos documentos
+        docs_file: Caminho do arquivo de documentos (opcional)
+        chunk_size: Tamanho máximo de cada chunk em bytes
+        overlap: Sobreposição entre chunks em bytes
+        batch_size: Número de chunks gravados por lote
+
+    Returns:
+        Dicionário com o número de chunks gravados, removidos e o status
+    """
+    docs_file = rag_core.docs_path(docs_file)
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    signature = {"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                 "chunk_size": chunk_size, "overlap": overlap}
+
+    state = _load_state(docs_file)
+    entry = state.get(path)
+    if entry is not None and entry.get("signature") == signature:
+        if entry.get("done"):
+            print(f"[RAG] Arquivo já ingerido, pulando: {path}")
+            return {"path": path, "chunks": 0, "removed": 0, "status": "unchanged"}
+        start = entry.get("next", 0)
+        status = "resumed" if start else "ingested"
+    else:
+        start, status = 0, "ingested"
+    if start:
+        print(f"[RAG] Retomando ingestão de {path} a partir do byte {start}")
+
+    written = 0
+    batch: List[Dict] = []
+    next_offset = start
+
+    def flush():
+        # Sem dedup: cada offset precisa do próprio ID para a limpeza no fim
+        rag_core.add_documents(batch, docs_file, save_index=False, dedup=False)
+        state[path] = {"signature": signature, "next": next_offset, "done": False}
+        _save_state(docs_file, state)
+
+    for doc in chunk_documents(path, source, chunk_size, overlap, start):
+        next_offset = doc.pop("next")
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush()
+            written += len(batch)
+            batch = []
+    if batch:
+        flush()
+        written += len(batch)
+
+    stale = _stale_chunks(path, docs_file, chunk_size, overlap, st.st_size)
+    removed = rag_core.delete_documents(stale, docs_file, save_index=False) if stale else []
+
+    rag_core.save_indexes(docs_file)
+    state[path] = {"signature": signature, "next": st.st_size, "done": True}
+    _save_state(docs_file, state)
+
+    print(f"[RAG] {written} chunks ingeridos de: {path}")
+    return {"path": path, "chunks": written, "removed": len(removed), "status": status}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingestão de arquivos no RAG em chunks")
+    parser.add_argument("files", nargs="+", help="Arquivos a ingerir")
+    parser.add_argument("--source", default="file", help="Fonte dos documentos")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Tamanho do chunk em bytes")
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP, help="Sobreposição entre chunks em bytes")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Chunks gravados por lote")
+    args = parser.parse_args()
+
+    for file_path in args.files:
+        result = ingest_file(file_path, args.source, chunk_size=args.chunk_size,
+                             overlap=args.overlap, batch_size=args.batch_size)
+        print(json.dumps(result, indent=2, ensure_ascii=False))
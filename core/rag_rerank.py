@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# core/rag_rerank.py
+"""
+Reranqueamento dos resultados do RAG por Maximal Marginal Relevance (MMR).
+Troca parte da relevância por diversidade, para que chunks quase idênticos
+(linhas de log consecutivas, documentos duplicados) não ocupem todo o top_k.
+"""
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from core.rag_bm25 import tokenize
+
+MMR_LAMBDA = 0.5     # 1.0 = só relevância, 0.0 = só diversidade
+MMR_POOL = 50        # Candidatos recuperados antes do reranqueamento
+TERM_DIM = 1024      # Buckets dos vetores de termos
+
+def term_vectors(texts: List[str], dim: int = TERM_DIM) -> np.ndarray:
+    """
+    Vetores bag-of-words com hashing (TF sublinear, norma 1) dos textos.
+
+    Os embeddings densos do RAG são hashes do texto inteiro, então dois chunks
+    que diferem numa palavra ficam ortogonais neles; a redundância entre
+    candidatos é medida pelos termos em comum.
+
+    Args:
+        texts: Textos dos candidatos
+        dim: Número de buckets
+
+    Returns:
+        Matriz float32 (len(texts), dim)
+    """
+    rows, buckets = [], []
+    for row, text in enumerate(texts):
+        for token in tokenize(text):
+            rows.append(row)
+            buckets.append(zlib.crc32(token.encode("utf-8")) % dim)
+    counts = np.bincount(
+        np.array(rows, dtype=np.int64) * dim + np.array(buckets, dtype=np.int64),
+        minlength=len(texts) * dim
+    ).reshape(len(texts), dim).astype(np.float32)
+    np.log1p(counts, out=counts)
+    norms = np.linalg.norm(counts, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return counts / norms
+
+def mmr_rerank(candidates: List[Tuple[Dict, float]], top_k: int,
+               lambda_: float = MMR_LAMBDA) -> List[Tuple[Dict, float]]:
+    """
+    Seleciona top_k candidatos maximizando relevância e diversidade.
+
+    A cada passo escolhe o candidato com maior
+    lambda * relevância - (1 - lambda) * similaridade máxima com os já escolhidos.
+    As similaridades par a par saem de um único produto matricial e o máximo
+    por candidato é atualizado com np.maximum, então o custo é O(n²) em NumPy
+    mais top_k passos vetorizados (barato para algumas centenas de candidatos).
+
+    Args:
+        candidates: Resultados (metadados, score) em ordem de relevância
+        top_k: Número de resultados
+        lambda_: Peso da relevância entre 0 e 1
+
+    Returns:
+        Os candidatos escolhidos, na ordem de seleção, com o score original
+    """
+    if len(candidates) <= 1 or top_k <= 0:
+        return candidates[:max(top_k, 0)]
+
+    # Relevância em [0, 1] relativa ao melhor candidato (scores BM25 não são limitados)
+    scores = np.array([score for _, score in candidates], dtype=np.float32)
+    if scores.min() < 0:
+        scores -= scores.min()
+    relevance = scores / scores.max() if scores.max() > 0 else np.ones_like(scores)
+
+    vectors = term_vectors([f"{meta.get('title', '')}\n{meta.get('text', '')}" for meta, _ in candidates])
+    similarity = vectors @ vectors.T
+
+    max_sim = np.zeros(len(candidates), dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    selected = []
+    for _ in range(min(top_k, len(candidates))):
+        gain = np.where(available, lambda_ * relevance - (1.0 - lambda_) * max_sim, -np.inf)
+        best = int(np.argmax(gain))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_sim, similarity[best], out=max_sim)
+    return [candidates[i] for i in selected]
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# core/rag_sparse.py
+"""
+Embeddings esparsos do RAG com HashingVectorizer do scikit-learn.
+Cada documento vira um vetor de frequências de termos (bag-of-words com
+hashing, sem vocabulário nem download de modelo) e a busca é um produto
+matriz esparsa x vetor esparso, ponderado por IDF.
+"""
+import itertools
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.rag_backends import top_k_rows
+from core.rag_bm25 import tokenize
+from core.rag_store import content_hash, doc_meta, MetadataIndex
+
+# Tentar importar scikit-learn/scipy
+try:
+    import scipy.sparse as sp
+    from sklearn.feature_extraction.text import HashingVectorizer
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    SKLEARN_AVAILABLE = False
+
+N_FEATURES = 1 << 18
+
+_INDEX_UIDS = itertools.count(1)
+
+class SparseVectorIndex:
+    """
+    Índice de vetores esparsos TF (sublinear, normalizados) com IDF aplicado na consulta.
+
+    Os documentos são vetorizados em lote numa única chamada ao
+    HashingVectorizer. As frequências de documento (df) são mantidas
+    incrementalmente, então inserir documentos não exige reajustar nada.
+    Documentos alterados ou removidos deixam a linha antiga marcada como
+    morta até o próximo save().
+    """
+
+    def __init__(self, n_features: int = N_FEATURES):
+        if not SKLEARN_AVAILABLE:
+            raise ImportError("scikit-learn e scipy são necessários para o índice esparso")
+        self.n_features = n_features
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features, analyzer=tokenize,
+            alternate_sign=False, norm=None, dtype=np.float32
+        )
+        self.ids: List[str] = []
+        self.metas: List[Dict] = []
+        self.hashes: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._blocks: List["sp.csr_matrix"] = []
+        self._matrix = None
+        self._dead: set = set()
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self.filters = MetadataIndex()
+        self.uid = next(_INDEX_UIDS)
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def nbytes(self) -> int:
+        """Memória da matriz esparsa (incluindo linhas mortas) e do vetor df."""
+        return self.df.nbytes + sum(
+            block.data.nbytes + block.indices.nbytes + block.indptr.nbytes for block in self._blocks
+        )
+
+    @property
+    def matrix(self) -> "sp.csr_matrix":
+        """Matriz esparsa (linhas x termos), incluindo linhas mortas."""
+        if self._matrix is None:
+            if self._blocks:
+                self._matrix = sp.vstack(self._blocks, format="csr")
+            else:
+                self._matrix = sp.csr_matrix((0, self.n_features), dtype=np.float32)
+            self._blocks = [self._matrix]
+        return self._matrix
+
+    def embed(self, texts: List[str]) -> "sp.csr_matrix":
+        """
+        Vetoriza uma lista de textos numa única chamada.
+
+        Returns:
+            Matriz CSR com TF sublinear (1 + log tf) e linhas de norma 1
+        """
+        tf = self.vectorizer.transform(texts).tocsr()
+        tf.sum_duplicates()
+        np.log(tf.data, out=tf.data)
+        tf.data += 1.0
+        norms = np.sqrt(np.asarray(tf.multiply(tf).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sp.csr_matrix(sp.diags(1.0 / norms.astype(np.float32)) @ tf, dtype=np.float32)
+
+    def idf(self) -> np.ndarray:
+        """IDF suavizado com o df atual: log((1 + N) / (1 + df)) + 1."""
+        return (np.log((1.0 + len(self)) / (1.0 + self.df)) + 1.0).astype(np.float32)
+
+    def _append(self, ids: List[str], rows: "sp.csr_matrix", metas: List[Dict], hashes: List[str]):
+        start = len(self.ids)
+        for offset, doc_id in enumerate(ids):
+            old = self._rows.get(doc_id)
+            if old is not None:
+                self._kill(old)
+            self._rows[doc_id] = start + offset
+        self.ids.extend(ids)
+        self.metas.extend(metas)
+        self.hashes.extend(hashes)
+        self._blocks.append(rows)
+        self._matrix = None
+        self.filters.add_many(ids, metas)
+        self.df += np.bincount(rows.indices, minlength=self.n_features)
+        self.version += 1
+
+    def _kill(self, row: int):
+        matrix = self.matrix
+        self.df[matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]] -= 1
+        self._dead.add(row)
+
+    def upsert_docs(self, docs: List[Dict]) -> int:
+        """
+        Vetoriza em lote os documentos novos ou alterados.
+
+        Args:
+            docs: Documentos com id, title, text e source
+
+        Returns:
+            Número de documentos (re)indexados
+        """
+        pending: Dict[str, Tuple[Dict, str]] = {}
+        for doc in docs:
+            doc_hash = content_hash(doc)
+            row = self._rows.get(doc["id"])
+            if row is not None and self.hashes[row] == doc_hash:
+                continue
+            pending[doc["id"]] = (doc, doc_hash)
+        if not pending:
+            return 0
+
+        items = list(pending.values())
+        rows = self.embed([f"{doc.get('title', '')}\n{doc.get('text', '')}" for doc, _ in items])
+        self._append(list(pending), rows, [doc_meta(doc) for doc, _ in items], [h for _, h in items])
+        return len(items)
+
+    def retain(self, keep_ids):
+        """Remove do índice todos os documentos cujo ID não está em keep_ids."""
+        removed = [doc_id for doc_id in self._rows if doc_id not in keep_ids]
+        for doc_id in removed:
+            self._kill(self._rows.pop(doc_id))
+            self.filters.remove(doc_id)
+        if removed:
+            self.version += 1
+
+    def remove(self, doc_ids) -> int:
+        """Marca como mortas as linhas dos IDs dados; o espaço é liberado no save()."""
+        removed = 0
+        for doc_id in doc_ids:
+            row = self._rows.pop(doc_id, None)
+            if row is None:
+                continue
+            self._kill(row)
+            self.filters.remove(doc_id)
+            removed += 1
+        if removed:
+            self.version += 1
+        return removed
+
+    def _compact(self):
+        if not self._dead:
+            return
+        live = sorted(self._rows.values())
+        self._blocks = [self.matrix[live]]
+        self._matrix = None
+        self.ids = [self.ids[r] for r in live]
+        self.metas = [self.metas[r] for r in live]
+        self.hashes = [self.hashes[r] for r in live]
+        self._rows = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._dead = set()
+
+    def cache_key(self) -> Tuple:
+        """Identifica o estado atual do índice para o cache de consultas."""
+        return ("sparse", self.uid, self.version)
+
+    def filter_rows(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """Linhas que atendem aos filtros de metadados (None = sem filtro)."""
+        if not filters:
+            return None
+        return self.filters.rows(filters, self._rows)
+
+    def search_many(self, queries: List[str], top_k: int = 3, filters: Dict = None,
+                    max_block: int = 1 << 24) -> List[List[Tuple[Dict, float]]]:
+        """
+        Recupera os top_k documentos de cada consulta.
+
+        As consultas são vetorizadas juntas e pontuadas em blocos por um único
+        produto esparso; só documentos com algum termo em comum recebem score.
+        Com filtros, só as linhas candidatas entram no produto.
+        """
+        if not queries:
+            return []
+        rows = self.filter_rows(filters)
+        if rows is None:
+            matrix = self.matrix
+            dead = np.fromiter(self._dead, dtype=np.int64, count=len(self._dead))
+        else:
+            matrix = self.matrix[rows]
+            dead = np.zeros(0, dtype=np.int64)
+        if not len(self) or not matrix.shape[0]:
+            return [[] for _ in queries]
+
+        q = self.embed(queries)
+        q = sp.csr_matrix(q @ sp.diags(self.idf() ** 2), dtype=np.float32)
+
+        results = []
+        step = max(1, max_block // matrix.shape[0])
+        for i in range(0, q.shape[0], step):
+            scores = (matrix @ q[i:i + step].T).toarray()
+            scores[dead] = 0.0
+            for column in scores.T:
+                best = [r for r in top_k_rows(column, top_k) if column[r] > 0]
+                if rows is not None:
+                    results.append([(self.metas[rows[r]], float(column[r])) for r in best])
+                else:
+                    results.append([(self.metas[r], float(column[r])) for r in best])
+        return results
+
+    def search(self, query: str, top_k: int = 3, filters: Dict = None) -> List[Tuple[Dict, float]]:
+        """Recupera os top_k documentos pelo produto esparso ponderado por IDF."""
+        return self.search_many([query], top_k, filters)[0]
+
+    def save(self, path: str, docs_stamp: Tuple[int, int] = (0, 0)):
+        """Persiste o índice (só linhas vivas) em um arquivo .npz."""
+        self._compact()
+        matrix = self.matrix
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                data=matrix.data,
+                indices=matrix.indices,
+                indptr=matrix.indptr,
+                n_features=np.array(self.n_features, dtype=np.int64),
+                ids=np.array(self.ids, dtype=str),
+                hashes=np.array(self.hashes, dtype=str),
+                metas=np.array(json.dumps(self.metas, ensure_ascii=False)),
+                docs_stamp=np.array(docs_stamp, dtype=np.int64)
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["SparseVectorIndex", Tuple[int, int]]:
+        """
+        Carrega um índice salvo com save().
+
+        Returns:
+            Tupla (índice, assinatura do arquivo de documentos indexado)
+        """
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(n_features=int(data["n_features"]))
+            ids = data["ids"].tolist()
+            rows = sp.csr_matrix(
+                (data["data"], data["indices"], data["indptr"]),
+                shape=(len(ids), index.n_features)
+            )
+            index._append(ids, rows, json.loads(str(data["metas"])), data["hashes"].tolist())
+            docs_stamp = tuple(int(x) for x in data["docs_stamp"])
+        return index, docs_stamp
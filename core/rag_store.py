@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+# core/rag_store.py
+"""
+Armazenamento de documentos do RAG em log append-only (JSONL).
+Cada documento é uma linha JSON; um índice lateral mapeia ID -> (offset, tamanho)
+para leitura aleatória com seek+read. Versões antigas de um mesmo ID só são
+descartadas fisicamente na compactação.
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, Iterator, Optional, Tuple
+
+import numpy as np
+
+from core.persistence import file_lock, fsync_dir
+
+LOG_SUFFIX = ".jsonl"
+OFFSETS_SUFFIX = ".offsets"
+
+def content_hash(doc: Dict) -> str:
+    """Hash do conteúdo indexável de um documento (título, texto e fonte)."""
+    payload = "\0".join([doc.get("title", ""), doc.get("text", ""), doc.get("source", "")])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def doc_meta(doc: Dict) -> Dict:
+    """Metadados de um documento guardados nos índices e retornados nas buscas."""
+    meta = {
+        "id": doc.get("id"),
+        "title": doc.get("title", ""),
+        "source": doc.get("source", ""),
+        "text": doc.get("text", "")[:200]  # Armazenar preview do texto
+    }
+    # Chunks de arquivos guardam a origem para leitura do trecho completo
+    if "path" in doc:
+        meta["path"] = doc["path"]
+        meta["start"] = doc.get("start", 0)
+        meta["end"] = doc.get("end", 0)
+    return meta
+
+FILTER_FIELDS = ("source", "title", "path")
+
+class MetadataIndex:
+    """
+    Índice invertido campo -> valor -> IDs de documentos, para pré-filtrar buscas.
+
+    Os filtros são um dicionário campo -> valor (ou lista de valores, com OU
+    entre eles); campos diferentes são combinados com E, começando pelo
+    conjunto menor, então o custo é proporcional aos candidatos.
+    """
+
+    def __init__(self, fields: Tuple[str, ...] = FILTER_FIELDS):
+        self.fields = fields
+        self.postings: Dict[str, Dict[str, set]] = {field: {} for field in fields}
+        self._values: Dict[str, Tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, doc_id: str, meta: Dict):
+        """Indexa (ou reindexa) os metadados de um documento."""
+        self.remove(doc_id)
+        values = tuple(meta.get(field) for field in self.fields)
+        for field, value in zip(self.fields, values):
+            if value is not None:
+                self.postings[field].setdefault(value, set()).add(doc_id)
+        self._values[doc_id] = values
+
+    def add_many(self, ids: List[str], metas: List[Dict]):
+        for doc_id, meta in zip(ids, metas):
+            self.add(doc_id, meta)
+
+    def remove(self, doc_id: str):
+        """Remove um documento do índice (ignora IDs ausentes)."""
+        values = self._values.pop(doc_id, None)
+        if values is None:
+            return
+        for field, value in zip(self.fields, values):
+            ids = self.postings[field].get(value)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self.postings[field][value]
+
+    def retain(self, keep_ids):
+        """Remove todos os documentos cujo ID não está em keep_ids."""
+        for doc_id in [i for i in self._values if i not in keep_ids]:
+            self.remove(doc_id)
+
+    def candidates(self, filters: Dict) -> set:
+        """
+        IDs dos documentos que atendem a todos os filtros.
+
+        Args:
+            filters: Dicionário campo -> valor ou lista de valores
+
+        Returns:
+            Conjunto de IDs
+        """
+        sets = []
+        for field, wanted in filters.items():
+            if field not in self.postings:
+                raise ValueError(f"Campo de filtro desconhecido: {field}")
+            values = [wanted] if isinstance(wanted, str) else list(wanted)
+            postings = self.postings[field]
+            sets.append(set().union(*(postings.get(v, ()) for v in values)))
+        if not sets:
+            return set(self._values)
+        sets.sort(key=len)
+        result = sets[0]
+        for other in sets[1:]:
+            result &= other
+        return result
+
+    def rows(self, filters: Dict, row_of: Dict[str, int]):
+        """Linhas (ordenadas) de um índice para os documentos que atendem aos filtros."""
+        ids = self.candidates(filters)
+        return np.array(sorted(row_of[i] for i in ids if i in row_of), dtype=np.int64)
+
+class DocStore:
+    """
+    Log append-only de documentos com índice lateral de offsets.
+
+    O índice lateral também é append-only (uma linha
+    "id<TAB>offset<TAB>tamanho<TAB>hash" por registro) e é reconstruído a
+    partir do log se estiver faltando ou atrasado, por exemplo após uma
+    interrupção entre as duas escritas.
+
+    Remoções gravam um tombstone ({"id": ..., "deleted": true}) no log, com
+    tamanho negativo no índice lateral; o espaço só é liberado na compactação.
+    O hash de conteúdo de cada documento vivo permite descartar inserções
+    duplicadas.
+    """
+
+    def __init__(self, docs_file: str):
+        base = os.path.splitext(docs_file)[0]
+        self.legacy_path = docs_file
+        self.log_path = base + LOG_SUFFIX
+        self.offsets_path = base + OFFSETS_SUFFIX
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        self._hashes: Dict[str, Optional[str]] = {}
+        self._by_hash: Dict[str, str] = {}
+        self._live_bytes = 0
+        self._end = 0
+        self._ino = None
+        self._load_offsets()
+
+    def _migrate_legacy(self):
+        """Importa o antigo docs_store.json (lista JSON) para o log."""
+        with open(self.legacy_path, "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        for i, doc in enumerate(docs):
+            doc.setdefault("id", str(i))
+        self.rewrite(docs)
+        print(f"[RAG] {len(docs)} documentos migrados para: {self.log_path}")
+
+    def _load_offsets(self):
+        self._offsets = {}
+        self._hashes = {}
+        self._by_hash = {}
+        self._live_bytes = 0
+        self._end = 0
+        if os.path.exists(self.offsets_path):
+            entries = []
+            with open(self.offsets_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # Linha truncada por interrupção
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) not in (3, 4):
+                        continue
+                    # Índices antigos não têm a coluna de hash
+                    doc_hash = parts[3] if len(parts) == 4 else None
+                    entries.append((parts[0], int(parts[1]), int(parts[2]), doc_hash))
+            self._apply_entries(entries)
+        self._scan_tail()
+
+    def _scan_tail(self):
+        """Indexa registros do log que ainda não estão no índice lateral."""
+        try:
+            st = os.stat(self.log_path)
+            size, ino = st.st_size, st.st_ino
+        except FileNotFoundError:
+            if os.path.exists(self.legacy_path):
+                self._migrate_legacy()
+                return
+            size, ino = 0, None
+        if self._ino is not None and ino != self._ino:
+            # O log foi reescrito (compactado) por outro processo
+            self._ino = ino
+            self._load_offsets()
+            return
+        self._ino = ino
+        if size < self._end:
+            # Índice lateral inconsistente com o log: reconstruir do zero
+            if os.path.exists(self.offsets_path):
+                os.remove(self.offsets_path)
+            self._offsets = {}
+            self._hashes = {}
+            self._by_hash = {}
+            self._live_bytes = 0
+            self._end = 0
+        if size == self._end:
+            return
+
+        entries = []
+        with open(self.log_path, "rb") as f:
+            f.seek(self._end)
+            offset = self._end
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Registro incompleto no fim do log
+                doc = json.loads(line)
+                if doc.get("deleted"):
+                    entries.append((doc["id"], offset, -len(line), ""))
+                else:
+                    entries.append((doc["id"], offset, len(line), content_hash(doc)))
+                offset += len(line)
+        self._append_offsets(entries)
+
+    def _apply_entries(self, entries: List[Tuple[str, int, int, Optional[str]]]):
+        for doc_id, offset, length, doc_hash in entries:
+            old = self._offsets.pop(doc_id, None)
+            if old is not None:
+                self._live_bytes -= old[1]
+                old_hash = self._hashes.pop(doc_id, None)
+                if old_hash is not None and self._by_hash.get(old_hash) == doc_id:
+                    del self._by_hash[old_hash]
+            if length >= 0:
+                self._offsets[doc_id] = (offset, length)
+                self._hashes[doc_id] = doc_hash
+                if doc_hash:
+                    self._by_hash[doc_hash] = doc_id
+                self._live_bytes += length
+            self._end = max(self._end, offset + abs(length))
+
+    def _append_offsets(self, entries: List[Tuple[str, int, int, str]]):
+        if not entries:
+            return
+        with open(self.offsets_path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{doc_id}\t{offset}\t{length}\t{doc_hash}\n"
+                            for doc_id, offset, length, doc_hash in entries))
+        self._apply_entries(entries)
+
+    def refresh(self):
+        """Incorpora registros adicionados por outros processos desde a última leitura."""
+        if not os.path.isdir(os.path.dirname(self.log_path) or "."):
+            # Sem diretório não há log nem lock: o store fica vazio
+            self._scan_tail()
+            return
+        with file_lock(self.log_path):
+            self._scan_tail()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._offsets
+
+    def ids(self) -> List[str]:
+        """IDs de todos os documentos vivos."""
+        return list(self._offsets)
+
+    def garbage_ratio(self) -> float:
+        """Fração do log ocupada por versões antigas e tombstones."""
+        return 1.0 - self._live_bytes / self._end if self._end else 0.0
+
+    def find_duplicate(self, doc: Dict) -> Optional[str]:
+        """
+        Procura um documento vivo com o mesmo conteúdo (título, texto e fonte).
+
+        Returns:
+            ID do documento existente ou None
+        """
+        if None in self._hashes.values():
+            # Índice lateral antigo, sem hashes: calcular uma única vez
+            for doc_id in [i for i, h in self._hashes.items() if h is None]:
+                doc_hash = content_hash(self.get(doc_id))
+                self._hashes[doc_id] = doc_hash
+                self._by_hash[doc_hash] = doc_id
+        return self._by_hash.get(content_hash(doc))
+
+    def _write(self, records: List[Dict]) -> int:
+        lines = [(json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8") for record in records]
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with file_lock(self.log_path):
+            # Indexar antes o que outros processos gravaram (ou uma compactação)
+            self._scan_tail()
+            with open(self.log_path, "ab") as f:
+                offset = f.tell()
+                f.write(b"".join(lines))
+
+            entries = []
+            for record, line in zip(records, lines):
+                if record.get("deleted"):
+                    entries.append((record["id"], offset, -len(line), ""))
+                else:
+                    entries.append((record["id"], offset, len(line), content_hash(record)))
+                offset += len(line)
+            self._append_offsets(entries)
+        return len(records)
+
+    def append_many(self, docs: List[Dict], dedup: bool = True) -> List[Dict]:
+        """
+        Acrescenta documentos ao fim do log (O(1) por documento).
+        Um ID já existente passa a apontar para a nova versão.
+
+        Args:
+            docs: Documentos com pelo menos o campo "id"
+            dedup: Se deve descartar documentos cujo conteúdo já existe no store
+
+        Returns:
+            Documentos efetivamente gravados
+        """
+        if dedup:
+            unique, seen = [], set()
+            for doc in docs:
+                doc_hash = content_hash(doc)
+                if doc_hash in seen or self.find_duplicate(doc) is not None:
+                    continue
+                seen.add(doc_hash)
+                unique.append(doc)
+            docs = unique
+        if docs:
+            self._write(docs)
+        return docs
+
+    def append(self, doc: Dict, dedup: bool = True) -> bool:
+        """
+        Acrescenta um único documento ao log.
+
+        Returns:
+            True se o documento foi gravado (False se era duplicado)
+        """
+        return bool(self.append_many([doc], dedup))
+
+    def delete_many(self, doc_ids: List[str]) -> List[str]:
+        """
+        Remove documentos gravando tombstones no log.
+
+        Args:
+            doc_ids: IDs a remover (IDs inexistentes são ignorados)
+
+        Returns:
+            IDs efetivamente removidos
+        """
+        removed = [doc_id for doc_id in dict.fromkeys(doc_ids) if doc_id in self._offsets]
+        if removed:
+            self._write([{"id": doc_id, "deleted": True} for doc_id in removed])
+        return removed
+
+    def delete(self, doc_id: str) -> bool:
+        """Remove um documento. Retorna False se o ID não existir."""
+        return bool(self.delete_many([doc_id]))
+
+    def get(self, doc_id: str) -> Optional[Dict]:
+        """
+        Lê um documento pelo ID com um único seek+read.
+
+        Returns:
+            Documento ou None se o ID não existir
+        """
+        entry = self._offsets.get(doc_id)
+        if entry is None:
+            return None
+        offset, length = entry
+        with open(self.log_path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def iter_docs(self) -> Iterator[Dict]:
+        """Percorre o log sequencialmente, emitindo só a versão viva de cada documento."""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb") as f:
+            offset = 0
+            for line in f:
+                if offset >= self._end:
+                    break
+                doc = json.loads(line)
+                if self._offsets.get(doc["id"], (None,))[0] == offset:
+                    yield doc
+                offset += len(line)
+
+    def rewrite(self, docs: List[Dict], expected: Optional[Tuple[Optional[int], int]] = None) -> bool:
+        """
+        Substitui todo o conteúdo do log pelos documentos fornecidos.
+
+        Args:
+            docs: Lista completa de documentos
+            expected: (inode, tamanho) que o log deve ter no momento da troca;
+                se outro processo o alterou, nada é substituído (opcional)
+
+        Returns:
+            True se o log foi substituído
+        """
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        tmp_log = self.log_path + ".tmp"
+        tmp_offsets = self.offsets_path + ".tmp"
+        entries = []
+        offset = 0
+        with file_lock(self.log_path):
+            with open(tmp_log, "wb") as log, open(tmp_offsets, "w", encoding="utf-8") as idx:
+                for doc in docs:
+                    line = (json.dumps(doc, ensure_ascii=False) + "\n").encode("utf-8")
+                    doc_hash = content_hash(doc)
+                    log.write(line)
+                    idx.write(f"{doc['id']}\t{offset}\t{len(line)}\t{doc_hash}\n")
+                    entries.append((doc["id"], offset, len(line), doc_hash))
+                    offset += len(line)
+                for f in (log, idx):
+                    f.flush()
+                    os.fsync(f.fileno())
+            if expected is not None and self._log_signature() != expected:
+                # Gravação sem lock (ex.: sem fcntl): descartar em vez de perder registros
+                os.remove(tmp_log)
+                os.remove(tmp_offsets)
+                return False
+            # Sem índice lateral, uma interrupção aqui leva à reconstrução a partir do log
+            if os.path.exists(self.offsets_path):
+                os.remove(self.offsets_path)
+            os.replace(tmp_log, self.log_path)
+            os.replace(tmp_offsets, self.offsets_path)
+            fsync_dir(os.path.dirname(self.log_path))
+            self._offsets = {}
+            self._hashes = {}
+            self._by_hash = {}
+            self._live_bytes = 0
+            self._end = 0
+            self._apply_entries(entries)
+            self._ino = os.stat(self.log_path).st_ino
+        return True
+
+    def _log_signature(self) -> Tuple[Optional[int], int]:
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return None, 0
+        return st.st_ino, st.st_size
+
+    def compact(self) -> Dict:
+        """
+        Reescreve o log mantendo apenas a versão viva de cada documento.
+
+        O lock do log fica com a compactação da leitura até a troca do
+        arquivo, então registros gravados por outros processos antes dela
+        são incorporados e os gravados depois esperam a troca terminar.
+
+        Returns:
+            Dicionário com o tamanho do log antes e depois e o número de documentos
+        """
+        with file_lock(self.log_path):
+            self._scan_tail()
+            signature = self._log_signature()
+            before = signature[1]
+            if not self.rewrite(list(self.iter_docs()), expected=signature):
+                print(f"[RAG] Log alterado durante a compactação, mantido: {self.log_path}")
+                return {"bytes_before": before, "bytes_after": before, "documents": len(self)}
+            after = os.path.getsize(self.log_path)
+        print(f"[RAG] Log compactado: {before} -> {after} bytes ({len(self)} documentos)")
+        return {"bytes_before": before, "bytes_after": after, "documents": len(self)}
+
+_STORES: Dict[str, DocStore] = {}
+
+def get_store(docs_file: str) -> DocStore:
+    """
+    Retorna o DocStore do arquivo, mantendo uma instância por processo.
+
+    Args:
+        docs_file: Caminho do arquivo de documentos (docs_store.json)
+
+    Returns:
+        DocStore atualizado com escritas feitas por outros processos
+    """
+    store = _STORES.get(docs_file)
+    if store is None:
+        store = DocStore(docs_file)
+        _STORES[docs_file] = store
+    else:
+        store.refresh()
+    return store
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# core/symbol_index.py
+"""
+Índice de símbolos de código (funções, classes e métodos) dos projetos.
+Arquivos Python são lidos com ast e arquivos JavaScript/TypeScript com um
+tokenizador leve. Cada definição (nome, tipo, arquivo, linha e docstring)
+fica num mapa hash por nome e numa trie de prefixos, e o índice é
+atualizado só para os arquivos que mudaram.
+"""
+import ast
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# Adicionar o diretório pai ao path para imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+SYMBOLS_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "symbols.json"))
+PYTHON_EXTENSIONS = {".py"}
+JS_EXTENSIONS = {".js", ".jsx", ".mjs", ".ts", ".tsx"}
+SKIP_DIRS = {"venv", ".venv", "node_modules", ".git", "__pycache__", "dist", "build"}
+
+def _first_line(doc: Optional[str]) -> str:
+    return doc.strip().splitlines()[0].strip() if doc and doc.strip() else ""
+
+def parse_python(source: str, path: str) -> List[Dict]:
+    """
+    Extrai as definições de um arquivo Python.
+
+    Args:
+        source: Código-fonte
+        path: Caminho do arquivo (registrado em cada símbolo)
+
+    Returns:
+        Lista de símbolos com name, qualname, kind, file, line e doc
+    """
+    symbols = []
+
+    def visit(node, prefix: str, in_class: bool):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                is_class = isinstance(child, ast.ClassDef)
+                qualname = f"{prefix}{child.name}"
+                symbols.append({
+                    "name": child.name,
+                    "qualname": qualname,
+                    "kind": "class" if is_class else ("method" if in_class else "function"),
+                    "file": path,
+                    "line": child.lineno,
+                    "doc": _first_line(ast.get_docstring(child))
+                })
+                visit(child, qualname + ".", is_class)
+
+    visit(ast.parse(source, filename=path), "", False)
+    return symbols
+
+_JS_PATTERNS = [
+    ("function", re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)\s*\(")),
+    ("class", re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+([A-Za-z_$][\w$]*)")),
+    ("function", re.compile(
+        r"^\s*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*(?::[^=]+)?=\s*"
+        r"(?:async\s+)?(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|[A-Za-z_$][\w$]*\s*=>)")),
+    ("method", re.compile(
+        r"^\s+(?:(?:public|private|protected|static|async|get|set)\s+)*([A-Za-z_$][\w$]*)\s*\([^)]*\)\s*(?::[^{]+)?\{")),
+]
+_JS_KEYWORDS = {"if", "for", "while", "switch", "catch", "function", "return", "with", "else"}
+_JS_STRING_RE = re.compile(r"'(?:\\.|[^'\\])*'|\"(?:\\.|[^\"\\])*\"|`(?:\\.|[^`\\])*`")
+
+def parse_javascript(source: str, path: str) -> List[Dict]:
+    """
+    Extrai as definições de um arquivo JavaScript/TypeScript.
+
+    Um tokenizador de linhas descarta strings e comentários e reconhece
+    function, class, funções atribuídas a const/let/var e métodos de classe.
+    O comentário JSDoc imediatamente anterior vira a docstring.
+
+    Returns:
+        Lista de símbolos com name, qualname, kind, file, line e doc
+    """
+    symbols = []
+    in_comment = False
+    comment: List[str] = []
+    last_doc = ""
+    current_class = None
+    class_depth = 0
+    depth = 0
+
+    for lineno, raw in enumerate(source.splitlines(), 1):
+        line = raw
+        if in_comment:
+            end = line.find("*/")
+            comment.append(line if end == -1 else line[:end])
+            if end == -1:
+                continue
+            in_comment = False
+            last_doc = _first_line("\n".join(c.strip().lstrip("*").strip() for c in comment))
+            line = line[end + 2:]
+        line = _JS_STRING_RE.sub('""', line)
+        single = re.match(r"\s*/\*\*(.*?)\*/\s*$", line)
+        if single:
+            last_doc = single.group(1).strip()
+            continue
+        start = line.find("/*")
+        if start != -1 and line.find("*/", start) == -1:
+            in_comment = True
+            comment = [line[start + 2:]]
+            line = line[:start]
+        line = re.sub(r"/\*.*?\*/", "", line).split("//")[0]
+        if not line.strip():
+            continue
+
+        for kind, pattern in _JS_PATTERNS:
+            match = pattern.match(line)
+            if not match or match.group(1) in _JS_KEYWORDS:
+                continue
+            if kind == "method" and (current_class is None or depth != class_depth + 1):
+                continue
+            name = match.group(1)
+            symbols.append({
+                "name": name,
+                "qualname": f"{current_class}.{name}" if kind == "method" else name,
+                "kind": kind,
+                "file": path,
+                "line": lineno,
+                "doc": last_doc
+            })
+            if kind == "class":
+                current_class, class_depth = name, depth
+            break
+        last_doc = ""
+
+        depth += line.count("{") - line.count("}")
+        if current_class is not None and depth <= class_depth and "}" in line:
+            current_class = None
+    return symbols
+
+class SymbolTrie:
+    """Trie de prefixos (em minúsculas) sobre os nomes de símbolos."""
+
+    def __init__(self):
+        self.root: Dict = {}
+
+    def insert(self, name: str):
+        node = self.root
+        for char in name.lower():
+            node = node.setdefault(char, {})
+        node.setdefault("", set()).add(name)
+
+    def remove(self, name: str):
+        key = name.lower()
+        path = [self.root]
+        for char in key:
+            node = path[-1].get(char)
+            if node is None:
+                return
+            path.append(node)
+        names = path[-1].get("")
+        if not names:
+            return
+        names.discard(name)
+        if names:
+            return
+        del path[-1][""]
+        # Podar os nós que ficaram vazios
+        for depth in range(len(key), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][key[depth - 1]]
+
+    def with_prefix(self, prefix: str, limit: int = 20) -> List[str]:
+        """Nomes que começam com prefix, em ordem alfabética (no máximo limit)."""
+        node = self.root
+        for char in prefix.lower():
+            node = node.get(char)
+            if node is None:
+                return []
+        names: List[str] = []
+        stack = [node]
+        while stack and len(names) < limit:
+            current = stack.pop()
+            names.extend(sorted(current.get("", ())))
+            stack.extend(current[c] for c in sorted((c for c in current if c), reverse=True))
+        return names[:limit]
+
+class SymbolIndex:
+    """
+    Índice de símbolos com mapa hash (nome -> definições) e trie de prefixos.
+
+    O índice guarda mtime e tamanho de cada arquivo, então refresh() só
+    reprocessa os arquivos alterados e remove os que sumiram. sync_store()
+    acompanha os arquivos de código ingeridos no RAG.
+    """
+
+    def __init__(self):
+        self.files: Dict[str, Dict] = {}
+        self.by_name: Dict[str, List[Dict]] = {}
+        self.trie = SymbolTrie()
+        self._store_keys: Dict = {}  # uid do índice do RAG -> cache_key() já sincronizado
+
+    def __len__(self) -> int:
+        return sum(len(entry["symbols"]) for entry in self.files.values())
+
+    def _add_symbols(self, symbols: List[Dict]):
+        for symbol in symbols:
+            key = symbol["name"].lower()
+            if key not in self.by_name:
+                self.trie.insert(key)
+            self.by_name.setdefault(key, []).append(symbol)
+
+    def remove_file(self, path: str):
+        """Remove do índice os símbolos de um arquivo."""
+        entry = self.files.pop(path, None)
+        if entry is None:
+            return
+        for symbol in entry["symbols"]:
+            key = symbol["name"].lower()
+            remaining = [s for s in self.by_name.get(key, []) if s["file"] != path]
+            if remaining:
+                self.by_name[key] = remaining
+            else:
+                self.by_name.pop(key, None)
+                self.trie.remove(key)
+
+    def update_file(self, path: str) -> bool:
+        """
+        (Re)indexa um arquivo se ele mudou desde a última indexação.
+
+        Returns:
+            True se o arquivo foi reprocessado
+        """
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.remove_file(path)
+            return False
+        entry = self.files.get(path)
+        if entry is not None and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            return False
+
+        ext = os.path.splitext(path)[1].lower()
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                source = f.read()
+            symbols = parse_python(source, path) if ext in PYTHON_EXTENSIONS else parse_javascript(source, path)
+        except (SyntaxError, ValueError) as e:
+            print(f"[SYMBOLS] Falha ao analisar {path}: {e}")
+            symbols = []
+
+        self.remove_file(path)
+        self.files[path] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "symbols": symbols}
+        self._add_symbols(symbols)
+        return True
+
+    def refresh(self, roots: Iterable[str]) -> Dict:
+        """
+        Sincroniza o índice com os arquivos de código sob os diretórios dados.
+
+        Args:
+            roots: Diretórios dos projetos
+
+        Returns:
+            Estatísticas (arquivos vistos, atualizados e removidos)
+        """
+        seen = set()
+        updated = 0
+        roots = [os.path.abspath(root) for root in roots]
+        for root in roots:
+            for dirpath, dirs, names in os.walk(root):
+                dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(".")]
+                for name in names:
+                    if os.path.splitext(name)[1].lower() in PYTHON_EXTENSIONS | JS_EXTENSIONS:
+                        path = os.path.join(dirpath, name)
+                        seen.add(path)
+                        updated += self.update_file(path)
+        removed = [p for p in self.files if p not in seen and any(p.startswith(r + os.sep) for r in roots)]
+        for path in removed:
+            self.remove_file(path)
+        return {"files": len(seen), "updated": updated, "removed": len(removed)}
+
+    def sync_store(self, index) -> int:
+        """
+        Indexa os arquivos de código ingeridos num índice do RAG.
+
+        Usa o mesmo cache_key() do cache de consultas: enquanto o índice do
+        RAG não muda, nada é feito; depois de uma inserção ou remoção, só os
+        arquivos (metadado "path") alterados desde a última sincronização são
+        reprocessados.
+
+        Args:
+            index: VectorIndex (ou QuantizedVectorIndex) dos documentos
+
+        Returns:
+            Número de arquivos reprocessados
+        """
+        key = index.cache_key()
+        if self._store_keys.get(key[1]) == key:
+            return 0
+        updated = 0
+        for path in list(index.filters.postings.get("path", {})):
+            if os.path.splitext(path)[1].lower() in PYTHON_EXTENSIONS | JS_EXTENSIONS:
+                updated += self.update_file(path)
+        self._store_keys[key[1]] = key
+        return updated
+
+    def lookup(self, name: str) -> List[Dict]:
+        """Definições com o nome dado (O(1)); as de grafia exata vêm primeiro."""
+        symbols = self.by_name.get(name.lower(), [])
+        return sorted(symbols, key=lambda s: (s["name"] != name, s["file"], s["line"]))
+
+    def search_prefix(self, prefix: str, limit: int = 20) -> List[Dict]:
+        """Definições cujo nome começa com prefix (custo proporcional ao prefixo e ao resultado)."""
+        results = []
+        for key in self.trie.with_prefix(prefix, limit):
+            results.extend(self.by_name.get(key, []))
+        return results[:limit]
+
+    def save(self, path: str = None):
+        """Persiste o índice em JSON."""
+        path = path or SYMBOLS_FILE
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = None) -> "SymbolIndex":
+        """Carrega um índice salvo (ou retorna um índice vazio)."""
+        path = path or SYMBOLS_FILE
+        index = cls()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                index.files = json.load(f).get("files", {})
+            for entry in index.files.values():
+                index._add_symbols(entry["symbols"])
+        return index
+
+_INDEXES: Dict[str, SymbolIndex] = {}
+
+def get_symbol_index(path: str = None) -> SymbolIndex:
+    """Retorna o índice de símbolos persistido, carregado uma vez por processo."""
+    path = path or SYMBOLS_FILE
+    if path not in _INDEXES:
+        _INDEXES[path] = SymbolIndex.load(path)
+    return _INDEXES[path]
+
+def index_projects(projects: List[Dict], path: str = None) -> Dict:
+    """
+    Atualiza o índice de símbolos com os projetos de data/index.json.
+
+    Args:
+        projects: Projetos no formato do scan ({"path": ..., "type": ...})
+        path: Arquivo do índice de símbolos (opcional)
+
+    Returns:
+        Estatísticas da atualização
+    """
+    index = get_symbol_index(path)
+    stats = index.refresh(p["path"] for p in projects)
+    if stats["updated"] or stats["removed"]:
+        index.save(path)
+    print(f"[SYMBOLS] {stats['updated']} arquivos atualizados, {stats['removed']} removidos, "
+          f"{len(index)} símbolos")
+    return stats
+
+_KIND = r"(?:fun[cç][aã]o|classe|m[eé]todo|s[ií]mbolo|function|class|method)"
+_NAME = r"`?(?P<name>[A-Za-z_$][\w$.]*)`?"
+_QUESTION_PATTERNS = [
+    re.compile(p, re.IGNORECASE) for p in (
+        r"onde\s+(?:est[aá]|fica|[eé])\s+(?:definid[oa]\s+)?(?:(?:a|o)\s+)?" + _KIND + r"\s+" + _NAME,
+        r"onde\s+(?:est[aá]|fica|[eé])\s+definid[oa]\s+(?:(?:a|o)\s+)?" + _NAME,
+        r"where\s+is\s+(?:the\s+)?(?:" + _KIND + r"\s+)?" + _NAME + r"\s+defined",
+        r"where\s+is\s+(?:the\s+)?" + _KIND + r"\s+" + _NAME,
+        r"defini[cç][aã]o\s+d[aeo]\s+(?:" + _KIND + r"\s+)?" + _NAME,
+        r"(?:localizar|encontrar|encontre|ache)\s+(?:(?:a|o)\s+)?" + _KIND + r"\s+" + _NAME,
+    )
+]
+_IDENTIFIER_RE = re.compile(r"^(?:def\s+|class\s+|function\s+)?`?([A-Za-z_$][\w$]*)`?(?:\(\))?$")
+
+def extract_symbol_name(query: str, questions_only: bool = False) -> Optional[str]:
+    """
+    Identifica consultas do tipo "onde está definida a função X".
+
+    Sem questions_only, um identificador solto com cara de código
+    (snake_case, camelCase, "def x", "x()") também conta.
+
+    Returns:
+        Nome do símbolo, ou None se a consulta não parece ser sobre um símbolo
+    """
+    query = query.strip().rstrip("?").strip()
+    for pattern in _QUESTION_PATTERNS:
+        match = pattern.search(query)
+        if match:
+            return match.group("name").split(".")[-1]
+    if questions_only:
+        return None
+    match = _IDENTIFIER_RE.match(query)
+    if match:
+        name = match.group(1)
+        if "_" in name or re.search(r"[a-z][A-Z]", name) or query != name:
+            return name
+    return None
+
+def format_symbols(name: str, symbols: List[Dict], limit: int = 5) -> str:
+    """Formata as definições encontradas como resposta textual."""
+    lines = [f"Definições de '{name}':"]
+    for symbol in symbols[:limit]:
+        lines.append(f"- {symbol['kind']} {symbol['qualname']} em {symbol['file']}:{symbol['line']}")
+        if symbol.get("doc"):
+            lines.append(f"  {symbol['doc']}")
+    if len(symbols) > limit:
+        lines.append(f"... e mais {len(symbols) - limit} definições")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Índice de símbolos de código dos projetos")
+    parser.add_argument("--index", default=None, help="Arquivo index.json gerado pelo scan de projetos")
+    parser.add_argument("--build", action="store_true", help="Atualizar o índice com os projetos escaneados")
+    parser.add_argument("--find", help="Buscar um símbolo pelo nome")
+    parser.add_argument("--prefix", help="Listar símbolos por prefixo")
+    args = parser.parse_args()
+
+    if args.build:
+        index_file = args.index or os.path.join(os.path.dirname(SYMBOLS_FILE), "index.json")
+        with open(index_file, "r", encoding="utf-8") as f:
+            print(json.dumps(index_projects(json.load(f)), indent=2, ensure_ascii=False))
+    if args.find:
+        print(format_symbols(args.find, get_symbol_index().lookup(args.find)))
+    if args.prefix:
+        for symbol in get_symbol_index().search_prefix(args.prefix):
+            print(f"{symbol['qualname']:40} {symbol['file']}:{symbol['line']}")
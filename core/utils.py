@@ -7,9 +7,14 @@ Funções utilitárias diversas para o J.A.R.V.I.S.
 import subprocess
 import os
 import sys
-import json
+from pathlib import Path
 from typing import Tuple, Any
 
+# Adicionar o diretório pai ao path para imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.persistence import read_json, update_json
+
 # --- Funções de Notificação TTS ---
 def notify_tts(text: str):
     """
@@ -60,28 +65,18 @@ def run_command(cmd: list, cwd: str = None, timeout: int = 300) -> Tuple[bool, s
 def get_config(key: str, default: Any = None) -> Any:
     """
     Obtém uma configuração do arquivo de configuração global do Jarvis.
+    O arquivo só é interpretado de novo quando muda no disco.
     """
     config_path = os.path.expanduser("~/.jarvis_config.json")
-    if not os.path.exists(config_path):
-        return default
-    
-    with open(config_path, "r", encoding="utf-8") as f:
-        config = json.load(f)
-    return config.get(key, default)
+    return read_json(config_path, {}, copy_result=False).get(key, default)
 
 def set_config(key: str, value: Any):
     """
-    Define uma configuração no arquivo de configuração global do Jarvis.
+    Define uma configuração no arquivo de configuração global do Jarvis
+    (gravação atômica, sob lock entre processos).
     """
     config_path = os.path.expanduser("~/.jarvis_config.json")
-    config = {}
-    if os.path.exists(config_path):
-        with open(config_path, "r", encoding="utf-8") as f:
-            config = json.load(f)
-    
-    config[key] = value
-    with open(config_path, "w", encoding="utf-8") as f:
-        json.dump(config, f, indent=4)
+    update_json(config_path, lambda config: config.update({key: value}), {}, indent=4)
 
 if __name__ == "__main__":
     print("Testando notify_tts...")
@@ -14,7 +14,7 @@ from pathlib import Path
 # Adicionar o diretório pai ao path para imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from core.rag_core import load_docs, build_index, retrieve, generate_answer
+from core.rag_core import get_index, retrieve, generate_answer
 from core.sandbox import run_in_sandbox
 from engineer.logger import get_logger
 from engineer.metrics import record_run, record_patch, ensure_metrics
@@ -41,12 +41,11 @@ def analyze_with_rag(query: str) -> tuple:
     logger.info(f"Analisando consulta com RAG: {query}")
     
     try:
-        docs = load_docs()
-        if not docs:
+        index = get_index()
+        if not len(index):
             logger.warning("Nenhum documento disponível no RAG")
             return "Nenhum documento disponível", []
         
-        index = build_index(docs)
         retrieved = retrieve(query, index, top_k=3)
         answer = generate_answer(query, retrieved)
         
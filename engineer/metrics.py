@@ -5,10 +5,17 @@ Sistema de coleta e armazenamento de métricas.
 """
 import json
 import os
+import sys
 import time
+from pathlib import Path
 from typing import Dict, List
 from datetime import datetime
 
+# Adicionar o diretório pai ao path para imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.persistence import file_lock, read_json, write_json
+
 METRICS_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "metrics.json"))
 
 def ensure_metrics():
@@ -27,8 +34,7 @@ def ensure_metrics():
                 "success_rate": 0.0
             }
         }
-        with open(METRICS_FILE, "w", encoding="utf-8") as f:
-            json.dump(initial_data, f, ensure_ascii=False, indent=2)
+        write_json(METRICS_FILE, initial_data)
 
 def load_metrics() -> Dict:
     """
@@ -39,18 +45,16 @@ def load_metrics() -> Dict:
     """
     ensure_metrics()
     
-    with open(METRICS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return read_json(METRICS_FILE)
 
 def save_metrics(metrics: Dict):
     """
-    Salva as métricas no arquivo.
+    Salva as métricas no arquivo (gravação atômica, sob lock entre processos).
     
     Args:
         metrics: Dicionário com as métricas
     """
-    with open(METRICS_FILE, "w", encoding="utf-8") as f:
-        json.dump(metrics, f, ensure_ascii=False, indent=2)
+    write_json(METRICS_FILE, metrics)
 
 def record_run(run_info: Dict):
     """
@@ -59,22 +63,23 @@ def record_run(run_info: Dict):
     Args:
         run_info: Informações da execução
     """
-    metrics = load_metrics()
+    with file_lock(METRICS_FILE):  # Ler-alterar-gravar sem perder alterações concorrentes
+        metrics = load_metrics()
     
-    run_record = {
-        "timestamp": datetime.utcnow().isoformat() + "Z",
-        "ts": time.time(),
-        **run_info
-    }
+        run_record = {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "ts": time.time(),
+            **run_info
+        }
     
-    metrics["runs"].append(run_record)
-    metrics["system"]["total_runs"] += 1
+        metrics["runs"].append(run_record)
+        metrics["system"]["total_runs"] += 1
     
-    # Calcular taxa de sucesso
-    successful_runs = sum(1 for r in metrics["runs"] if r.get("success", False))
-    metrics["system"]["success_rate"] = successful_runs / len(metrics["runs"]) if metrics["runs"] else 0.0
+        # Calcular taxa de sucesso
+        successful_runs = sum(1 for r in metrics["runs"] if r.get("success", False))
+        metrics["system"]["success_rate"] = successful_runs / len(metrics["runs"]) if metrics["runs"] else 0.0
     
-    save_metrics(metrics)
+        save_metrics(metrics)
     print(f"[METRICS] Execução registrada: {run_info.get('success', False)}")
 
 def record_patch(patch_info: Dict):
@@ -84,18 +89,19 @@ def record_patch(patch_info: Dict):
     Args:
         patch_info: Informações do patch
     """
-    metrics = load_metrics()
+    with file_lock(METRICS_FILE):
+        metrics = load_metrics()
     
-    patch_record = {
-        "timestamp": datetime.utcnow().isoformat() + "Z",
-        "ts": time.time(),
-        **patch_info
-    }
+        patch_record = {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "ts": time.time(),
+            **patch_info
+        }
     
-    metrics["patches"].append(patch_record)
-    metrics["system"]["total_patches"] += 1
+        metrics["patches"].append(patch_record)
+        metrics["system"]["total_patches"] += 1
     
-    save_metrics(metrics)
+        save_metrics(metrics)
     print(f"[METRICS] Patch registrado: {patch_info.get('file', 'unknown')}")
 
 def record_project_metric(project_path: str, metric_name: str, value: any):
@@ -107,20 +113,21 @@ def record_project_metric(project_path: str, metric_name: str, value: any):
         metric_name: Nome da métrica
         value: Valor da métrica
     """
-    metrics = load_metrics()
+    with file_lock(METRICS_FILE):
+        metrics = load_metrics()
     
-    if project_path not in metrics["projects"]:
-        metrics["projects"][project_path] = {
-            "created_at": datetime.utcnow().isoformat() + "Z",
-            "metrics": {}
-        }
+        if project_path not in metrics["projects"]:
+            metrics["projects"][project_path] = {
+                "created_at": datetime.utcnow().isoformat() + "Z",
+                "metrics": {}
+            }
     
-    metrics["projects"][project_path]["metrics"][metric_name] = {
-        "value": value,
-        "timestamp": datetime.utcnow().isoformat() + "Z"
-    }
+        metrics["projects"][project_path]["metrics"][metric_name] = {
+            "value": value,
+            "timestamp": datetime.utcnow().isoformat() + "Z"
+        }
     
-    save_metrics(metrics)
+        save_metrics(metrics)
     print(f"[METRICS] Métrica registrada para {project_path}: {metric_name}={value}")
 
 def get_summary() -> Dict:
@@ -13,7 +13,8 @@ from pathlib import Path
 # Adicionar o diretório pai ao path para imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from core import scan_projects, setup_project, query_rag, add_document
+from core import scan_projects, setup_project, query_rag_stream, add_document, rag_store
+from core.rag_core import docs_path
 from engineer import get_summary, analyze_project, run_cycle_with_patch
 
 # Configuração da página
@@ -30,6 +31,7 @@ HISTORY_DIR = os.path.join(BASE_DIR, "history")
 INDEX_FILE = os.path.join(DATA_DIR, "index.json")
 METRICS_FILE = os.path.join(DATA_DIR, "metrics.json")
 DOCS_FILE = os.path.join(DATA_DIR, "docs_store.json")
+DOCS_PAGE_SIZE = 20
 
 # Título principal
 st.title("🚀 Projeto Final - Dashboard Inteligente")
@@ -108,11 +110,7 @@ with tab1:
     
     # Estatísticas de documentos
     with col3:
-        if os.path.exists(DOCS_FILE):
-            docs = json.load(open(DOCS_FILE, "r", encoding="utf-8"))
-            st.metric("Documentos RAG", len(docs))
-        else:
-            st.metric("Documentos RAG", 0)
+        st.metric("Documentos RAG", len(rag_store.get_store(docs_path(DOCS_FILE))))
     
     st.markdown("---")
     
@@ -254,9 +252,13 @@ with tab4:
     
     if st.button("🔍 Consultar RAG", use_container_width=True):
         if rag_query:
+            # Renderizar cada parte da resposta assim que ela é gerada
+            placeholder = st.empty()
+            answer = ""
             with st.spinner("Processando consulta..."):
-                answer = query_rag(rag_query, top_k=3)
-                st.markdown(answer)
+                for part in query_rag_stream(rag_query, top_k=3):
+                    answer += part
+                    placeholder.markdown(answer)
         else:
             st.warning("⚠️ Digite uma pergunta!")
     
@@ -282,21 +284,25 @@ with tab4:
     # Documentos existentes
     st.subheader("📚 Documentos Existentes")
     
-    if os.path.exists(DOCS_FILE):
-        with open(DOCS_FILE, "r", encoding="utf-8") as f:
-            docs = json.load(f)
-        
-        if docs:
-            for doc in docs:
-                with st.expander(f"📄 {doc.get('title', 'Sem título')}"):
-                    st.write(f"**ID:** {doc.get('id')}")
-                    st.write(f"**Fonte:** {doc.get('source')}")
-                    st.write(f"**Conteúdo:**")
-                    st.text(doc.get('text', '')[:500] + ("..." if len(doc.get('text', '')) > 500 else ""))
-        else:
-            st.info("Nenhum documento no sistema. Adicione documentos acima.")
+    store = rag_store.get_store(docs_path(DOCS_FILE))
+    doc_ids = store.ids()
+    
+    if doc_ids:
+        # Pagina pelo store: só os documentos da página são lidos do disco
+        pages = (len(doc_ids) - 1) // DOCS_PAGE_SIZE + 1
+        page = st.number_input(f"Página (de {pages})", min_value=1, max_value=pages, value=1)
+        start = (page - 1) * DOCS_PAGE_SIZE
+        for doc_id in doc_ids[start:start + DOCS_PAGE_SIZE]:
+            doc = store.get(doc_id)
+            if doc is None:
+                continue
+            with st.expander(f"📄 {doc.get('title', 'Sem título')}"):
+                st.write(f"**ID:** {doc.get('id')}")
+                st.write(f"**Fonte:** {doc.get('source')}")
+                st.write(f"**Conteúdo:**")
+                st.text(doc.get('text', '')[:500] + ("..." if len(doc.get('text', '')) > 500 else ""))
     else:
-        st.warning("⚠️ Arquivo de documentos não encontrado.")
+        st.info("Nenhum documento no sistema. Adicione documentos acima.")
 
 # Tab 5: Métricas
 with tab5:
@@ -1,6 +1,8 @@
 import unittest
 import os
+import json
 import sys
+import time
 import shutil
 from unittest.mock import patch, MagicMock
 from pathlib import Path
@@ -30,13 +32,20 @@ class TestJarvisCore(unittest.TestCase):
         if TEST_DIR.exists():
             shutil.rmtree(TEST_DIR)
         TEST_DIR.mkdir()
-        # Redirecionar arquivos de memória para o diretório de teste
+        # Redirecionar arquivos de memória para o diretório de teste, sempre com o
+        # backend JSON (o ~/.jarvis_config.json do desenvolvedor pode escolher sqlite)
+        memory_manager.MEMORY_BACKEND = "json"
         memory_manager.MEMORY_FILE = str(TEST_DIR / ".jarvis_memory.json")
+        memory_manager.MEMORY_DB = str(TEST_DIR / ".jarvis_memory.db")
         memory_manager.ACTIVITY_LOG = str(TEST_DIR / ".jarvis_activity.log")
         memory_manager.ensure_memory()
 
     @classmethod
     def tearDownClass(cls):
+        # Gravar o que estiver pendente antes de apagar os arquivos, para a
+        # gravação na saída do processo não recriar o diretório
+        memory_manager.flush_memory()
+        memory_manager.get_activity_writer().close()
         # Limpar ambiente de teste após todos os testes
         if TEST_DIR.exists():
             shutil.rmtree(TEST_DIR)
@@ -195,6 +204,255 @@ class TestJarvisCore(unittest.TestCase):
         self.assertTrue(result["success"])
         self.assertEqual(result["result"]["dominant_emotion"], "feliz")
 
+    @patch("core.rag_core.lookup_symbol")
+    def test_09_action_router_find_symbol(self, mock_lookup_symbol):
+        mock_lookup_symbol.return_value = [{"name": "query_rag", "qualname": "query_rag", "kind": "function",
+                                            "file": "core/rag_core.py", "line": 10, "doc": ""}]
+        result = action_router.route("onde está definida a função query_rag?")
+        self.assertTrue(result["success"])
+        mock_lookup_symbol.assert_called_with("query_rag")
+        self.assertIn("core/rag_core.py:10", result["result"])
+
+    def test_10_memory_store_write_back(self):
+        memory_manager.set_preference("language", "es-ES")
+        memory_manager.log_event("cmd", {"n": 1})
+
+        # Leituras e alterações não tocam no arquivo até o flush
+        with patch("builtins.open", side_effect=AssertionError("E/S de arquivo")):
+            self.assertEqual(memory_manager.get_preference("language"), "es-ES")
+            self.assertEqual(memory_manager.get_working_memory()[-1]["type"], "cmd")
+            self.assertEqual(memory_manager.get_recent_events(1)[0]["data"], {"n": 1})
+        store = memory_manager.get_memory_store()
+        self.assertTrue(store.dirty)
+        memory_manager.flush_memory()
+        with open(memory_manager.MEMORY_FILE, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["preferences"]["language"], "es-ES")
+
+        # Timer agrupa as alterações numa única gravação
+        path = TEST_DIR / "sub" / "memoria.json"
+        path.parent.mkdir()
+        debounced = memory_manager.MemoryStore(str(path), flush_delay=0.05)
+        with patch("core.memory_manager.json.dump", wraps=json.dump) as dump:
+            for i in range(5):
+                debounced.data["preferences"][f"k{i}"] = i
+                debounced.mark_dirty()
+            time.sleep(0.3)
+        self.assertEqual(dump.call_count, 1)
+        self.assertFalse(debounced.dirty)
+        self.assertEqual(memory_manager.MemoryStore(str(path)).data["preferences"]["k4"], 4)
+
+        # Dois processos no mesmo arquivo: o flush reaplica só as próprias alterações
+        assistant = memory_manager.MemoryStore(str(path), flush_delay=60)
+        dashboard = memory_manager.MemoryStore(str(path), flush_delay=0)
+        assistant.log_event("cmd", {"n": 2})
+        dashboard.set_preference("default_city", "Curitiba")
+        assistant.set_preference("language", "en-US")
+        assistant.flush()
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        self.assertEqual((saved["preferences"]["default_city"], saved["preferences"]["language"]),
+                         ("Curitiba", "en-US"))
+        self.assertEqual(assistant.get_preference("default_city"), "Curitiba")
+        dashboard.learn_pattern("p", {"x": 1})
+        saved = memory_manager.MemoryStore(str(path)).load()
+        self.assertEqual(saved["preferences"]["language"], "en-US")
+        self.assertEqual(saved["episodic_memory"][-1]["data"], {"n": 2})
+        self.assertIn("p", saved["learned_patterns"])
+
+    def test_11_sqlite_memory_backend(self):
+        import threading
+        from core.memory_sqlite import SQLiteMemoryStore, migrate_from_json
+
+        memory_manager.log_event("cmd", {"n": 1})
+        memory_manager.learn_pattern("p", {"x": 1})
+        memory_manager.flush_memory()
+
+        db_path = str(TEST_DIR / "memoria.db")
+        store = SQLiteMemoryStore(db_path, {"language": "pt-BR"}, episodic_limit=5)
+        counts = migrate_from_json(memory_manager.MEMORY_FILE, store)
+        self.assertEqual(counts["patterns"], 1)
+        self.assertEqual(migrate_from_json(memory_manager.MEMORY_FILE, store), {})  # Uma única vez
+        self.assertEqual(store.get_pattern("p")["occurrences"], 1)
+        self.assertEqual(store.get_preference("language"), "pt-BR")
+
+        # WAL e índice das consultas por tipo
+        conn = store._conn()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        plan = " ".join(str(row) for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM events WHERE type = ? ORDER BY timestamp DESC", ("cmd",)))
+        self.assertIn("idx_events_type_ts", plan)
+
+        for i in range(8):
+            store.log_event("erro" if i % 2 else "cmd", {"i": i})
+        self.assertEqual(len(store.get_recent_events(100)), 5)  # episodic_limit
+        self.assertEqual([e["data"]["i"] for e in store.get_recent_events(10, "erro")], [3, 5, 7])
+        store.learn_pattern("p", {"x": 2})
+        self.assertEqual(store.get_pattern("p")["occurrences"], 2)
+        store.record_project_action("/proj", "build", {"ok": True})
+        self.assertEqual(store.get_project_actions("/proj")[-1]["action"], "build")
+
+        # Leituras concorrentes, cada thread com sua conexão
+        errors = []
+        def reader():
+            try:
+                for _ in range(20):
+                    store.get_recent_events(5, "cmd")
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=reader) for _ in range(4)]
+        for t in threads:
+            t.start()
+        store.log_event("cmd", {"i": 99})
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(store.load()["learned_patterns"]["p"]["occurrences"], 2)
+
+        # Eventos despejados ficam no banco até chegarem ao arquivo histórico: uma queda não os perde
+        evicted = len(store.search_events()) - 5
+        self.assertEqual(evicted, 5)  # 1 do JSON migrado + 8 + 1 - episodic_limit
+        reopened = SQLiteMemoryStore(db_path, episodic_limit=5)
+        self.assertEqual(reopened.archive.segments(), [])
+        self.assertEqual(len(reopened.search_events()), 10)
+        reopened.flush()
+        self.assertEqual(reopened._conn().execute("SELECT COUNT(*) FROM archive_pending").fetchone()[0], 0)
+        self.assertEqual(len(reopened.archive.query()), evicted)
+        self.assertEqual(len(reopened.search_events()), 10)
+        reopened.close()
+        store.close()
+
+    def test_12_episodic_ring_buffer_archive(self):
+        path = TEST_DIR / "ring" / "memoria.json"
+        path.parent.mkdir()
+        with patch.object(memory_manager, "EPISODIC_LIMIT", 3):
+            store = memory_manager.MemoryStore(str(path), flush_delay=0)
+            # Eventos antigos de dois dias além do limite vão para o arquivo ao carregar
+            old = [{"timestamp": f"2026-01-0{d}T10:00:00", "type": "boot", "data": {"d": d}} for d in (1, 2)]
+            store.replace(dict(memory_manager._initial_memory(), episodic_memory=old))
+            for i in range(4):
+                store.log_event("cmd" if i % 2 else "erro", {"i": i})
+
+        self.assertEqual(store.data["episodic_memory"].maxlen, 3)
+        self.assertEqual([e["data"]["i"] for e in store.get_recent_events(10)], [1, 2, 3])
+        self.assertEqual(store.get_recent_events(1, "erro")[0]["data"], {"i": 2})
+        self.assertEqual(store.archive.pending, [])
+        segments = store.archive.segments()
+        self.assertEqual(segments[:2], ["2026-01-01", "2026-01-02"])
+        self.assertTrue(all(name.endswith(".jsonl.gz") for name in os.listdir(store.archive.directory)))
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)["episodic_memory"]), 3)
+
+        # A história completa continua pesquisável: arquivo + memória recente
+        history = store.search_events()
+        self.assertEqual([e["type"] for e in history[:2]], ["boot", "boot"])
+        self.assertEqual(len(history), 6)
+        self.assertEqual([e["data"]["i"] for e in store.search_events("erro")], [0, 2])
+        self.assertEqual(store.search_events("boot", start="2026-01-02", end="2026-01-03")[0]["data"], {"d": 2})
+        self.assertEqual(len(store.search_events(limit=2)), 2)
+
+    def test_13_activity_log_writer(self):
+        from core.activity_log import ActivityLogWriter
+
+        memory_manager.log_activity("linha assíncrona")
+        memory_manager.flush_memory()
+        with open(memory_manager.ACTIVITY_LOG, encoding="utf-8") as f:
+            self.assertIn("[INFO] linha assíncrona", f.read())
+
+        path = TEST_DIR / "logs" / "activity.log"
+        path.parent.mkdir()
+        writer = ActivityLogWriter(str(path), max_bytes=200, backups=2, batch_lines=1000, flush_interval=60)
+        with patch("builtins.open", side_effect=AssertionError("E/S no chamador")):
+            for i in range(30):
+                writer.write(f"linha {i:02d} " + "x" * 20 + "\n")
+        self.assertFalse(path.exists())  # Nada gravado antes do lote, prazo ou flush
+        self.assertTrue(writer.flush())
+        writer.write("última\n")
+        writer.close()
+
+        # Rotação por tamanho mantém só os backups configurados
+        self.assertEqual(sorted(os.listdir(path.parent)), ["activity.log", "activity.log.1"])
+        with open(path, encoding="utf-8") as f:
+            self.assertTrue(f.read().endswith("última\n"))
+        with open(str(path) + ".1", encoding="utf-8") as f:
+            self.assertIn("linha 29", f.read())
+
+        # Prazo de flush_interval grava sem flush explícito
+        timed = ActivityLogWriter(str(path.parent / "timed.log"), flush_interval=0.05)
+        timed.write("temporizada\n")
+        time.sleep(0.3)
+        self.assertTrue((path.parent / "timed.log").exists())
+        timed.close()
+
+        # O limite é em bytes: texto acentuado ocupa mais que o número de caracteres
+        accented = ActivityLogWriter(str(path.parent / "acentos.log"), max_bytes=70, backups=1)
+        for _ in range(2):
+            accented.write("ação " * 5 + "\n")  # 26 caracteres, 36 bytes
+            accented.flush()
+        accented.close()
+        self.assertTrue((path.parent / "acentos.log.1").exists())
+        self.assertLessEqual(os.path.getsize(path.parent / "acentos.log"), 70)
+
+    def test_14_persistence_atomic_json(self):
+        import threading
+        from core import persistence
+
+        path = str(TEST_DIR / "store.json")
+        persistence.write_json(path, {"n": 0, "nome": "ação"})
+        self.assertEqual(persistence.read_json(path), {"n": 0, "nome": "ação"})
+
+        # Arquivo inalterado: a leitura não abre nem interpreta o arquivo de novo
+        with patch("builtins.open", side_effect=AssertionError("releitura")):
+            cached = persistence.read_json(path, copy_result=False)
+            self.assertEqual(persistence.read_json(path)["n"], 0)
+        self.assertIsNot(persistence.read_json(path), cached)
+
+        # Falha no meio da gravação mantém o original e não deixa temporários
+        def failing(f):
+            f.write('{"n": ')
+            raise RuntimeError("queda")
+        with self.assertRaises(RuntimeError):
+            persistence.atomic_write(path, failing)
+        self.assertEqual(persistence.read_json(path)["n"], 0)
+        self.assertEqual([n for n in os.listdir(TEST_DIR) if n.endswith(".tmp")], [])
+
+        # Ler-alterar-gravar concorrente não perde incrementos (e o lock aninhado não trava)
+        def increment():
+            for _ in range(10):
+                with persistence.file_lock(path):
+                    persistence.update_json(path, lambda d: d.update(n=d["n"] + 1))
+        threads = [threading.Thread(target=increment) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        self.assertEqual(persistence.read_json(path)["n"], 40)
+        self.assertEqual(persistence.read_json(str(TEST_DIR / "nao_existe.json"), {}), {})
+
+        # A gravação atômica mantém as permissões do arquivo (ou usa as padrão num arquivo novo)
+        os.chmod(path, 0o640)
+        persistence.write_json(path, {"n": 1})
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+        new_path = str(TEST_DIR / "novo.json")
+        persistence.write_json(new_path, {})
+        self.assertEqual(os.stat(new_path).st_mode & 0o777, 0o666 & ~persistence._UMASK)
+
+        # Lock num diretório inexistente falha em vez de seguir sem lock
+        with self.assertRaises(FileNotFoundError):
+            with persistence.file_lock(str(TEST_DIR / "nao_existe" / "a.json")):
+                pass
+
+    def test_15_cli_scripts_run_from_any_directory(self):
+        import subprocess
+        home = TEST_DIR / "home"
+        home.mkdir()
+        env = dict(os.environ, HOME=str(home))
+        core_dir = Path(memory_manager.__file__).parent
+        for args in (["utils.py"], ["memory_manager.py"], ["memory_manager.py", "--migrate"]):
+            result = subprocess.run([sys.executable, str(core_dir / args[0])] + args[1:], cwd=str(home),
+                                    env=env, capture_output=True, text=True, timeout=60)
+            self.assertEqual(result.returncode, 0, f"{args}: {result.stderr}")
+        self.assertIn("migrada", result.stdout)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,755 @@
+import unittest
+import os
+import json
+import sys
+import shutil
+from unittest.mock import patch
+from pathlib import Path
+import numpy as np
+
+# Adicionar o diretório pai ao path para importações relativas
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core import rag_core, rag_store, rag_bm25, rag_ingest, rag_backends, rag_sparse, rag_bulk, rag_bench, rag_eval, rag_rerank, symbol_index
+
+# Diretório temporário para os arquivos do RAG
+TEST_DIR = Path("./test_temp_rag").resolve()
+
+def make_docs(n: int):
+    return [
+        {"id": f"doc{i}", "title": f"Documento {i}", "text": f"conteudo numero {i}", "source": "teste"}
+        for i in range(n)
+    ]
+
+class TestRagCore(unittest.TestCase):
+
+    def setUp(self):
+        if TEST_DIR.exists():
+            shutil.rmtree(TEST_DIR)
+        TEST_DIR.mkdir()
+        rag_store._STORES.clear()
+        rag_core._INDEX_CACHE.clear()
+        rag_core.clear_query_cache()
+        rag_core.RESIDENT.clear()
+        symbol_index._INDEXES.clear()
+        self.docs_file = str(TEST_DIR / "docs_store.json")
+
+    def tearDown(self):
+        for timer in rag_core._PENDING_SAVES.values():
+            timer.cancel()
+        rag_core._PENDING_SAVES.clear()
+        rag_core.set_memory_budget(rag_core.MEMORY_BUDGET)
+        if TEST_DIR.exists():
+            shutil.rmtree(TEST_DIR)
+
+    def test_01_vector_index_matches_simple_embed(self):
+        docs = make_docs(40)
+        index = rag_core.build_index(docs)
+        self.assertEqual(index.matrix.dtype, np.float32)
+        self.assertEqual(index.matrix.shape, (40, 16))
+        self.assertTrue(index.matrix.flags["C_CONTIGUOUS"])
+
+        # O ranking vetorizado deve coincidir com o cálculo item a item
+        query = "conteudo numero 7"
+        query_emb = rag_core.simple_embed(query)
+        expected = sorted(
+            docs,
+            key=lambda d: -rag_core.cosine_similarity(query_emb, rag_core.simple_embed(d["text"]))
+        )[:5]
+        retrieved = rag_core.retrieve(query, index, top_k=5)
+        self.assertEqual([m["title"] for m, _ in retrieved], [d["title"] for d in expected])
+        self.assertEqual(retrieved[0][0]["title"], "Documento 7")
+
+        # O formato antigo (lista de dicts) continua aceito
+        legacy = list(index)
+        self.assertEqual(rag_core.retrieve(query, legacy, top_k=5), retrieved)
+
+    def test_02_persistent_index_is_updated_incrementally(self):
+        rag_core.save_docs(make_docs(10), self.docs_file)
+        index = rag_core.get_index(self.docs_file)
+        self.assertEqual(len(index), 10)
+        self.assertTrue(os.path.exists(rag_core.index_path(self.docs_file)))
+
+        # Sem mudanças no arquivo de documentos, o mesmo objeto é reutilizado
+        self.assertIs(rag_core.get_index(self.docs_file), index)
+
+        # Adições atualizam o índice em memória; a gravação (O(n)) é adiada e agrupada
+        with patch.object(rag_core.VectorIndex, "save", side_effect=AssertionError("gravação por adição")):
+            new_doc = rag_core.add_document("Novo", "texto novo", docs_file=self.docs_file)
+            rag_core.add_document("Outro", "mais um texto", docs_file=self.docs_file)
+        self.assertIs(rag_core.get_index(self.docs_file), index)
+        self.assertEqual(len(index), 12)
+        self.assertEqual(index.search("texto novo", top_k=1)[0][0]["title"], "Novo")
+        self.assertIn(rag_core.docs_path(self.docs_file), rag_core._PENDING_SAVES)
+        with patch.object(rag_core.VectorIndex, "save", wraps=index.save) as save:
+            rag_core.flush_indexes()
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual(rag_core._PENDING_SAVES, {})
+
+        # Outro processo carrega o índice do disco sem reembedar nada
+        rag_core._INDEX_CACHE.clear()
+        with patch.object(rag_core, "embed_batch", side_effect=AssertionError):
+            reloaded = rag_core.get_index(self.docs_file)
+        self.assertEqual(reloaded.ids, index.ids)
+        self.assertIn(new_doc["id"], reloaded.ids)
+
+    def test_03_append_only_doc_log(self):
+        # Um docs_store.json legado é migrado para o log na primeira abertura
+        with open(self.docs_file, "w", encoding="utf-8") as f:
+            json.dump(make_docs(3), f)
+        self.assertEqual(len(rag_core.load_docs(self.docs_file)), 3)
+
+        doc = rag_core.add_document("Extra", "texto extra", docs_file=self.docs_file)
+        self.assertEqual(rag_core.get_document(doc["id"], self.docs_file)["text"], "texto extra")
+
+        # Reescrever um ID deixa uma versão antiga no log até a compactação
+        store = rag_store.get_store(self.docs_file)
+        store.append({"id": "doc1", "title": "Documento 1", "text": "versao 2", "source": "teste"})
+        self.assertEqual(rag_core.get_document("doc1", self.docs_file)["text"], "versao 2")
+        stats = rag_core.compact_docs(self.docs_file)
+        self.assertLess(stats["bytes_after"], stats["bytes_before"])
+        self.assertEqual([d["id"] for d in rag_core.load_docs(self.docs_file)], ["doc0", "doc2", doc["id"], "doc1"])
+
+        # Sem o índice lateral, os offsets são reconstruídos a partir do log
+        os.remove(store.offsets_path)
+        rag_store._STORES.clear()
+        self.assertEqual(rag_core.get_document("doc1", self.docs_file)["text"], "versao 2")
+
+    def test_04_bm25_lexical_and_hybrid_retrieval(self):
+        self.assertEqual(rag_bm25.tokenize("loadDocs"), ["load_docs", "load", "doc"])
+        self.assertEqual(rag_bm25.tokenize("As configurações do projeto"), ["configuracao", "projeto"])
+
+        docs = make_docs(20) + [
+            {"id": "patch", "title": "patch_generator.py", "text": "def suggest_patch(path): gera sugestões de patch", "source": "code"},
+            {"id": "voz", "title": "Assistente de voz", "text": "Reconhecimento de fala com VOSK e síntese de voz", "source": "docs"},
+        ]
+        rag_core.save_docs(docs, self.docs_file)
+        lexical = rag_core.get_lexical_index(self.docs_file)
+
+        # Só documentos com termos da consulta recebem score
+        self.assertEqual(set(lexical.score("sugestão de patches")), {lexical._rows["patch"]})
+        self.assertEqual(rag_core.retrieve("suggestPatch", lexical, top_k=1)[0][0]["title"], "patch_generator.py")
+
+        hybrid = rag_core.get_retriever(self.docs_file, mode="hybrid")
+        self.assertEqual(hybrid.search("síntese de voz", top_k=1)[0][0]["title"], "Assistente de voz")
+
+        # Documentos novos entram no índice BM25 já carregado
+        rag_core.add_document("Clima", "previsão do tempo e temperatura", docs_file=self.docs_file)
+        self.assertIn("Clima", rag_core.query_rag("temperatura", top_k=1, docs_file=self.docs_file, mode="bm25"))
+
+    def test_05_streaming_chunked_ingestion_is_resumable(self):
+        big_file = TEST_DIR / "grande.log"
+        lines = [f"linha {i}: ação concluída com êxito\n" for i in range(400)]
+        big_file.write_text("".join(lines), encoding="utf-8")
+        content = big_file.read_bytes()
+
+        chunks = list(rag_ingest.iter_file_chunks(str(big_file), chunk_size=512, overlap=64))
+        self.assertTrue(all(c["end"] - c["start"] <= 512 for c in chunks))
+        self.assertEqual(chunks[-1]["end"], len(content))
+        for prev, cur in zip(chunks, chunks[1:]):
+            self.assertLess(cur["start"], prev["end"])  # Há sobreposição
+            self.assertEqual(cur["start"], prev["next"])
+        for c in chunks:
+            self.assertEqual(c["text"], content[c["start"]:c["end"]].decode("utf-8"))
+
+        # Interromper a ingestão depois do primeiro lote
+        original = rag_core.add_documents
+        calls = []
+        def flaky_add(docs, docs_file=None, save_index=True, **kwargs):
+            if calls:
+                raise KeyboardInterrupt
+            calls.append(len(docs))
+            original(docs, docs_file, save_index, **kwargs)
+        with patch.object(rag_core, "add_documents", side_effect=flaky_add):
+            with self.assertRaises(KeyboardInterrupt):
+                rag_ingest.ingest_file(str(big_file), "logs", self.docs_file, 512, 64, batch_size=5)
+
+        result = rag_ingest.ingest_file(str(big_file), "logs", self.docs_file, 512, 64, batch_size=5)
+        self.assertEqual(result["status"], "resumed")
+        self.assertEqual(result["chunks"] + calls[0], len(chunks))
+        self.assertEqual(len(rag_core.load_docs(self.docs_file)), len(chunks))
+        self.assertEqual(len(rag_core.get_index(self.docs_file)), len(chunks))
+
+        again = rag_ingest.ingest_file(str(big_file), "logs", self.docs_file, 512, 64, batch_size=5)
+        self.assertEqual(again["status"], "unchanged")
+        # O estado guarda só o progresso, não os IDs dos chunks
+        state = rag_ingest._load_state(rag_core.docs_path(self.docs_file))
+        self.assertEqual(set(state[str(big_file)]), {"signature", "next", "done"})
+
+        # Linhas mais longas no começo deslocam todos os chunks: os antigos saem
+        big_file.write_text("".join(f"linha {i}: ação concluída com êxito e um texto bem mais longo\n"
+                                    for i in range(300)), encoding="utf-8")
+        rag_ingest.ingest_file(str(big_file), "logs", self.docs_file, 512, 64, batch_size=5)
+        chunks = list(rag_ingest.iter_file_chunks(str(big_file), chunk_size=512, overlap=64))
+        self.assertEqual(sorted(d["start"] for d in rag_core.load_docs(self.docs_file)),
+                         [c["start"] for c in chunks])
+
+        # Arquivo encolheu: os chunks de offsets que deixaram de existir são removidos
+        big_file.write_text("".join(f"erro timeout {i}\n" for i in range(20)), encoding="utf-8")
+        shrunk = rag_ingest.ingest_file(str(big_file), "logs", self.docs_file, 512, 64, batch_size=5)
+        new_chunks = list(rag_ingest.iter_file_chunks(str(big_file), chunk_size=512, overlap=64))
+        self.assertEqual(shrunk["removed"], len(chunks) - len(new_chunks))
+        docs = rag_core.load_docs(self.docs_file)
+        self.assertEqual(len(docs), len(new_chunks))
+        self.assertTrue(all("ação concluída" not in d["text"] for d in docs))
+        self.assertEqual(len(rag_core.get_index(self.docs_file)), len(new_chunks))
+
+    def test_06_ann_backends(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(2000, 16)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = vectors[:50] + 0.05 * rng.normal(size=(50, 16)).astype(np.float32)
+
+        exact = rag_backends.get_backend("exact", 16)
+        exact.build(vectors)
+        for name in rag_backends.available_backends():
+            backend = rag_backends.get_backend(name, 16)
+            backend.build(vectors[:1500])
+            backend.add(vectors[1500:])
+            self.assertEqual(backend.count, 2000)
+
+            # Salvar e recarregar preserva os resultados
+            path = str(TEST_DIR / f"backend.{name}")
+            backend.save(path)
+            backend = rag_backends.BACKENDS[name].load(path)
+
+            hits = 0
+            for q in queries:
+                expected = set(exact.search(q, 10)[0].tolist())
+                hits += len(expected & set(backend.search(q, 10)[0].tolist()))
+            self.assertGreater(hits / (10 * len(queries)), 0.8, name)
+
+        # O VectorIndex passa a usar o backend e o mantém em dia após inserções
+        rag_core.save_docs(make_docs(300), self.docs_file)
+        index = rag_core.get_retriever(self.docs_file, backend="ivf")
+        self.assertEqual(index.backend.name, "ivf")
+        rag_core.add_document("Extra", "texto extra", docs_file=self.docs_file)
+        self.assertEqual(index.search("texto extra", top_k=1)[0][0]["title"], "Extra")
+        self.assertEqual(index.backend.count, 301)
+
+        # O backend fica na visão do chamador: o índice compartilhado segue exato
+        ivf = index.backend
+        self.assertEqual(rag_core.get_retriever(self.docs_file).backend_name(), "exact")
+        self.assertIn("Documento", rag_core.query_rag("conteudo numero 5", docs_file=self.docs_file))
+        self.assertIsNone(rag_core.get_index(self.docs_file).backend)
+        self.assertEqual(index.backend_name(), "ivf")
+        self.assertNotEqual(index.cache_key(), rag_core.get_index(self.docs_file).cache_key())
+        # Outra visão com o IVF reaproveita o backend já construído
+        self.assertIs(rag_core.get_retriever(self.docs_file, backend="ivf").backend, ivf)
+        
+        # Consultas simultâneas com e sem IVF não trocam o backend umas das outras
+        import threading
+        exact = rag_core.get_retriever(self.docs_file)
+        expected = exact.search("conteudo numero 7", top_k=5)
+        results = []
+        
+        def query(retriever):
+            for _ in range(20):
+                found = retriever.search("conteudo numero 7", top_k=5)
+                if retriever is exact:
+                    results.append(found)
+        
+        threads = [threading.Thread(target=query, args=(r,)) for r in (exact, index, exact, index)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(results), 40)
+        self.assertTrue(all(found == expected for found in results))
+        self.assertIsNone(rag_core.get_index(self.docs_file).backend)
+
+    def test_07_retrieve_many_matches_single_queries(self):
+        index = rag_core.build_index(make_docs(500))
+        queries = [f"conteudo numero {i}" for i in range(0, 500, 7)]
+        batched = rag_core.retrieve_many(queries, index, top_k=4)
+        self.assertEqual(len(batched), len(queries))
+        for query, results in zip(queries, batched):
+            single = rag_core.retrieve(query, index, top_k=4)
+            self.assertEqual([m["id"] for m, _ in results], [m["id"] for m, _ in single])
+            for (_, a), (_, b) in zip(results, single):
+                self.assertAlmostEqual(a, b, places=5)
+
+        # Blocos pequenos de consultas dão o mesmo resultado
+        embs = rag_core.embed_batch(queries, 16)
+        small = index.search_rows_many(embs, 4, max_block=1000)
+        for (rows_a, _), (rows_b, _) in zip(small, index.search_rows_many(embs, 4)):
+            self.assertEqual(rows_a.tolist(), rows_b.tolist())
+
+    def test_08_query_cache_is_invalidated_by_index_changes(self):
+        rag_core.save_docs(make_docs(20), self.docs_file)
+        index = rag_core.get_index(self.docs_file)
+        first = rag_core.retrieve("conteudo  numero 3", index, top_k=2)
+
+        # Consulta repetida (mesmo normalizada) não embeda nem pontua de novo
+        with patch.object(rag_core, "embed_batch", side_effect=AssertionError):
+            self.assertEqual(rag_core.retrieve(" conteudo numero 3", index, top_k=2), first)
+        self.assertEqual(rag_core.cache_stats()["hits"], 1)
+
+        # Adicionar um documento muda a versão do índice e invalida o cache
+        version = index.version
+        rag_core.add_document("Numero 3", "conteudo numero 3", docs_file=self.docs_file)
+        self.assertGreater(index.version, version)
+        fresh = rag_core.retrieve("conteudo numero 3", index, top_k=2)
+        self.assertIn("Numero 3", [m["title"] for m, _ in fresh])
+        self.assertEqual(rag_core.cache_stats()["misses"], 2)
+
+        # Listas no formato antigo viram um índice novo a cada chamada e não entram no cache
+        size = rag_core.cache_stats()["size"]
+        legacy = list(index)
+        rag_core.retrieve("conteudo numero 3", legacy, top_k=2)
+        rag_core.retrieve_many(["conteudo numero 3", "conteudo numero 4"], legacy, top_k=2)
+        self.assertEqual(rag_core.cache_stats()["size"], size)
+
+    @unittest.skipUnless(rag_sparse.SKLEARN_AVAILABLE, "scikit-learn não instalado")
+    def test_09_sparse_hashing_embedder(self):
+        docs = make_docs(30) + [
+            {"id": "voz", "title": "Assistente de voz", "text": "Reconhecimento de fala com VOSK", "source": "docs"},
+        ]
+        rag_core.save_docs(docs, self.docs_file)
+        index = rag_core.get_retriever(self.docs_file, mode="sparse")
+        self.assertIsInstance(index, rag_sparse.SparseVectorIndex)
+        self.assertEqual(index.matrix.shape, (31, rag_sparse.N_FEATURES))
+
+        self.assertEqual(index.search("reconhecimento de fala", top_k=3)[0][0]["id"], "voz")
+        # Só documentos com termos em comum recebem score
+        self.assertEqual(index.search("termo inexistente"), [])
+
+        # Documento alterado substitui a versão antiga; save() descarta linhas mortas
+        rag_core.save_docs(docs[:-1] + [dict(docs[-1], text="síntese de voz")], self.docs_file)
+        index = rag_core.get_sparse_index(self.docs_file)
+        self.assertEqual(index.search("fala", top_k=3), [])
+        self.assertEqual(index.search("síntese", top_k=1)[0][0]["id"], "voz")
+        self.assertEqual(index.matrix.shape[0], 31)
+
+        rag_core._INDEX_CACHE.clear()
+        reloaded = rag_core.get_sparse_index(self.docs_file)
+        self.assertEqual(rag_core.retrieve_many(["síntese", "numero 4"], reloaded, top_k=1)[0][0][0]["id"], "voz")
+
+    def test_10_bulk_project_indexing_skips_unchanged_files(self):
+        projects = []
+        for name in ("app_a", "app_b"):
+            root = TEST_DIR / name
+            (root / "src").mkdir(parents=True)
+            (root / "node_modules").mkdir()
+            (root / "node_modules" / "lib.js").write_text("ignorado", encoding="utf-8")
+            (root / "requirements.txt").write_text("numpy\n", encoding="utf-8")
+            for i in range(3):
+                (root / "src" / f"mod{i}.py").write_text(f"def funcao_{name}_{i}():\n    return {i}\n", encoding="utf-8")
+            projects.append({"path": str(root), "type": "python", "source": "directory"})
+
+        stats = rag_bulk.index_projects(projects, self.docs_file, workers=2, batch_size=2)
+        self.assertEqual((stats["files"], stats["changed"]), (8, 8))
+        self.assertIn("funcao_app_b_2", rag_core.query_rag("funcao_app_b_2", top_k=1, docs_file=self.docs_file, mode="bm25"))
+
+        # Segunda execução: nenhum arquivo é lido
+        with patch.object(rag_bulk, "_chunk_file", side_effect=AssertionError):
+            stats = rag_bulk.index_projects(projects, self.docs_file, workers=1)
+        self.assertEqual((stats["skipped"], stats["changed"]), (8, 0))
+
+        # Só mtime alterado: o hash evita regravar; conteúdo alterado é reindexado
+        touched = TEST_DIR / "app_a" / "src" / "mod0.py"
+        os.utime(touched, ns=(1, 1))
+        edited = TEST_DIR / "app_a" / "src" / "mod1.py"
+        edited.write_text("def funcao_editada():\n    return 42\n", encoding="utf-8")
+        stats = rag_bulk.index_projects(projects, self.docs_file, workers=1)
+        self.assertEqual((stats["skipped"], stats["changed"]), (7, 1))
+        self.assertIn("funcao_editada", rag_core.query_rag("funcao_editada", top_k=1, docs_file=self.docs_file, mode="bm25"))
+
+        # Erro de leitura num arquivo: ele é pulado, sem cair para o modo em série
+        before = rag_bulk.load_manifest(self.docs_file)[str(edited)]
+        edited.write_text("def funcao_nova():\n    return 1\n", encoding="utf-8")
+        other = TEST_DIR / "app_b" / "src" / "mod0.py"
+        other.write_text("def funcao_outra():\n    return 2\n", encoding="utf-8")
+        original = rag_bulk.chunk_documents
+        def unreadable(path, *args):
+            if path == str(edited):
+                raise PermissionError("sem permissão")
+            return original(path, *args)
+        with patch.object(rag_bulk, "chunk_documents", side_effect=unreadable):
+            stats = rag_bulk.index_projects(projects, self.docs_file, workers=1)
+        self.assertEqual((stats["skipped"], stats["changed"]), (7, 1))
+        self.assertEqual(rag_bulk.load_manifest(self.docs_file)[str(edited)], before)  # Relido na próxima execução
+        self.assertIn("funcao_editada", rag_core.query_rag("funcao_editada", top_k=1, docs_file=self.docs_file, mode="bm25"))
+
+        # Falha ao criar o pool: processamento em série, sem resultados duplicados
+        tasks = [(str(edited), "teste", 512, 64), (str(other), "teste", 512, 64)]
+        with patch.object(rag_bulk, "ProcessPoolExecutor", side_effect=OSError("sem /dev/shm")):
+            results = list(rag_bulk._map_tasks(tasks, workers=2))
+        self.assertEqual([r[0] for r in results], [str(edited), str(other)])
+
+    def test_11_int8_quantized_index(self):
+        docs = make_docs(300)
+        exact = rag_core.build_index(docs, dim=64)
+        quantized = rag_core.build_index(docs, dim=64, quantized=True)
+        self.assertEqual(quantized._codes.dtype, np.int8)
+        self.assertLessEqual(quantized.nbytes * 3.5, exact.matrix.nbytes)
+        np.testing.assert_allclose(quantized.matrix, exact.matrix, atol=0.01)
+
+        # Scores calculados sobre os códigos ficam próximos dos exatos
+        queries = [f"conteudo numero {i}" for i in range(0, 300, 13)]
+        for a, b in zip(exact.search_many(queries, 5), quantized.search_many(queries, 5)):
+            self.assertEqual(a[0][0]["id"], b[0][0]["id"])
+            self.assertAlmostEqual(a[0][1], b[0][1], places=2)
+
+        # Persistência no formato int8, separada do índice float32
+        rag_core.save_docs(docs, self.docs_file)
+        index = rag_core.get_retriever(self.docs_file, quantized=True)
+        self.assertIsInstance(index, rag_core.QuantizedVectorIndex)
+        rag_core.add_document("Extra", "texto extra", docs_file=self.docs_file)
+        rag_core._INDEX_CACHE.clear()
+        reloaded = rag_core.get_index(self.docs_file, quantized=True)
+        self.assertIsInstance(reloaded, rag_core.QuantizedVectorIndex)
+        self.assertEqual(len(reloaded), 301)
+        self.assertEqual(reloaded.search("texto extra", top_k=1)[0][0]["title"], "Extra")
+        self.assertIsNot(type(rag_core.get_index(self.docs_file)), rag_core.QuantizedVectorIndex)
+
+    def test_12_benchmark_suite_and_regression_check(self):
+        suite = rag_bench.run_suite([500], queries=20, batch_size=8, isolate=False)
+        result = suite["results"]["500"]
+        for metric in rag_bench.COMPARED_METRICS:
+            self.assertIn(metric, result)
+        self.assertGreater(result["index_bytes"], 0)
+        self.assertLessEqual(result["single_p50_ms"], result["single_p99_ms"])
+
+        self.assertEqual(rag_bench.compare_results(suite, suite), [])
+        faster = {"results": {"500": dict(result, build_s=result["build_s"] / 2)}}
+        regressions = rag_bench.compare_results(suite, faster)
+        self.assertEqual([(r["docs"], r["metric"]) for r in regressions], [(500, "build_s")])
+
+        # --compare com --save-baseline compara com o baseline anterior, não consigo mesmo
+        import subprocess
+        baseline_file = TEST_DIR / "baseline.json"
+        fast = {"results": {"200": {metric: 1e-9 for metric in rag_bench.COMPARED_METRICS}}}
+        baseline_file.write_text(json.dumps(fast))
+        result = subprocess.run(
+            [sys.executable, str(Path(rag_bench.__file__)), "--sizes", "200", "--queries", "5",
+             "--no-isolate", "--baseline", str(baseline_file), "--compare", "--save-baseline"],
+            cwd=str(TEST_DIR), capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 1, result.stdout + result.stderr)
+        self.assertIn("REGRESSÃO", result.stdout)
+        self.assertNotEqual(json.loads(baseline_file.read_text()), fast)
+
+    def test_13_metadata_filters_restrict_candidates(self):
+        docs = make_docs(50) + [
+            {"id": f"log{i}", "title": f"backend.log {i}", "text": f"conteudo numero {i}", "source": "logs"}
+            for i in range(10, 15)
+        ]
+        rag_core.save_docs(docs, self.docs_file)
+        vector = rag_core.get_index(self.docs_file)
+        self.assertEqual(len(vector.filters.candidates({"source": "logs"})), 5)
+        self.assertEqual(len(vector.filter_rows({"source": ["logs", "teste"], "title": "Documento 3"})), 1)
+
+        for mode in ("vector", "bm25", "hybrid", "sparse", "quantized"):
+            if mode == "quantized":
+                index = rag_core.get_retriever(self.docs_file, quantized=True)
+            else:
+                index = rag_core.get_retriever(self.docs_file, mode=mode)
+            results = rag_core.retrieve("conteudo numero 13", index, top_k=3, filters={"source": "logs"})
+            self.assertTrue(results, mode)
+            self.assertTrue(all(m["source"] == "logs" for m, _ in results), mode)
+            self.assertEqual(results[0][0]["id"], "log13", mode)
+
+        # Só as linhas candidatas são pontuadas
+        with patch.object(vector, "_scores", wraps=vector._scores) as scores:
+            rag_core.retrieve_many(["erro", "conteudo"], vector, top_k=2, filters={"source": "logs"})
+        self.assertEqual(scores.call_args[0][1].tolist(), sorted(vector._rows[f"log{i}"] for i in range(10, 15)))
+        self.assertEqual(rag_core.retrieve("erro", vector, filters={"source": "inexistente"}), [])
+
+        # Documentos novos entram no índice de metadados
+        rag_core.add_document("Novo log", "erro novo", source="logs", docs_file=self.docs_file)
+        self.assertEqual(len(vector.filters.candidates({"source": "logs"})), 6)
+        with self.assertRaises(ValueError):
+            vector.filters.candidates({"autor": "x"})
+
+    def test_14_binary_index_is_memory_mapped(self):
+        for quantized in (False, True):
+            index = rag_core.build_index(make_docs(100), quantized=quantized)
+            path = str(TEST_DIR / f"indice{int(quantized)}.bin")
+            index.save(path, (123, 456))
+
+            header = rag_core.read_index_header(path)
+            self.assertEqual((header["dim"], header["count"], header["version"]), (16, 100, 1))
+            self.assertEqual(header["dtype"], np.int8 if quantized else np.float32)
+            self.assertEqual(header["docs_stamp"], (123, 456))
+
+            with open(path, "rb") as f:
+                original = f.read()
+            loaded, stamp = rag_core.VectorIndex.load(path)
+            self.assertEqual(stamp, (123, 456))
+            self.assertEqual(type(loaded), type(index))
+            storage = loaded._codes if quantized else loaded._buf
+            self.assertIsInstance(storage, np.memmap)
+            np.testing.assert_array_equal(loaded.matrix, index.matrix)
+            self.assertEqual(loaded.search("conteudo numero 42", top_k=1)[0][0]["id"], "doc42")
+
+            # Atualizações no lugar e inserções não alteram o arquivo mapeado
+            loaded.upsert_docs([{"id": "doc0", "title": "Documento 0", "text": "alterado", "source": "teste"}])
+            loaded.add("novo", rag_core.embed_batch(["novo"])[0], {"id": "novo", "title": "Novo"})
+            self.assertEqual(len(loaded), 101)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), original)
+
+        with open(path, "r+b") as f:
+            f.write(b"XXXX")
+        with self.assertRaises(ValueError):
+            rag_core.VectorIndex.load(path)
+
+    def test_15_symbol_index(self):
+        project = TEST_DIR / "app"
+        project.mkdir()
+        (project / "servico.py").write_text(
+            'class Servico:\n    """Serviço principal."""\n\n    def iniciar(self):\n        pass\n\n'
+            'def carregar_config(path):\n    """Lê o arquivo de configuração."""\n    return path\n',
+            encoding="utf-8")
+        (project / "app.js").write_text(
+            "/** Monta a tela inicial. */\nexport function renderHome() {}\n"
+            "class Painel {\n  atualizar(dados) {\n    if (dados) { return 1; }\n  }\n}\n"
+            "const carregarDados = async (url) => url;\n",
+            encoding="utf-8")
+        symbols_file = str(TEST_DIR / "symbols.json")
+
+        stats = symbol_index.index_projects([{"path": str(project)}], symbols_file)
+        self.assertEqual((stats["files"], stats["updated"]), (2, 2))
+        index = symbol_index.get_symbol_index(symbols_file)
+        found = index.lookup("carregar_config")
+        self.assertEqual((found[0]["line"], found[0]["kind"], found[0]["doc"]), (7, "function", "Lê o arquivo de configuração."))
+        self.assertEqual(index.lookup("atualizar")[0]["qualname"], "Painel.atualizar")
+        self.assertEqual(index.lookup("renderHome")[0]["doc"], "Monta a tela inicial.")
+        self.assertEqual([s["name"] for s in index.search_prefix("carregar")], ["carregar_config", "carregarDados"])
+
+        # Só arquivos alterados são reprocessados; removidos saem do índice e da trie
+        (project / "app.js").unlink()
+        stats = symbol_index.index_projects([{"path": str(project)}], symbols_file)
+        self.assertEqual((stats["updated"], stats["removed"]), (0, 1))
+        self.assertEqual(index.search_prefix("carregar")[0]["name"], "carregar_config")
+        self.assertEqual(index.trie.with_prefix("render"), [])
+
+        # O índice persistido responde perguntas de símbolo em query_rag
+        symbol_index._INDEXES.clear()
+        with patch.object(symbol_index, "SYMBOLS_FILE", symbols_file):
+            answer = rag_core.query_rag("onde está definida a classe Servico?", docs_file=self.docs_file)
+        self.assertIn(f"{project / 'servico.py'}:1", answer)
+
+        # Arquivos de código ingeridos depois aparecem nas consultas de símbolo
+        extra = TEST_DIR / "extra.py"
+        extra.write_text("def funcao_ingerida():\n    pass\n", encoding="utf-8")
+        rag_ingest.ingest_file(str(extra), docs_file=self.docs_file)
+        with patch.object(symbol_index, "SYMBOLS_FILE", symbols_file):
+            answer = rag_core.query_rag("onde está a função funcao_ingerida?", docs_file=self.docs_file)
+            self.assertIn(f"{extra}:1", answer)
+            index = symbol_index.get_symbol_index()
+            # Sem mudança no store, a sincronização não reprocessa nada
+            self.assertEqual(index.sync_store(rag_core.get_index(self.docs_file)), 0)
+            extra.write_text("\n\ndef funcao_ingerida():\n    pass\n", encoding="utf-8")
+            rag_ingest.ingest_file(str(extra), docs_file=self.docs_file)
+            self.assertEqual(rag_core.lookup_symbol("funcao_ingerida", self.docs_file)[0]["line"], 3)
+
+    def test_16_dedup_delete_and_background_compaction(self):
+        docs = make_docs(20)
+        rag_core.save_docs(docs, self.docs_file)
+        rag_core.get_index(self.docs_file)
+        lexical = rag_core.get_lexical_index(self.docs_file)
+        store = rag_store.get_store(self.docs_file)
+        size = os.path.getsize(store.log_path)
+
+        # Conteúdo repetido (mesmo ID ou não) não é regravado
+        copy = dict(docs[3], id="copia")
+        self.assertEqual(rag_core.add_documents([docs[3], copy], self.docs_file), [])
+        first = rag_core.add_document("Nota", "texto unico", docs_file=self.docs_file)
+        again = rag_core.add_document("Nota", "texto unico", docs_file=self.docs_file)
+        self.assertEqual(again["id"], first["id"])
+        self.assertEqual(len(store), 21)
+
+        # Remoção grava tombstones e tira os documentos dos índices carregados
+        self.assertEqual(rag_core.delete_documents(["doc13", "doc14", "nao_existe"], self.docs_file), ["doc13", "doc14"])
+        self.assertIsNone(rag_core.get_document("doc13", self.docs_file))
+        self.assertNotIn("doc13", [m["id"] for m, _ in lexical.search("conteudo numero 13", 5)])
+        self.assertNotIn("doc13", rag_core.get_index(self.docs_file).ids)
+        self.assertGreater(store.garbage_ratio(), 0)
+
+        # Tombstones sobrevivem a um novo processo, com ou sem o índice lateral
+        for drop_offsets in (False, True):
+            rag_store._STORES.clear()
+            if drop_offsets:
+                os.remove(rag_store.get_store(self.docs_file).offsets_path)
+                rag_store._STORES.clear()
+            reopened = rag_store.get_store(self.docs_file)
+            self.assertNotIn("doc14", reopened)
+            self.assertEqual(len(reopened), 19)
+            self.assertIsNotNone(reopened.find_duplicate(docs[5]))
+
+        # Compactação em segundo plano descarta os tombstones do log e dos índices
+        rag_store._STORES.clear()
+        rag_core._INDEX_CACHE.clear()
+        self.assertIsNone(rag_core.schedule_compaction(self.docs_file, min_bytes=10 ** 9))
+        rag_core.schedule_compaction(self.docs_file, ratio=0.01, min_bytes=0).join()
+        store = rag_store.get_store(self.docs_file)
+        self.assertEqual(store.garbage_ratio(), 0.0)
+        self.assertLess(os.path.getsize(store.log_path), size)
+        index, _ = rag_core.VectorIndex.load(rag_core.index_path(self.docs_file))
+        self.assertEqual(len(index), 19)
+        self.assertNotIn("doc13", index.ids)
+
+        # Dois stores (processos) no mesmo log: a compactação de um preserva o que o outro gravou
+        a = rag_store.DocStore(self.docs_file)
+        b = rag_store.DocStore(self.docs_file)
+        a.delete("doc0")
+        b.append({"id": "from_b", "title": "B", "text": "gravado pelo outro", "source": "b"})
+        a.compact()
+        self.assertEqual(a.get("from_b")["text"], "gravado pelo outro")
+        b.append({"id": "from_b2", "title": "B2", "text": "depois da compactação", "source": "b"})
+        reopened = rag_store.DocStore(self.docs_file)
+        self.assertEqual((len(reopened), reopened.get("from_b2")["title"]), (20, "B2"))
+        self.assertNotIn("doc0", reopened)
+
+        # Log alterado sem lock durante a reescrita: a troca é abortada
+        size = os.path.getsize(a.log_path)
+        self.assertFalse(a.rewrite([], expected=(None, 0)))
+        self.assertEqual(os.path.getsize(a.log_path), size)
+        self.assertFalse(os.path.exists(a.log_path + ".tmp"))
+
+    def test_17_bulk_indexing_removes_stale_chunks(self):
+        root = TEST_DIR / "app"
+        root.mkdir()
+        longo = root / "longo.txt"
+        longo.write_text("\n".join(f"linha numero {i}" for i in range(40)), encoding="utf-8")
+        (root / "apagado.txt").write_text("arquivo que sera apagado", encoding="utf-8")
+        projects = [{"path": str(root)}]
+
+        rag_bulk.index_projects(projects, self.docs_file, workers=1, chunk_size=100, overlap=0)
+        self.assertGreater(len(rag_bulk.load_manifest(self.docs_file)[str(longo)]["chunks"]), 1)
+
+        longo.write_text("curto", encoding="utf-8")
+        (root / "apagado.txt").unlink()
+        stats = rag_bulk.index_projects(projects, self.docs_file, workers=1, chunk_size=100, overlap=0)
+        self.assertEqual((stats["changed"], stats["removed"]), (1, 1))
+        self.assertEqual([doc["text"] for doc in rag_core.load_docs(self.docs_file)], ["curto"])
+        self.assertEqual(list(rag_bulk.load_manifest(self.docs_file)), [str(longo)])
+
+        # Chunk idêntico em dois arquivos: apagar um não leva o conteúdo do outro
+        for sub in ("a", "b"):
+            (root / sub).mkdir()
+            (root / sub / "README.md").write_text("conteudo repetido", encoding="utf-8")
+        rag_bulk.index_projects(projects, self.docs_file, workers=1, chunk_size=100, overlap=0)
+        manifest = rag_bulk.load_manifest(self.docs_file)
+        twins = [manifest[str(root / sub / "README.md")]["chunks"][0] for sub in ("a", "b")]
+        for doc_id in twins:
+            self.assertIsNotNone(rag_core.get_document(doc_id, self.docs_file))
+        twin = twins[1]
+        (root / "a" / "README.md").unlink()
+        rag_bulk.index_projects(projects, self.docs_file, workers=1, chunk_size=100, overlap=0)
+        self.assertEqual(rag_core.get_document(twin, self.docs_file)["text"], "conteudo repetido")
+
+    def test_18_namespaces_lazy_loading_and_lru_budget(self):
+        with patch.object(rag_core, "NAMESPACES_DIR", str(TEST_DIR / "namespaces")):
+            for n, namespace in enumerate(("app_a", "app_b", "app_c")):
+                docs = [{"id": f"{namespace}_{i}", "title": f"{namespace} {i}", "text": f"modulo {namespace} parte {i}",
+                         "source": namespace} for i in range(50 + 10 * n)]
+                rag_core.add_documents(docs, rag_core.namespace_path(namespace))
+            self.assertEqual(rag_core.list_namespaces(), ["app_a", "app_b", "app_c"])
+
+            # Só cabe um índice por vez: carregar o seguinte descarrega o anterior
+            rag_core._INDEX_CACHE.clear()
+            rag_core.RESIDENT.clear()
+            rag_core.set_memory_budget(rag_core.get_index(rag_core.namespace_path("app_c")).nbytes)
+            self.assertEqual(rag_core.RESIDENT.stats()["resident"], [rag_core.namespace_path("app_c")])
+
+            merged = rag_core.query_namespaces("modulo app_b parte 7", top_k=5)
+            stats = rag_core.RESIDENT.stats()
+            self.assertEqual(stats["resident"], [rag_core.namespace_path("app_c")])
+            self.assertGreaterEqual(stats["evictions"], 2)
+            self.assertLessEqual(stats["used"], stats["budget"])
+
+            # O merge dos top_k de cada índice é igual ao top_k global
+            everything = []
+            for namespace in rag_core.list_namespaces():
+                index = rag_core.get_index(rag_core.namespace_path(namespace))
+                everything += [(namespace, meta["id"], score) for meta, score in index.search("modulo app_b parte 7", 5)]
+            expected = sorted(everything, key=lambda hit: -hit[2])[:5]
+            self.assertEqual([(m["namespace"], m["id"]) for m, _ in merged], [(ns, i) for ns, i, _ in expected])
+
+            # Consulta focada só carrega o namespace pedido
+            rag_core._INDEX_CACHE.clear()
+            rag_core.RESIDENT.clear()
+            answer = rag_core.query_rag("app_a parte 13", top_k=1, mode="bm25", namespaces=["app_a"])
+            self.assertIn("app_a 13", answer)
+            self.assertEqual(rag_core.RESIDENT.stats()["resident"], [rag_core.namespace_path("app_a")])
+
+    def test_19_mmr_rerank_diversifies_results(self):
+        docs = [{"id": f"log{i}", "title": "servidor.log", "text": f"timeout ao conectar no servidor de banco tentativa {i}",
+                 "source": "logs"} for i in range(10, 30)]
+        docs.append({"id": "guia", "title": "Guia de rede", "text": "como resolver timeout de rede no servidor", "source": "docs"})
+        rag_core.save_docs(docs, self.docs_file)
+        lexical = rag_core.get_lexical_index(self.docs_file)
+
+        plain = rag_core.retrieve("timeout servidor banco", lexical, top_k=3)
+        self.assertNotIn("guia", [m["id"] for m, _ in plain])
+        diverse = rag_core.retrieve("timeout servidor banco", lexical, top_k=3, mmr=0.3)
+        self.assertEqual(len(diverse), 3)
+        self.assertIn("guia", [m["id"] for m, _ in diverse])
+        self.assertEqual(diverse[0], plain[0])
+
+        # lambda = 1 mantém a ordem por relevância
+        candidates = lexical.search("timeout servidor", 20)
+        self.assertEqual(rag_rerank.mmr_rerank(candidates, 5, 1.0), candidates[:5])
+
+        # Similaridades vêm de vetores de termos normalizados
+        vectors = rag_rerank.term_vectors(["timeout no servidor", "servidor timeout", ""])
+        self.assertAlmostEqual(float(vectors[0] @ vectors[1]), 1.0, places=5)
+        self.assertEqual(float(np.abs(vectors[2]).sum()), 0.0)
+
+    def test_20_streaming_answer(self):
+        rag_core.save_docs(make_docs(10), self.docs_file)
+        parts = list(rag_core.query_rag_stream("conteudo numero 7", top_k=3, docs_file=self.docs_file))
+        self.assertEqual(len(parts), 5)  # Cabeçalho, 3 referências e nota
+        self.assertTrue(parts[0].startswith('**Resposta para:** "conteudo numero 7"'))
+        self.assertIn("Documento 7", parts[1])
+        self.assertIn("**Nota:**", parts[-1])
+        self.assertEqual("".join(parts), rag_core.query_rag("conteudo numero 7", top_k=3, docs_file=self.docs_file))
+
+        # Referências são consumidas sob demanda
+        consumed = []
+        def lazy_results():
+            for i in range(3):
+                consumed.append(i)
+                yield {"title": f"Doc {i}", "source": "teste"}, 1.0
+        stream = rag_core.generate_answer_stream("consulta", lazy_results())
+        next(stream)
+        self.assertEqual(consumed, [0])
+        self.assertEqual(list(rag_core.generate_answer_stream("nada", [])), ["Nenhum documento relevante encontrado para: 'nada'"])
+
+    def test_21_eval_harness_reports_recall_mrr_and_latency(self):
+        rag_core.save_docs(make_docs(60), self.docs_file)
+        queries_file = TEST_DIR / "consultas.jsonl"
+        queries_file.write_text("\n".join(json.dumps(q) for q in [
+            {"query": "conteudo numero 17", "relevant": ["doc17"]},
+            {"query": "conteudo numero 42", "relevant": ["doc42", "doc99"]},
+        ]), encoding="utf-8")
+        queries = rag_eval.load_queries(str(queries_file))
+
+        report = rag_eval.run_eval(queries, self.docs_file, ks=[1, 5])
+        self.assertTrue({"exact", "ivf", "int8", "bm25", "hybrid"} <= set(report))
+        self.assertEqual(rag_eval.SKLEARN_AVAILABLE, "sparse" in report)
+        exact = report["exact"]
+        self.assertEqual((exact["recall@1"], exact["recall@5"], exact["mrr"]), (0.75, 0.75, 1.0))
+        self.assertEqual(exact["queries"], 2)
+        self.assertLessEqual(exact["p50_ms"], exact["p99_ms"])
+
+        with self.assertRaises(ValueError):
+            rag_eval.run_eval(queries, self.docs_file, configs=["inexistente"])
+        queries_file.write_text('[{"query": "sem rotulos"}]', encoding="utf-8")
+        with self.assertRaises(ValueError):
+            rag_eval.load_queries(str(queries_file))
+
+    def test_22_cli_scripts_run_from_any_directory(self):
+        import subprocess
+        core_dir = Path(rag_core.__file__).parent
+        for script in ("rag_core.py", "rag_eval.py", "rag_bulk.py"):
+            result = subprocess.run([sys.executable, str(core_dir / script), "--help"],
+                                    cwd=str(TEST_DIR), capture_output=True, text=True, timeout=60)
+            self.assertEqual(result.returncode, 0, f"{script}: {result.stderr}")
+            self.assertIn("usage:", result.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()